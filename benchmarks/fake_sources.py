@@ -0,0 +1,219 @@
+"""
+Локальные заменители источников комиксов для офлайн-замеров
+
+Поднимает в отдельном потоке два aiohttp-сервера:
+- сайт: страницы AComics, API lib.social и картинки Sequential Art;
+- CDN: картинки MangaLib с настраиваемой задержкой, ответами 429 и обрывами.
+Все запросы считаются по видам, чтобы сравнивать загрузчики по их количеству.
+"""
+
+import asyncio
+from collections import Counter
+from dataclasses import dataclass, field
+import random
+import threading
+from aiohttp import web
+
+# Минимальный JPEG-подобный файл: сигнатура, заполнение, маркер конца
+_JPEG_HEAD = b'\xff\xd8\xff\xe0\x00\x10JFIF\x00'
+_JPEG_TAIL = b'\xff\xd9'
+
+def fake_image(size: int, seed: int = 0) -> bytes:
+    """Детерминированное «изображение» заданного размера"""
+    filler_size = max(size - len(_JPEG_HEAD) - len(_JPEG_TAIL), 0)
+    filler = bytes((seed + i) % 251 for i in range(min(filler_size, 4096)))
+    filler = (filler * (filler_size // max(len(filler), 1) + 1))[:filler_size]
+    return _JPEG_HEAD + filler + _JPEG_TAIL
+
+@dataclass
+class FakeSourcesConfig:
+    """Параметры заменителей источников"""
+    # AComics и Sequential Art
+    pages: int = 50
+    # lib.social
+    chapters: int = 5
+    pages_per_chapter: int = 10
+    # Размер отдаваемых картинок в байтах
+    image_size: int = 200_000
+    # Задержка ответа CDN в секундах
+    cdn_latency: float = 0.
+    # Доля ответов CDN с кодом 429
+    cdn_429_rate: float = 0.
+    # Доля ответов CDN, оборванных без ответа
+    cdn_failure_rate: float = 0.
+    seed: int = 0
+
+@dataclass
+class FakeSources:
+    """Заменители источников, работающие в фоновом потоке
+
+    Использование:
+        with FakeSources(FakeSourcesConfig(pages=100)) as sources:
+            sources.site_url, sources.cdn_url
+    """
+    config: FakeSourcesConfig = field(default_factory=FakeSourcesConfig)
+    requests: Counter = field(default_factory=Counter)
+    site_url: str = ""
+    cdn_url: str = ""
+
+    def __post_init__(self):
+        self._random = random.Random(self.config.seed)
+        self._images: dict[int, bytes] = {}
+        self._loop: asyncio.AbstractEventLoop|None = None
+        self._runners: list[web.AppRunner] = []
+        self._thread: threading.Thread|None = None
+        self._started = threading.Event()
+
+    def _image(self, seed: int) -> bytes:
+        if seed not in self._images:
+            self._images[seed] = fake_image(self.config.image_size, seed)
+        return self._images[seed]
+
+    # Сайт
+
+    async def _acomics_main(self, request: web.Request) -> web.Response:
+        self.requests['acomics_index'] += 1
+        name = request.match_info['name']
+        return web.Response(
+            content_type="text/html",
+            text=(
+                '<html><body><ul>'
+                '<li class="read-menu-item-short">'
+                f'<a href="/~{name}/1">Начало</a>'
+                f'<a href="/~{name}/{self.config.pages}">Конец</a>'
+                '</li></ul></body></html>'
+            )
+        )
+
+    async def _acomics_page(self, request: web.Request) -> web.Response:
+        self.requests['acomics_page'] += 1
+        name = request.match_info['name']
+        page = int(request.match_info['page'])
+        if not 0 < page <= self.config.pages:
+            raise web.HTTPNotFound()
+        return web.Response(
+            content_type="text/html",
+            text=(
+                '<html><body><div class="common-content">'
+                f'<img class="issue" src="/upload/{name}/{page:0>6}.jpg" title="Подсказка {page}">'
+                f'<span class="title">Страница {page}</span>'
+                '<section class="issue-description-text">'
+                f'<p>Описание страницы {page}<br>со <a href="https://example.com">ссылкой</a></p>'
+                '</section>'
+                '</div></body></html>'
+            )
+        )
+
+    async def _acomics_image(self, request: web.Request) -> web.Response:
+        # Запросы HEAD сверяют размер и картинку не передают
+        self.requests['acomics_head' if request.method == "HEAD" else 'acomics_image'] += 1
+        page = int(request.match_info['page'])
+        return web.Response(body=self._image(page), content_type="image/jpeg")
+
+    async def _sa_image(self, request: web.Request) -> web.Response:
+        self.requests['sa_image'] += 1
+        page = int(request.match_info['page'])
+        if not 0 < page <= self.config.pages:
+            raise web.HTTPNotFound()
+        return web.Response(body=self._image(page), content_type="image/jpeg")
+
+    def _chapter(self, number: int) -> dict:
+        return {
+            "id": number,
+            "volume": "1",
+            "number": str(number),
+            "name": f"Глава {number}",
+        }
+
+    async def _lib_chapters(self, request: web.Request) -> web.Response:
+        self.requests['lib_chapters'] += 1
+        return web.json_response({
+            "data": [self._chapter(number) for number in range(1, self.config.chapters + 1)]
+        })
+
+    async def _lib_chapter(self, request: web.Request) -> web.Response:
+        self.requests['lib_chapter'] += 1
+        slug = request.match_info['slug']
+        number = int(request.query.get("number", "0"))
+        if not 0 < number <= self.config.chapters:
+            return web.json_response({"data": {"toast": {"message": "Глава не найдена"}}})
+        chapter = self._chapter(number)
+        chapter["pages"] = [
+            {"slug": page, "url": f"//manga/{slug}/chapters/{number}/{page:0>2}.jpg"}
+            for page in range(1, self.config.pages_per_chapter + 1)
+        ]
+        return web.json_response({"data": chapter})
+
+    # CDN
+
+    async def _cdn_image(self, request: web.Request) -> web.StreamResponse:
+        self.requests['cdn_image'] += 1
+        if self.config.cdn_latency:
+            await asyncio.sleep(self.config.cdn_latency)
+        roll = self._random.random()
+        if roll < self.config.cdn_failure_rate:
+            self.requests['cdn_failure'] += 1
+            if request.transport is not None:
+                request.transport.close()
+            raise web.HTTPInternalServerError()
+        if roll < self.config.cdn_failure_rate + self.config.cdn_429_rate:
+            self.requests['cdn_429'] += 1
+            raise web.HTTPTooManyRequests()
+        seed = sum(request.path.encode()) % 1000
+        return web.Response(body=self._image(seed), content_type="image/jpeg")
+
+    def _site_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get(r'/~{name}', self._acomics_main)
+        app.router.add_get(r'/~{name}/{page:\d+}', self._acomics_page)
+        app.router.add_get(r'/upload/{name}/{page:\d+}.jpg', self._acomics_image)
+        app.router.add_get(r'/SA_{page:\d+}_small.jpg', self._sa_image)
+        app.router.add_get(r'/api/manga/{slug}/chapters', self._lib_chapters)
+        app.router.add_get(r'/api/manga/{slug}/chapter', self._lib_chapter)
+        return app
+
+    def _cdn_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get(r'/{path:.*}', self._cdn_image)
+        return app
+
+    # Управление
+
+    async def _start_app(self, app: web.Application) -> str:
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        self._runners.append(runner)
+        host, port = runner.addresses[0][:2]
+        return f"http://{host}:{port}"
+
+    def _serve(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self.site_url = self._loop.run_until_complete(self._start_app(self._site_app()))
+        self.cdn_url = self._loop.run_until_complete(self._start_app(self._cdn_app()))
+        self._started.set()
+        self._loop.run_forever()
+        for runner in self._runners:
+            self._loop.run_until_complete(runner.cleanup())
+        self._loop.close()
+
+    def start(self):
+        """Запуск серверов в фоновом потоке"""
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+        self._started.wait()
+
+    def stop(self):
+        """Остановка серверов"""
+        if self._loop is not None and self._thread is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,150 @@
+"""
+Микрозамер преобразования имён файлов и путей
+
+Сравнивает tools.make_safe_filename и tools.make_safe_path с прежней посимвольной
+реализацией на типичных названиях страниц и частей (кириллица, японский, китайский,
+запрещённые и непечатаемые символы) и проверяет, что результат совпадает побайтово.
+
+Запуск из корня репозитория:
+    python benchmarks/filenames.py [--names 2000] [--repeat 20]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from typing import Callable, Iterable
+sys.path.append(os.path.join(
+    os.path.dirname(os.path.dirname(os.path.realpath(__file__))),
+    "comic_downloader"
+))
+import tools
+
+# Прежняя реализация, с которой сравнивается текущая
+_ILLEGAL_CHARS = set('/\\?%*:|"<>')
+_ILLEGAL_UNPRINTABLE = {chr(c) for c in [*range(31), 127]}
+
+def reference_make_safe_filename(filename: str) -> str:
+    """Посимвольное преобразование имени файла, как до замены регулярным выражением"""
+    if not filename: return "file"
+    if os.path.splitext(filename)[0].upper() in tools._RESERVED_WORDS: return f"__{filename}"
+    if filename[0]==filename[-1]=='.' and set(filename)=={'.'}: return '．' * len(filename)
+    return "".join(
+        chr(ord(c)+65248) if c in _ILLEGAL_CHARS else c
+        for c in filename
+        if c not in _ILLEGAL_UNPRINTABLE
+    ).rstrip('. ') or "file"
+
+def reference_make_safe_path(path: str) -> str:
+    """Преобразование пути без кэша и без создания папок"""
+    safe_path = os.path.abspath(path)
+    drive, path_part = os.path.splitdrive(safe_path)
+    return os.path.join(
+        os.sep,
+        f"{drive}{os.sep}",
+        *map(
+            reference_make_safe_filename,
+            os.path.normpath(path_part).split(os.sep)
+        )
+    )
+
+_WORDS = (
+    "Глава", "Пролог", "Эпилог", "Экстра", "Возвращение", "героя", "Часть", "Том",
+    "第", "話", "章", "魔法少女", "僕のヒーロー", "进击的巨人", "日常", "番外編",
+    "Chapter", "Omake", "Special", "Vol.",
+)
+_SPECIAL = ('?', ':', '"', '*', '/', '|', '<', '>', '\\', '%', '\t', '\x7f', '...', '  ')
+
+def sample_names(count: int, seed: int = 0) -> list[str]:
+    """Названия страниц и частей: повторяющиеся, как в реальном скачивании, и граничные случаи"""
+    rnd = random.Random(seed)
+    names = ["", ".", "..", "...", "CON", "con.txt", "LPT1.jpg", " . ", "a. ", "\x00\x1f", "\x1f"]
+    while len(names) < count:
+        title = " ".join(rnd.choice(_WORDS) for _ in range(rnd.randint(1, 5)))
+        if rnd.random() < .5:
+            title += rnd.choice(_SPECIAL)
+        if rnd.random() < .3:
+            title = rnd.choice(_SPECIAL) + title
+        number = rnd.randint(1, 300)
+        names.append(rnd.choice((
+            f"{number} - {title}.jpg",
+            f"{number}.{rnd.randint(1, 9)} - {title}",
+            f"{number:0>4}.png",
+            title,
+        )))
+    return names
+
+def sample_paths(names: Iterable[str]) -> list[str]:
+    """Пути папок комиксов из названий"""
+    return [os.path.join("comics", name or "x", "Том 1") for name in names]
+
+def timeit(func: Callable[[str], str], items: list[str], repeat: int) -> float:
+    """Лучшее время одного прохода по всем элементам, с"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for item in items:
+            func(item)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def compare(names: list[str]) -> list[str]:
+    """Имена, на которых текущая реализация расходится с прежней"""
+    mismatches = [
+        name for name in names
+        if tools.make_safe_filename(name).encode("utf-8")
+        != reference_make_safe_filename(name).encode("utf-8")
+    ]
+    mismatches.extend(
+        path for path in sample_paths(names)
+        if tools.make_safe_path(path, create_path=False).encode("utf-8")
+        != reference_make_safe_path(path).encode("utf-8")
+    )
+    return mismatches
+
+def run(count: int = 2000, repeat: int = 20) -> dict[str, float]:
+    """Замер прежней и текущей реализаций, время в мкс на одно имя или путь
+
+    Returns:
+        dict[str, float]: Время по видам замера
+    """
+    names = sample_names(count)
+    # Каждое название встречается несколько раз, как папка части у всех её страниц
+    repeated = [name for name in names for _ in range(5)]
+    paths = sample_paths(names)
+    uncached = tools.make_safe_filename.__wrapped__ # type: ignore[attr-defined]
+    results = {
+        "filename_reference": timeit(reference_make_safe_filename, repeated, repeat),
+        "filename_regex": timeit(uncached, repeated, repeat),
+        "filename_cached": timeit(tools.make_safe_filename, repeated, repeat),
+        "path_reference": timeit(reference_make_safe_path, paths, repeat),
+        "path_cached": timeit(lambda path: tools.make_safe_path(path, False), paths, repeat),
+    }
+    return {
+        key: value / (len(paths) if key.startswith("path") else len(repeated)) * 1e6
+        for key, value in results.items()
+    }
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--names', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    mismatches = compare(sample_names(args.names))
+    if mismatches:
+        print(f"Результат отличается от прежнего: {mismatches[:10]!r}")
+        sys.exit(1)
+    print(f"Результат совпадает побайтово на {args.names} именах и путях")
+    results = run(args.names, args.repeat)
+    for key, value in results.items():
+        print(f"{key:<20} {value:8.3f} мкс")
+    print(
+        f"Ускорение: имя {results['filename_reference'] / results['filename_regex']:.1f}x, "
+        f"с кэшем {results['filename_reference'] / results['filename_cached']:.1f}x, "
+        f"путь {results['path_reference'] / results['path_cached']:.1f}x"
+    )
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,262 @@
+"""
+Офлайн-замер производительности загрузчиков
+
+Каждый загрузчик (AComics, Sequential Art, MangaLib) в обычном и асинхронном режимах
+скачивает комикс с локальных заменителей источников, для каждого режима считаются
+страницы в секунду, мегабайты в секунду, пиковое потребление памяти и число запросов.
+
+Запуск из корня репозитория:
+    python benchmarks/run.py [--pages 100] [--cdn-latency 0.05] [--save base.json]
+    python benchmarks/run.py --baseline base.json
+"""
+
+import argparse
+import asyncio
+from contextlib import ExitStack
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Callable, TypedDict
+from unittest import mock
+sys.path.append(os.path.dirname(os.path.realpath(__file__)))
+sys.path.append(os.path.join(
+    os.path.dirname(os.path.dirname(os.path.realpath(__file__))),
+    "comic_downloader"
+))
+sys.path.append(os.path.join(
+    os.path.dirname(os.path.dirname(os.path.realpath(__file__))),
+    "comic_downloader",
+    "modules"
+))
+from fake_sources import FakeSources, FakeSourcesConfig
+import tools
+
+SOURCES = ("acomics", "sa", "mangalib")
+MODES = ("sync", "async")
+
+class CaseResultDict(TypedDict):
+    source: str
+    mode: str
+    result: str
+    seconds: float
+    pages: int
+    bytes: int
+    peak_rss_mb: float|None
+    requests: int
+
+def peak_rss_mb() -> float|None:
+    """Пиковое потребление памяти процессом в мегабайтах, если его можно узнать"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # В macOS значение в байтах, в Linux — в килобайтах
+    if sys.platform == "darwin":
+        return peak / 1024 / 1024
+    return peak / 1024
+
+def _make_downloader(
+    source: str,
+    use_async: bool,
+    site_url: str,
+    cdn_url: str,
+    folder: str,
+    stack: ExitStack
+) -> Any:
+    """Загрузчик источника, направленный на локальные заменители"""
+    params: dict[str, Any] = {
+        "first": 1,
+        "folder": folder,
+        "is_write_description": True,
+        "is_write_img_description": True,
+        "use_async": use_async,
+    }
+    if source == "acomics":
+        import acomicsdownload
+        stack.enter_context(
+            mock.patch.object(acomicsdownload.Downloader, "_COMIC_DOMAIN", site_url)
+        )
+        return acomicsdownload.Downloader(comic_name="~bench", **params)
+    if source == "sa":
+        import SAdownload
+        stack.enter_context(mock.patch.object(SAdownload.Downloader, "_COMIC_DOMAIN", site_url))
+        return SAdownload.Downloader(comic_name="sa", **params)
+    if source == "mangalib":
+        import mangalib
+        stack.enter_context(mock.patch.object(mangalib.Downloader, "_API_DOMAIN", site_url))
+        stack.enter_context(mock.patch.object(mangalib.Downloader, "_IMG_DOMAIN", (cdn_url,)))
+        return mangalib.Downloader(comic_name="bench", **params)
+    raise ValueError(source)
+
+def run_case(source: str, mode: str, site_url: str, cdn_url: str, folder: str) -> CaseResultDict:
+    """Скачивание комикса одним загрузчиком в одном режиме"""
+    use_async = mode == "async"
+    with ExitStack() as stack:
+        downloader = _make_downloader(source, use_async, site_url, cdn_url, folder, stack)
+        start = time.perf_counter()
+        if use_async:
+            result = asyncio.run(downloader.async_downloadcomic())
+        else:
+            result = downloader.downloadcomic()
+        seconds = time.perf_counter() - start
+
+    pages = 0
+    size = 0
+    for root, _, files in os.walk(folder):
+        for filename in files:
+            if filename.endswith(".jpg"):
+                pages += 1
+                size += os.path.getsize(os.path.join(root, filename))
+    return CaseResultDict({
+        "source": source,
+        "mode": mode,
+        "result": str(result),
+        "seconds": seconds,
+        "pages": pages,
+        "bytes": size,
+        "peak_rss_mb": peak_rss_mb(),
+        "requests": 0,
+    })
+
+def run_all(
+    config: FakeSourcesConfig,
+    sources: tuple[str, ...] = SOURCES,
+    modes: tuple[str, ...] = MODES,
+    runner: Callable[[list[str]], str]|None = None
+) -> list[CaseResultDict]:
+    """Прогон всех сочетаний источников и режимов, каждое в отдельном процессе"""
+    if runner is None:
+        def runner(args: list[str]) -> str:
+            return subprocess.run(
+                [sys.executable, os.path.realpath(__file__), *args],
+                check=True,
+                capture_output=True,
+                text=True
+            ).stdout
+    results: list[CaseResultDict] = []
+    with FakeSources(config) as sources_server:
+        for source in sources:
+            for mode in modes:
+                folder = tempfile.mkdtemp(prefix=f"bench_{source}_{mode}_")
+                requests_before = sum(sources_server.requests.values())
+                try:
+                    output = runner([
+                        "--case", f"{source}:{mode}",
+                        "--site", sources_server.site_url,
+                        "--cdn", sources_server.cdn_url,
+                        "--folder", folder,
+                    ])
+                finally:
+                    shutil.rmtree(folder, ignore_errors=True)
+                result: CaseResultDict = json.loads(output.strip().splitlines()[-1])
+                result["requests"] = sum(sources_server.requests.values()) - requests_before
+                results.append(result)
+    return results
+
+def format_results(
+    results: list[CaseResultDict],
+    baseline: list[CaseResultDict]|None = None
+) -> str:
+    """Таблица результатов, при наличии базовых — с изменением скорости в процентах"""
+    baseline_rates = {
+        (item["source"], item["mode"]): item["pages"] / item["seconds"]
+        for item in baseline or []
+        if item["seconds"]
+    }
+    header = ["Источник", "Режим", "Время, с", "Стр/с", "МБ/с", "Пик RSS, МБ", "Запросов"]
+    if baseline_rates:
+        header.append("Стр/с к базе")
+    rows: list[list[str]] = []
+    for item in results:
+        seconds = item["seconds"] or 1e-9
+        rate = item["pages"] / seconds
+        row = [
+            item["source"],
+            item["mode"],
+            f"{item['seconds']:.2f}",
+            f"{rate:.1f}",
+            f"{item['bytes'] / 1024 / 1024 / seconds:.2f}",
+            "н/д" if item["peak_rss_mb"] is None else f"{item['peak_rss_mb']:.1f}",
+            str(item["requests"]),
+        ]
+        if baseline_rates:
+            base_rate = baseline_rates.get((item["source"], item["mode"]))
+            row.append(f"{(rate / base_rate - 1) * 100:+.1f}%" if base_rate else "")
+        rows.append(row)
+
+    return tools.format_table(header, rows)
+
+def arg_parser() -> argparse.ArgumentParser:
+    """Парсер аргументов командной строки
+    """
+    defaults = FakeSourcesConfig()
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--pages', type=int, default=defaults.pages,
+                        help='Количество страниц AComics и Sequential Art')
+    parser.add_argument('--chapters', type=int, default=defaults.chapters,
+                        help='Количество глав MangaLib')
+    parser.add_argument('--pages-per-chapter', type=int, default=defaults.pages_per_chapter,
+                        help='Количество страниц в главе MangaLib')
+    parser.add_argument('--image-size', type=int, default=defaults.image_size,
+                        help='Размер картинки в байтах')
+    parser.add_argument('--cdn-latency', type=float, default=defaults.cdn_latency,
+                        help='Задержка ответа CDN в секундах')
+    parser.add_argument('--cdn-429-rate', type=float, default=defaults.cdn_429_rate,
+                        help='Доля ответов CDN с кодом 429')
+    parser.add_argument('--cdn-failure-rate', type=float, default=defaults.cdn_failure_rate,
+                        help='Доля оборванных ответов CDN')
+    parser.add_argument('--sources', type=str, default=",".join(SOURCES),
+                        help='Источники через запятую')
+    parser.add_argument('--modes', type=str, default=",".join(MODES),
+                        help='Режимы через запятую')
+    parser.add_argument('--save', type=str, default=None,
+                        help='Сохранить результаты в json как базовые')
+    parser.add_argument('--baseline', type=str, default=None,
+                        help='Сравнить с сохранёнными базовыми результатами')
+    # Служебные аргументы запуска одного замера в отдельном процессе
+    parser.add_argument('--case', type=str, default=None, help=argparse.SUPPRESS)
+    parser.add_argument('--site', type=str, default=None, help=argparse.SUPPRESS)
+    parser.add_argument('--cdn', type=str, default=None, help=argparse.SUPPRESS)
+    parser.add_argument('--folder', type=str, default=None, help=argparse.SUPPRESS)
+    return parser
+
+def main():
+    args = arg_parser().parse_args()
+
+    if args.case:
+        source, mode = args.case.split(":")
+        print(json.dumps(run_case(source, mode, args.site, args.cdn, args.folder)))
+        return
+
+    config = FakeSourcesConfig(
+        pages = args.pages,
+        chapters = args.chapters,
+        pages_per_chapter = args.pages_per_chapter,
+        image_size = args.image_size,
+        cdn_latency = args.cdn_latency,
+        cdn_429_rate = args.cdn_429_rate,
+        cdn_failure_rate = args.cdn_failure_rate,
+    )
+    results = run_all(
+        config,
+        sources = tuple(args.sources.split(",")),
+        modes = tuple(args.modes.split(",")),
+    )
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as file:
+            baseline = json.load(file)
+    print(format_results(results, baseline))
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as file:
+            json.dump(results, file, ensure_ascii=False, indent=2)
+
+if __name__ == '__main__':
+    main()
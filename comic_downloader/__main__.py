@@ -1,11 +1,34 @@
-﻿import subprocess as sp
+﻿import argparse
+import asyncio
+import contextlib
+import cProfile
+import os
+import shutil
+import signal
+import socket
+import subprocess as sp
+import sys
+import tempfile
+import threading
 from typing import Iterator
 import urllib.error
-import sys
-
-from win10toast import ToastNotifier
 
+import audit
+import check
+from netcache import NetCache
+import notify
+import profiling
+import registry
 import rss
+import workerpool
+
+HOSTLIMITS_NAME = "hostlimits.db"
+# Загрузчики запускаются в своей группе процессов: Ctrl+C получает только этот процесс,
+# а прерывать ли загрузчики, решает он сам, см. run_daemon
+if os.name == "nt":
+    _CHILD_GROUP = {"creationflags": sp.CREATE_NEW_PROCESS_GROUP}
+else:
+    _CHILD_GROUP = {"start_new_session": True}
 
 def get_result(out: bytes, err: bytes) -> int|float:
     if err:
@@ -30,30 +53,344 @@ def sublists(lst: rss.RSSData, sublist_size: int) -> Iterator[rss.RSSData]:
     for i in range(0, len(lst), sublist_size):
         yield lst[i:i + sublist_size]
 
+def arg_parser() -> argparse.ArgumentParser:
+    """Парсер аргументов командной строки
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        '-no-async',
+        help = 'Отключение быстрого (асинхронного) скачивания',
+        action = 'store_true'
+    )
+    parser.add_argument(
+        '-in-process',
+        help = (
+            'Скачивать все комиксы в этом процессе в одном цикле событий, '
+            'а не запускать скрипт загрузчика на каждый комикс'
+        ),
+        action = 'store_true'
+    )
+    parser.add_argument(
+        '-pool',
+        help = (
+            'Скачивать в пуле из N постоянных процессов: каждый загрузчик работает '
+            'в отдельном процессе, но интерпретатор не запускается на каждый комикс. 0 — без пула'
+        ),
+        type = int,
+        default = 0
+    )
+    parser.add_argument(
+        '-job-timeout',
+        help = 'Наибольшее время скачивания одного комикса в пуле, в секундах',
+        type = float,
+        default = 3600
+    )
+    parser.add_argument(
+        '-stage',
+        help = (
+            'Быстрая локальная папка, в которой загрузчики готовят файлы комиксов, '
+            'перенося их в папки комиксов по окончании скачивания каждого. '
+            'Полезна, если библиотека лежит на сетевом диске'
+        ),
+        type = str,
+        default = None
+    )
+    parser.add_argument(
+        '-worker',
+        help = (
+            'Работать узлом распределённого скачивания с общей rss.db: комиксы берутся '
+            'в аренду пачками, поэтому несколько узлов не качают один комикс одновременно. '
+            'Значение — идентификатор узла, по умолчанию имя хоста и номер процесса'
+        ),
+        nargs = '?',
+        const = f"{socket.gethostname()}:{os.getpid()}",
+        default = None
+    )
+    parser.add_argument(
+        '-lease-batch',
+        help = 'Сколько комиксов узел берёт в аренду за раз в режиме -worker',
+        type = int,
+        default = 5
+    )
+    parser.add_argument(
+        '-check',
+        help = (
+            'Только проверить, у каких комиксов есть новые страницы, без скачивания. '
+            'Результат выводится и сохраняется в таблицу rss_available'
+        ),
+        action = 'store_true'
+    )
+    parser.add_argument(
+        '-check-per-host',
+        help = 'Наибольшее число одновременных проверок комиксов одного хоста',
+        type = int,
+        default = 4
+    )
+    parser.add_argument(
+        '-audit',
+        help = (
+            'Проверить папки всех комиксов: найти недостающие и битые страницы и части '
+            'и записать их в очередь починки, таблицу rss_repair'
+        ),
+        action = 'store_true'
+    )
+    parser.add_argument(
+        '-audit-workers',
+        help = 'Число процессов проверки папок, по умолчанию по числу ядер, 0 — без пула',
+        type = int,
+        default = None
+    )
+    parser.add_argument(
+        '-audit-online',
+        help = 'Сверять папки с find_last и списком частей источника, а не только с rss.db',
+        action = 'store_true'
+    )
+    parser.add_argument(
+        '-repair',
+        help = (
+            'Скачать страницы и части из очереди починки обычными загрузчиками, '
+            'не меняя номер первой непрочитанной страницы'
+        ),
+        action = 'store_true'
+    )
+    parser.add_argument(
+        '-daemon',
+        help = (
+            'Работать постоянно: проверять комиксы по их расписанию, '
+            'перечитывая rss.db перед каждым циклом. Завершается по SIGTERM или Ctrl+C'
+        ),
+        action = 'store_true'
+    )
+    parser.add_argument(
+        '-interval',
+        help = 'Наибольший промежуток между циклами проверки в режиме -daemon, в секундах',
+        type = float,
+        default = 300
+    )
+    parser.add_argument(
+        '-all',
+        help = 'Проверить все незавершённые комиксы, не дожидаясь их времени проверки',
+        action = 'store_true'
+    )
+    parser.add_argument(
+        '-profile',
+        help = 'Вывести по окончании таблицу времени этапов скачивания',
+        action = 'store_true'
+    )
+    parser.add_argument(
+        '-pstats',
+        help = 'Файл, в который сохраняется общая статистика cProfile',
+        type = str,
+        default = None
+    )
+    parser.add_argument(
+        '-notify',
+        help = (
+            'Способ показа сводки обновлений: всплывающее уведомление Windows (toast), '
+            'консоль (stdout), файл (file) или без уведомлений (none). '
+            'По умолчанию toast в Windows, иначе stdout'
+        ),
+        choices = notify.KINDS,
+        default = 'auto'
+    )
+    parser.add_argument(
+        '-notify-file',
+        help = 'Файл, в который дописываются сводки обновлений для -notify file',
+        type = str,
+        default = 'updates.log'
+    )
+    return parser
+
 def main():
-    toaster = ToastNotifier()
+    args = arg_parser().parse_args()
+
+    if args.check:
+        run_check(args)
+        return
+    if args.audit:
+        run_audit(args)
+        return
+    if args.repair:
+        run_repair(args)
+        return
+
+    # Служебные файлы запуска, общие для всех загрузчиков
+    run_dir = tempfile.mkdtemp(prefix="comic_run_")
+    try:
+        if args.daemon:
+            run_daemon(args, run_dir)
+        else:
+            run(args, run_dir)
+    finally:
+        shutil.rmtree(run_dir, ignore_errors=True)
+
+def run(args: argparse.Namespace, run_dir: str):
+    """Проверка и скачивание всех комиксов
+
+    Args:
+        args: Аргументы командной строки
+        run_dir: Папка служебных файлов запуска
+    """
+    # Общий сетевой кэш: загрузчики делят разрешённые адреса и копят статистику соединений
+    netcache = NetCache(os.path.join(run_dir, "netcache.db"))
+    # Подобранные загрузчиками числа одновременных запросов к хостам, хранятся между запусками
+    hostlimits_path = os.path.abspath(HOSTLIMITS_NAME)
+
+    # Профилирование: загрузчики сохраняют замеры в отдельные файлы, которые сводятся в конце
+    profile_dir: str|None = None
+    profiler: cProfile.Profile|None = None
+    if args.profile or args.pstats:
+        profile_dir = run_dir
+        profiling.enable(module="__main__")
+    if args.pstats:
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+    # Обновления копятся и показываются одной сводкой в конце запуска
+    notifier = notify.create(args.notify, args.notify_file)
     db = rss.RSSDB(rss.DB_NAME)
-    db.service_db()
+    with profiling.phase("db"):
+        db.service_db()
 
-    rss_list = db.get_db()
+    with (
+        workerpool.WorkerPool(args.pool, args.job_timeout, netcache.path, hostlimits_path)
+        if args.pool else contextlib.nullcontext()
+    ) as pool:
+        if args.worker:
+            rss_list = download_leased(
+                args, db, notifier, netcache, hostlimits_path, profile_dir, pool
+            )
+        else:
+            with profiling.phase("db"):
+                # Проверяются только комиксы, время проверки которых по их частоте обновлений подошло
+                rss_list = db.get_db() if args.all else db.get_due()
+            print(f"К проверке комиксов: {len(rss_list)}")
+            download_batch(
+                args, db, rss_list, notifier, netcache, hostlimits_path, profile_dir, pool
+            )
+
+    notifier.flush()
+    print(f"Сеть: {netcache.get_stats()}")
+
+    if profile_dir:
+        print_profile(rss_list, profile_dir, profiler, args.pstats)
+
+def download_batch(
+    args: argparse.Namespace,
+    db: rss.RSSDB,
+    rss_list: rss.RSSData,
+    notifier: notify.Notifier,
+    netcache: NetCache,
+    hostlimits_path: str,
+    profile_dir: str|None = None,
+    pool: workerpool.WorkerPool|None = None,
+    stop: threading.Event|None = None,
+    runner: asyncio.Runner|None = None
+):
+    """Скачивание комиксов выбранным способом: в пуле процессов, в этом процессе
+    или отдельным процессом на комикс
+    """
+    if pool is not None:
+        download_in_pool(args, db, rss_list, notifier, pool, stop)
+    elif args.in_process:
+        download_in_process(args, db, rss_list, notifier, netcache, hostlimits_path, stop, runner)
+    else:
+        download(args, db, rss_list, notifier, netcache, hostlimits_path, profile_dir, stop)
 
+def download_leased(
+    args: argparse.Namespace,
+    db: rss.RSSDB,
+    notifier: notify.Notifier,
+    netcache: NetCache,
+    hostlimits_path: str,
+    profile_dir: str|None = None,
+    pool: workerpool.WorkerPool|None = None,
+    stop: threading.Event|None = None,
+    runner: asyncio.Runner|None = None
+) -> rss.RSSData:
+    """Скачивание комиксов, взятых в аренду этим узлом, пачками по -lease-batch
+
+    Пока пачка качается, аренды продлеваются в фоне. Комиксы, аренду которых узел
+    потерял, не записываются: их уже взял другой узел.
+
+    Returns:
+        rss.RSSData: Все скачанные узлом комиксы
+    """
+    rss_items: list[rss.RSSRow] = []
+    while not (stop is not None and stop.is_set()):
+        with profiling.phase("db"):
+            rss_list = db.lease_due(args.worker, args.lease_batch)
+        if not rss_list:
+            break
+        print(f"Узел {args.worker} взял комиксов: {len(rss_list)}")
+        rss_items.extend(rss_list)
+        try:
+            with rss.LeaseKeeper(db):
+                download_batch(
+                    args, db, rss_list, notifier, netcache, hostlimits_path, profile_dir, pool, stop, runner
+                )
+        finally:
+            # Недокачанные комиксы сразу доступны другим узлам
+            db.release_leases()
+    return rss.RSSData(rss_items)
+
+def download(
+    args: argparse.Namespace,
+    db: rss.RSSDB,
+    rss_list: rss.RSSData,
+    notifier: notify.Notifier,
+    netcache: NetCache,
+    hostlimits_path: str,
+    profile_dir: str|None = None,
+    stop: threading.Event|None = None
+):
+    """Скачивание комиксов группами по 5 загрузчиков
+
+    Args:
+        args: Аргументы командной строки
+        db: БД комиксов
+        rss_list: Комиксы к скачиванию
+        notifier: Сборщик обновлений
+        netcache: Общий сетевой кэш
+        hostlimits_path: Файл подобранных чисел одновременных запросов
+        profile_dir: Папка замеров загрузчиков, если профилирование включено
+        stop: Событие остановки, проверяется перед каждой группой
+    """
     for rss_sublist in sublists(rss_list, 5):
+        if stop is not None and stop.is_set():
+            # Остановка между группами: уже скачанное записано в БД
+            break
         procs: dict[int, sp.Popen] = {}
         # Добавление задач
         for rss_item in rss_sublist:
             if rss_item.ended:
                 # Завершённые комиксы пропускаем
                 continue
+            # exec_module_path может быть идентификатором источника из реестра
+            script = registry.script_path(rss_item.exec_module_path, rss_item.url)
+            command = [
+                sys.executable, script, rss_item.url, str(rss_item.last_num),
+                "-folder", rss_item.dir,
+                "-netcache", netcache.path,
+                "-hostlimits", hostlimits_path,
+            ]
+            if rss_item.desc:
+                command.append("-desc")
+            if rss_item.imgtitle:
+                command.append("-imgtitle")
+            if args.no_async:
+                command.append("-no-async")
+            if args.stage:
+                command.extend(["-stage", args.stage])
+            if profile_dir:
+                command.extend(["-profile", os.path.join(profile_dir, f"{rss_item.id}.json")])
+                if args.pstats:
+                    command.extend(["-pstats", os.path.join(profile_dir, f"{rss_item.id}.pstats")])
             try:
-                procs[rss_item.id] = (
-                    sp.Popen(
-                        f'python "{rss_item.exec_module_path}" "{rss_item.url}" {rss_item.last_num} '
-                        f'-folder "{rss_item.dir}"'
-                        f'{" -desc" if rss_item.desc else ""}'
-                        f'{" -imgtitle" if rss_item.imgtitle else ""}'
-                        f'{" -no-async" if "-no-async" in sys.argv else ""}',
-                        stdin=sp.PIPE, stdout=sp.PIPE, stderr=sp.PIPE
-                    )
+                procs[rss_item.id] = sp.Popen(
+                    command,
+                    stdin=sp.PIPE, stdout=sp.PIPE, stderr=sp.PIPE,
+                    **_CHILD_GROUP
                 )
                 print(f"{rss_item.name} добавлен")
             except urllib.error.URLError as err:
@@ -61,23 +398,321 @@ def main():
                 raise err
 
         # Ожидание ответов
-        for rss_item in rss_sublist:
-            if rss_item.ended:
-                # Завершённые комиксы пропускаем
-                continue
-            print(f"Скачивание {rss_item.name}")
-            procs[rss_item.id].wait()
-            new_last_num = get_result(*(procs[rss_item.id].communicate()))
-            if new_last_num - rss_item.last_num > 0.001:
+        try:
+            for rss_item in rss_sublist:
+                if rss_item.ended:
+                    # Завершённые комиксы пропускаем
+                    continue
+                print(f"Скачивание {rss_item.name}")
+                procs[rss_item.id].wait()
+                new_last_num = get_result(*(procs[rss_item.id].communicate()))
+                save_result(db, notifier, rss_item, new_last_num)
+                print(f"Скачивание {rss_item.name} завершено")
+        except KeyboardInterrupt:
+            # Принудительная остановка: загрузчики группы прерываются
+            for proc in procs.values():
+                proc.terminate()
+            raise
+
+def save_result(
+    db: rss.RSSDB,
+    notifier: notify.Notifier,
+    rss_item: rss.RSSRow,
+    new_last_num: int|float
+):
+    """Запись результата загрузчика в БД и сводку обновлений"""
+    try:
+        if new_last_num - rss_item.last_num > 0.001:
+            with profiling.phase("db"):
                 db.set_last_num(rss_item.id, new_last_num)
-                toaster.show_toast(
-                    "RSS",
-                    f"Обновление: {rss_item.name}\n"
-                    f"Добавлена {new_last_num-1} страница"
-                )
-            else:
+            notifier.add(rss_item.name, f"добавлена {new_last_num-1} страница")
+        else:
+            with profiling.phase("db"):
                 db.set_last_chk(rss_item.id)
+    except rss.LeaseLostError:
+        print(f"{rss_item.name}: аренда перешла к другому узлу, результат не записан")
+
+def download_in_pool(
+    args: argparse.Namespace,
+    db: rss.RSSDB,
+    rss_list: rss.RSSData,
+    notifier: notify.Notifier,
+    pool: workerpool.WorkerPool,
+    stop: threading.Event|None = None
+):
+    """Скачивание комиксов в пуле постоянных процессов
+
+    Args:
+        args: Аргументы командной строки
+        db: БД комиксов
+        rss_list: Комиксы к скачиванию
+        notifier: Сборщик обновлений
+        pool: Пул процессов
+        stop: Событие остановки, после него новые комиксы не начинаются
+    """
+    rss_items: dict[int, rss.RSSRow] = {}
+    jobs: list[workerpool.JobDict] = []
+    for rss_item in rss_list:
+        if rss_item.ended:
+            # Завершённые комиксы пропускаем
+            continue
+        rss_items[rss_item.id] = rss_item
+        jobs.append(workerpool.JobDict({
+            "rss_id": rss_item.id,
+            "exec_module_path": rss_item.exec_module_path,
+            "url": rss_item.url,
+            "first": rss_item.last_num,
+            "folder": rss_item.dir,
+            "desc": rss_item.desc,
+            "imgtitle": rss_item.imgtitle,
+            "use_async": not args.no_async,
+            "stage": args.stage,
+        }))
+    for result in pool.map(jobs, stop):
+        rss_item = rss_items[result["rss_id"]]
+        new_last_num = result["last_num"]
+        if result["error"] or new_last_num is None:
+            write_log(f"{rss_item.name}: {result['error']}\n".encode())
+            print(f"{rss_item.name}: {result['error']}")
+            new_last_num = -1
+        save_result(db, notifier, rss_item, new_last_num)
+        print(f"Скачивание {rss_item.name} завершено за {result['elapsed']:.1f} с")
+
+def download_in_process(
+    args: argparse.Namespace,
+    db: rss.RSSDB,
+    rss_list: rss.RSSData,
+    notifier: notify.Notifier,
+    netcache: NetCache,
+    hostlimits_path: str,
+    stop: threading.Event|None = None,
+    runner: asyncio.Runner|None = None
+):
+    """Скачивание комиксов в этом процессе, загрузчики берутся из реестра
+
+    Все комиксы качаются в одном цикле событий, одновременно не больше 5,
+    как и при запуске отдельных загрузчиков. При -no-async обычное скачивание
+    каждого комикса выполняется в отдельном потоке.
+
+    Args:
+        args: Аргументы командной строки
+        db: БД комиксов
+        rss_list: Комиксы к скачиванию
+        notifier: Сборщик обновлений
+        netcache: Общий сетевой кэш
+        hostlimits_path: Файл подобранных чисел одновременных запросов
+        stop: Событие остановки, проверяется перед каждым комиксом
+        runner: Цикл событий сеанса, см. registry.session_loop: его клиенты не закрываются.
+            По умолчанию скачивание идёт в новом цикле, клиенты закрываются по окончании
+    """
+    registry.configure(netcache=netcache.path, hostlimits=hostlimits_path)
+    if runner is None:
+        asyncio.run(_download_all(args, db, rss_list, notifier, stop))
+    else:
+        runner.run(_download_all(args, db, rss_list, notifier, stop, close=False))
+
+async def _download_all(
+    args: argparse.Namespace,
+    db: rss.RSSDB,
+    rss_list: rss.RSSData,
+    notifier: notify.Notifier,
+    stop: threading.Event|None = None,
+    close: bool = True
+):
+    semaphore = asyncio.Semaphore(5)
+
+    async def download_one(rss_item: rss.RSSRow):
+        async with semaphore:
+            if stop is not None and stop.is_set():
+                # Остановка между комиксами: уже скачанное записано в БД
+                return
+            print(f"Скачивание {rss_item.name}")
+            try:
+                downloader = registry.create(
+                    rss_item, use_async=not args.no_async, stage=args.stage
+                )
+                if downloader.use_async:
+                    result = await downloader.async_downloadcomic()
+                else:
+                    result = await asyncio.to_thread(downloader.downloadcomic)
+                new_last_num = registry.to_number(result)
+            except Exception as exc:
+                write_log(f"{rss_item.name}: {exc!r}\n".encode())
+                print(f"{rss_item.name}: {exc!r}")
+                new_last_num = -1
+            save_result(db, notifier, rss_item, new_last_num)
             print(f"Скачивание {rss_item.name} завершено")
 
+    try:
+        await asyncio.gather(*(
+            download_one(rss_item) for rss_item in rss_list if not rss_item.ended
+        ))
+    finally:
+        if close:
+            await registry.close()
+        else:
+            registry.save_stats()
+
+def run_daemon(args: argparse.Namespace, run_dir: str):
+    """Постоянная работа с проверкой комиксов по их расписанию
+
+    Сетевой кэш, подобранные ограничения и сборщик уведомлений живут весь сеанс,
+    обслуживание БД выполняется один раз при запуске. С -in-process один цикл событий
+    и общие клиенты загрузчиков с их соединениями и кэшем DNS тоже живут весь сеанс,
+    с -pool — процессы пула; без них загрузчики запускаются отдельными процессами.
+    Перед каждым циклом rss.db перечитывается, поэтому правки таблицы подхватываются
+    без перезапуска. По первому SIGTERM или Ctrl+C текущая группа докачивается и её
+    результаты записываются в БД, по второму загрузчики прерываются.
+
+    Args:
+        args: Аргументы командной строки
+        run_dir: Папка служебных файлов сеанса
+    """
+    stop = threading.Event()
+
+    def on_signal(signum: int, frame):
+        if stop.is_set():
+            raise KeyboardInterrupt
+        print("Остановка после текущей группы комиксов")
+        stop.set()
+
+    signal.signal(signal.SIGINT, on_signal)
+    signal.signal(signal.SIGTERM, on_signal)
+
+    netcache = NetCache(os.path.join(run_dir, "netcache.db"))
+    hostlimits_path = os.path.abspath(HOSTLIMITS_NAME)
+    # Таблица времени этапов выводится после каждого цикла, статистика cProfile — по окончании
+    profile_dir: str|None = None
+    profiler: cProfile.Profile|None = None
+    if args.profile or args.pstats:
+        profile_dir = run_dir
+        profiling.enable(module="__main__")
+    if args.pstats:
+        profiler = cProfile.Profile()
+        profiler.enable()
+    notifier = notify.create(args.notify, args.notify_file)
+    db = rss.RSSDB(rss.DB_NAME)
+    db.service_db()
+    # Комиксы сеанса, замеры которых сводятся по окончании
+    seen: dict[int, rss.RSSRow] = {}
+
+    with contextlib.ExitStack() as stack:
+        # Процессы пула живут весь сеанс
+        pool: workerpool.WorkerPool|None = None
+        if args.pool:
+            pool = workerpool.WorkerPool(args.pool, args.job_timeout, netcache.path, hostlimits_path)
+            pool.start()
+        runner: asyncio.Runner|None = None
+        if args.in_process and pool is None:
+            runner = stack.enter_context(registry.session_loop())
+        try:
+            while not stop.is_set():
+                if args.worker:
+                    rss_list = download_leased(
+                        args, db, notifier, netcache, hostlimits_path, profile_dir, pool, stop, runner
+                    )
+                else:
+                    rss_list = db.get_db() if args.all else db.get_due()
+                    # Полная проверка только в первом цикле, дальше — по расписанию
+                    args.all = False
+                    if rss_list:
+                        print(f"К проверке комиксов: {len(rss_list)}")
+                        download_batch(
+                            args, db, rss_list, notifier, netcache, hostlimits_path,
+                            profile_dir, pool, stop, runner
+                        )
+                if rss_list:
+                    notifier.flush()
+                    print(f"Сеть: {netcache.get_stats()}")
+                    seen.update((rss_item.id, rss_item) for rss_item in rss_list)
+                    if args.profile:
+                        print_profile(rss_list, profile_dir)
+                        # Каждый цикл в таблице со своими замерами
+                        profiling.TIMER.phases.clear()
+                # Ждём ближайшей проверки, но не дольше интервала: в БД могли добавить комиксы
+                delay = db.seconds_to_next_check()
+                if delay is None:
+                    delay = args.interval
+                stop.wait(min(max(delay, 1), args.interval))
+        except KeyboardInterrupt:
+            print("Работа прервана")
+            if pool is not None:
+                # Загрузчики в процессах пула прерываются
+                pool.close(wait=False)
+        finally:
+            if pool is not None:
+                pool.close()
+    notifier.flush()
+    notifier.join()
+    netcache.close()
+    if profiler is not None and profile_dir:
+        print_profile(rss.RSSData(seen.values()), profile_dir, profiler, args.pstats)
+    print("Работа завершена")
+
+def run_check(args: argparse.Namespace):
+    """Проверка наличия новых страниц у всех незавершённых комиксов
+
+    Args:
+        args: Аргументы командной строки
+    """
+    db = rss.RSSDB(rss.DB_NAME)
+    rss_list = db.get_db()
+    results = asyncio.run(check.check_all(rss_list, per_host=args.check_per_host))
+    db.set_available(results)
+    print(check.format_table(results))
+
+def run_audit(args: argparse.Namespace):
+    """Проверка папок всех комиксов и запись очереди починки
+
+    Args:
+        args: Аргументы командной строки
+    """
+    db = rss.RSSDB(rss.DB_NAME)
+    results = audit.audit_all(
+        db.get_db(),
+        workers = args.audit_workers,
+        online = args.audit_online,
+        cache = audit.CACHE_NAME
+    )
+    audit.save_queue(db, results)
+    print(audit.format_table(results))
+
+def run_repair(args: argparse.Namespace):
+    """Скачивание страниц и частей из очереди починки
+
+    Args:
+        args: Аргументы командной строки
+    """
+    db = rss.RSSDB(rss.DB_NAME)
+    registry.configure(hostlimits=os.path.abspath(HOSTLIMITS_NAME))
+    results = asyncio.run(audit.repair_all(db, use_async=not args.no_async, stage=args.stage))
+    print(audit.format_repair_table(results))
+
+def print_profile(
+    rss_list: rss.RSSData,
+    profile_dir: str,
+    profiler: cProfile.Profile|None = None,
+    pstats_output: str|None = None
+):
+    """Вывод сводной таблицы времени этапов и сохранение общей статистики cProfile"""
+    records = profiling.load_records(
+        os.path.join(profile_dir, f"{rss_item.id}.json") for rss_item in rss_list
+    )
+    records.append(profiling.TIMER.record)
+    print(profiling.format_table(records))
+
+    if profiler is not None and pstats_output:
+        profiler.disable()
+        main_pstats = os.path.join(profile_dir, "__main__.pstats")
+        profiler.dump_stats(main_pstats)
+        profiling.merge_pstats(
+            [
+                main_pstats,
+                *(os.path.join(profile_dir, f"{rss_item.id}.pstats") for rss_item in rss_list)
+            ],
+            pstats_output
+        )
+        print(f"Статистика cProfile сохранена в {pstats_output}")
+
 if __name__ == '__main__':
     main()
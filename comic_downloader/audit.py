@@ -0,0 +1,446 @@
+"""
+Проверка скачанной библиотеки и очередь починки
+
+Обычный запуск загрузчика начинает с первой непрочитанной страницы из rss.db и не замечает
+дыр в уже скачанном: удалённую страницу, картинку, обрезанную до проверки по содержимому,
+или часть, скачанную не целиком. Проверка обходит папки всех комиксов параллельно в пуле
+процессов: папки читаются через os.scandir, а картинки и архивы .cbz проверяются
+imagecheck.check_file по началу и концу файла через mmap.
+
+Найденное сравнивается с тем, что должно лежать на диске: у постраничных комиксов —
+страницы от первой скачанной до номера из rss.db, а с -audit-online ещё и не дальше
+find_last загрузчика; у комиксов с частями с -audit-online — части из списка источника
+до номера из rss.db. Без запроса к источнику у частей проверяются только уже скачанные.
+
+Недостающие и битые страницы и части записываются в таблицу rss_repair. Починка удаляет битые
+файлы и передаёт страницы и части обычным загрузчикам диапазонами first..last, поэтому
+скачивается только сломанное, а номер первой непрочитанной страницы в rss.db не меняется.
+
+Результаты проверки файлов хранятся в audit_cache.db по пути, размеру и времени изменения,
+поэтому повторная проверка читает только изменившиеся файлы.
+    python comic_downloader/__main__.py -audit [-audit-workers 8] [-audit-online]
+    python comic_downloader/__main__.py -repair
+"""
+
+from __future__ import annotations
+import asyncio
+import concurrent.futures
+from contextlib import closing as dbclosing
+import itertools
+import os
+import re
+import sqlite3
+from typing import Iterable, Iterator, TypedDict
+import imagecheck
+import pagelayout
+import registry
+import rss
+import tools
+
+# Файл результатов проверки файлов
+CACHE_NAME = "audit_cache.db"
+
+# Номер части в начале имени папки или архива: «12.5 - Название», «12»
+_CHAPTER_NUMBER = re.compile(r"(\d+(?:\.\d+)*)(?: - |$)")
+# Незаконченные файлы и описания страниц не проверяются
+_SKIPPED_SUFFIXES = (".part", ".tmp", ".txt")
+
+class RepairItemDict(TypedDict):
+    # Номер страницы или части
+    item: str
+    # missing — нет на диске, broken — файл битый или часть пуста
+    reason: str
+    # Битый файл, который удаляется перед починкой, пустая строка — если его нет
+    path: str
+
+class AuditTaskDict(TypedDict):
+    rss_id: int
+    name: str
+    url: str
+    dir: str
+    exec_module_path: str
+    last_num: int|float
+    online: bool
+    cache: str|None
+
+class AuditResultDict(TypedDict):
+    rss_id: int
+    name: str
+    # Найдено файлов страниц и частей
+    files: int
+    # Прочитано файлов, остальные проверены по кэшу
+    checked: int
+    items: list[RepairItemDict]
+    error: str|None
+
+class RepairResultDict(TypedDict):
+    rss_id: int
+    name: str
+    # Починено страниц и частей
+    repaired: int
+    # Осталось в очереди
+    left: int
+    error: str|None
+
+def chapter_key(number: str) -> tuple[int, ...]:
+    """Номер части для сравнения: младшие нули усекаются, как у mangalib.ChapterNumber"""
+    key = [int(part) for part in str(number).split(".")]
+    while key and key[-1] == 0:
+        del key[-1]
+    return tuple(key)
+
+def _chapter_item(key: tuple[int, ...]) -> str:
+    return ".".join(map(str, key)) or "0"
+
+def is_chapter_source(downloader_class: type) -> bool:
+    """Скачивает ли загрузчик комикс частями, а не страницами"""
+    return hasattr(downloader_class, "_chapter_folder")
+
+class _VerdictCache:
+    """Результаты проверки файлов одной папки комикса из файла кэша
+
+    Parameters
+    ----------
+    path: str | None
+        Файл кэша, None — без кэша
+    folder: str
+        Папка комикса
+    """
+    def __init__(self, path: str|None, folder: str):
+        self.path = path
+        self.folder = os.path.join(os.path.abspath(folder), "")
+        # Путь: размер, время изменения и результат
+        self._saved: dict[str, tuple[int, int, bool]] = {}
+        self._new: list[tuple[str, int, int, bool]] = []
+        self._seen: set[str] = set()
+        self.checked = 0
+        if path is not None and os.path.isfile(path):
+            with dbclosing(sqlite3.connect(path, timeout=30)) as connection:
+                self._saved = {
+                    row[0]: (row[1], row[2], bool(row[3]))
+                    for row in connection.execute(
+                        "select path, size, mtime_ns, correct from verdicts where path>=? and path<?",
+                        (self.folder, f"{self.folder[:-1]}{chr(ord(os.sep) + 1)}")
+                    )
+                }
+
+    def is_correct(self, path: str) -> bool:
+        """Цел ли файл, прочитанный заново, только если он изменился"""
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        self._seen.add(path)
+        saved = self._saved.get(path)
+        if saved is not None and saved[:2] == (stat.st_size, stat.st_mtime_ns):
+            return saved[2]
+        if imagecheck.is_checked(path):
+            correct = imagecheck.is_correct(imagecheck.check_file(path), stat.st_size)
+        else:
+            correct = imagecheck.is_correct(None, stat.st_size)
+        self.checked += 1
+        self._new.append((path, stat.st_size, stat.st_mtime_ns, correct))
+        return correct
+
+    def save(self):
+        """Запись новых результатов и удаление результатов исчезнувших файлов"""
+        if self.path is None:
+            return
+        with dbclosing(sqlite3.connect(self.path, timeout=30)) as connection:
+            with connection as cursor:
+                cursor.executemany(
+                    "delete from verdicts where path=?",
+                    [(path,) for path in self._saved.keys() - self._seen]
+                )
+                cursor.executemany(
+                    "insert or replace into verdicts (path, size, mtime_ns, correct) values (?, ?, ?, ?)",
+                    self._new
+                )
+
+def create_cache(path: str):
+    """Создание файла кэша до запуска пула, чтобы процессы не создавали его одновременно"""
+    with dbclosing(sqlite3.connect(path)) as connection:
+        with connection as cursor:
+            cursor.execute(
+                """CREATE TABLE IF NOT EXISTS verdicts (
+                path     TEXT     PRIMARY KEY,
+                size     INTEGER  NOT NULL,
+                mtime_ns INTEGER  NOT NULL,
+                correct  BOOLEAN  NOT NULL
+                )"""
+            )
+
+def _online_downloader(downloader_class: type, task: AuditTaskDict):
+    return downloader_class(
+        comic_name = task["url"],
+        first = task["last_num"],
+        folder = task["dir"],
+        is_write_description = False,
+        is_write_img_description = False,
+        use_async = False
+    )
+
+def _audit_pages(
+    task: AuditTaskDict,
+    downloader_class: type,
+    cache: _VerdictCache,
+    result: AuditResultDict
+):
+    """Страницы от первой скачанной до номера из rss.db"""
+    valid: set[int] = set()
+    broken: dict[int, list[str]] = {}
+    for folder, name in pagelayout.page_files(task["dir"]):
+        if name.endswith(_SKIPPED_SUFFIXES) or (page := pagelayout.page_number(name)) is None:
+            continue
+        result["files"] += 1
+        path = os.path.join(folder, name)
+        if cache.is_correct(path):
+            valid.add(page)
+        else:
+            broken.setdefault(page, []).append(path)
+    last = int(task["last_num"])
+    if task["online"]:
+        last = min(last, int(_online_downloader(downloader_class, task).find_last()))
+    # Страницы до первой скачанной не запрашивались, например, если комикс добавлен не с начала
+    first = min(valid | broken.keys(), default=1)
+    for page in range(first, last):
+        if page in valid:
+            continue
+        if page in broken:
+            result["items"].extend(
+                RepairItemDict(item=str(page), reason="broken", path=path) for path in broken[page]
+            )
+        else:
+            result["items"].append(RepairItemDict(item=str(page), reason="missing", path=""))
+
+def _chapter_entries(folder: str) -> Iterator[tuple[tuple[int, ...], os.DirEntry]]:
+    """Папки и архивы частей с номером в имени"""
+    with os.scandir(folder) as entries:
+        for entry in entries:
+            name = entry.name
+            if entry.is_file():
+                if not name.endswith(".cbz"):
+                    continue
+                name = name.removesuffix(".cbz")
+            elif not entry.is_dir():
+                continue
+            if match := _CHAPTER_NUMBER.match(name):
+                yield chapter_key(match[1]), entry
+
+def _audit_chapters(
+    task: AuditTaskDict,
+    downloader_class: type,
+    cache: _VerdictCache,
+    result: AuditResultDict
+):
+    """Скачанные части, а с запросом к источнику — ещё и части до номера из rss.db"""
+    present: set[tuple[int, ...]] = set()
+    for key, entry in _chapter_entries(task["dir"]):
+        item = _chapter_item(key)
+        if entry.is_file():
+            result["files"] += 1
+            if cache.is_correct(entry.path):
+                present.add(key)
+            else:
+                result["items"].append(RepairItemDict(item=item, reason="broken", path=entry.path))
+            continue
+        with os.scandir(entry.path) as pages:
+            files = [page.path for page in pages if page.is_file() and not page.name.endswith(_SKIPPED_SUFFIXES)]
+        result["files"] += len(files)
+        broken = [path for path in files if not cache.is_correct(path)]
+        if not files:
+            result["items"].append(RepairItemDict(item=item, reason="broken", path=""))
+        result["items"].extend(RepairItemDict(item=item, reason="broken", path=path) for path in broken)
+        if files and not broken:
+            present.add(key)
+    if not task["online"]:
+        return
+    downloader = _online_downloader(downloader_class, task)
+    downloader.find_last()
+    last = chapter_key(str(task["last_num"]))
+    queued = {item["item"] for item in result["items"]}
+    for chapter in downloader.chapters_data or []:
+        key = chapter_key(chapter.get("number", 0))
+        item = _chapter_item(key)
+        if key < last and key not in present and item not in queued:
+            queued.add(item)
+            result["items"].append(RepairItemDict(item=item, reason="missing", path=""))
+
+def audit_comic(task: AuditTaskDict) -> AuditResultDict:
+    """Проверка папки одного комикса, выполняется в процессе пула"""
+    result = AuditResultDict(
+        rss_id = task["rss_id"],
+        name = task["name"],
+        files = 0,
+        checked = 0,
+        items = [],
+        error = None
+    )
+    try:
+        if not os.path.isdir(task["dir"]):
+            raise FileNotFoundError(f"Нет папки {task['dir']}")
+        downloader_class = registry.resolve(task["exec_module_path"], task["url"])
+        cache = _VerdictCache(task["cache"], task["dir"])
+        if is_chapter_source(downloader_class):
+            _audit_chapters(task, downloader_class, cache, result)
+        else:
+            _audit_pages(task, downloader_class, cache, result)
+        result["checked"] = cache.checked
+        cache.save()
+    except Exception as exc:
+        result["error"] = f"{type(exc).__name__}: {exc}"
+    return result
+
+def audit_all(
+    rss_list: rss.RSSData,
+    workers: int|None = None,
+    online: bool = False,
+    cache: str|None = None
+) -> list[AuditResultDict]:
+    """Параллельная проверка папок всех комиксов, включая завершённые
+
+    Args:
+        rss_list: Комиксы из БД
+        workers: Число процессов, по умолчанию по числу ядер, 0 — проверка в этом процессе
+        online: Сверяться с find_last и списком частей источника
+        cache: Файл кэша результатов проверки файлов, None — без кэша
+    """
+    if cache is not None:
+        create_cache(cache)
+    tasks = [
+        AuditTaskDict(
+            rss_id = rss_item.id,
+            name = rss_item.name,
+            url = rss_item.url,
+            # Проверка не создаёт папки комиксов, которых нет
+            dir = rss_item.get_dir(create_path=False),
+            exec_module_path = rss_item.exec_module_path,
+            last_num = rss_item.last_num,
+            online = online,
+            cache = cache
+        )
+        for rss_item in rss_list
+    ]
+    if workers == 0:
+        return [audit_comic(task) for task in tasks]
+    with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+        return list(executor.map(audit_comic, tasks))
+
+def save_queue(db: rss.RSSDB, results: Iterable[AuditResultDict]):
+    """Запись очереди починки, у комиксов с ошибкой проверки остаётся прежняя"""
+    for result in results:
+        if result["error"] is None:
+            db.set_repair(result["rss_id"], result["items"])
+
+def _ranges(items: Iterable[str], chapters: bool) -> Iterator[tuple[str, str, list[str]]]:
+    """Диапазоны first..last для загрузчика и входящие в них страницы или части
+
+    Подряд идущие страницы скачиваются одним диапазоном, каждая часть — своим
+    """
+    if chapters:
+        for item in sorted(set(items), key=chapter_key):
+            yield item, _chapter_item(chapter_key(item) + (1,)), [item]
+        return
+    pages = sorted({int(item) for item in items})
+    for _, group in itertools.groupby(enumerate(pages), key=lambda pair: pair[1] - pair[0]):
+        numbers = [page for _, page in group]
+        yield str(numbers[0]), str(numbers[-1] + 1), [str(page) for page in numbers]
+
+def _remove_broken(items: Iterable[dict]):
+    """Удаление битых файлов, которые не изменились с проверки"""
+    for item in items:
+        path = item["path"]
+        if not path or not os.path.isfile(path):
+            continue
+        if not imagecheck.is_correct(imagecheck.check_file(path), os.path.getsize(path)):
+            os.remove(path)
+
+async def repair_all(
+    db: rss.RSSDB,
+    use_async: bool = True,
+    stage: str|None = None
+) -> list[RepairResultDict]:
+    """Скачивание страниц и частей из очереди починки обычными загрузчиками
+
+    Одновременно чинится не больше 5 комиксов, номер первой непрочитанной страницы не меняется
+
+    Args:
+        db: БД комиксов
+        use_async: Асинхронное скачивание, иначе — в отдельном потоке
+        stage: Промежуточная папка скачивания, см. staging
+    """
+    queue: dict[int, list[dict]] = {}
+    for row in db.get_repair():
+        queue.setdefault(row["rss_id"], []).append(row)
+    rss_items = {rss_item.id: rss_item for rss_item in db.get_db()}
+    semaphore = asyncio.Semaphore(5)
+
+    async def repair_one(rss_item: rss.RSSRow, items: list[dict]) -> RepairResultDict:
+        result = RepairResultDict(
+            rss_id = rss_item.id,
+            name = rss_item.name,
+            repaired = 0,
+            left = len({item["item"] for item in items}),
+            error = None
+        )
+        async with semaphore:
+            try:
+                downloader_class = registry.resolve(rss_item.exec_module_path, rss_item.url)
+                _remove_broken(items)
+                for first, last, numbers in _ranges(
+                    (item["item"] for item in items), is_chapter_source(downloader_class)
+                ):
+                    downloader = downloader_class(
+                        comic_name = rss_item.url,
+                        first = first,
+                        last = last,
+                        folder = rss_item.dir,
+                        is_write_description = rss_item.desc,
+                        is_write_img_description = rss_item.imgtitle,
+                        use_async = use_async,
+                        stage = stage
+                    )
+                    if downloader.use_async:
+                        downloaded = await downloader.async_downloadcomic()
+                    else:
+                        downloaded = await asyncio.to_thread(downloader.downloadcomic)
+                    # Загрузчик вернул конец диапазона — скачано всё, иначе диапазон остаётся в очереди
+                    if downloaded >= downloader.last:
+                        db.remove_repair(rss_item.id, numbers)
+                        result["repaired"] += len(numbers)
+                        result["left"] -= len(numbers)
+            except Exception as exc:
+                result["error"] = f"{type(exc).__name__}: {exc}"
+        return result
+
+    try:
+        return list(await asyncio.gather(*(
+            repair_one(rss_items[rss_id], items)
+            for rss_id, items in queue.items()
+            if rss_id in rss_items
+        )))
+    finally:
+        # Общие клиенты загрузчиков закрываются в том же цикле событий
+        await registry.close()
+
+def format_table(results: list[AuditResultDict]) -> str:
+    """Таблица результатов проверки: сначала комиксы, которые нужно чинить"""
+    rows: list[list[str]] = []
+    for result in sorted(results, key=lambda item: (not item["items"], item["name"] or "")):
+        missing = {item["item"] for item in result["items"] if item["reason"] == "missing"}
+        broken = {item["item"] for item in result["items"] if item["reason"] == "broken"}
+        rows.append([
+            str(result["name"]),
+            str(result["files"]),
+            str(result["checked"]),
+            str(len(missing)),
+            str(len(broken)),
+            result["error"] or "",
+        ])
+    return tools.format_table(["Комикс", "Файлов", "Прочитано", "Нет", "Битых", "Ошибка"], rows)
+
+def format_repair_table(results: list[RepairResultDict]) -> str:
+    """Таблица результатов починки"""
+    rows = [
+        [str(result["name"]), str(result["repaired"]), str(result["left"]), result["error"] or ""]
+        for result in sorted(results, key=lambda item: item["name"] or "")
+    ]
+    return tools.format_table(["Комикс", "Починено", "Осталось", "Ошибка"], rows)
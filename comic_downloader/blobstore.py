@@ -0,0 +1,243 @@
+"""
+Хранилище содержимого картинок с дедупликацией
+
+Одни и те же картинки попадают в библиотеку по нескольку раз: части перезаливаются под новыми
+номерами, у страниц AComics меняются заголовки, а MangaLib и HentaiLib отдают одинаковые
+комиксы. Хранилище — папка .blobs в корне библиотеки, где каждое содержимое лежит один раз
+под своим SHA-256, а файлы библиотеки становятся жёсткими ссылками на него
+(или reflink-копиями, если жёсткая ссылка невозможна).
+
+Загрузчик ищет .blobs в папке комикса и выше и, если находит, считает хэш прямо во время
+скачивания и связывает записанный файл с хранилищем. Файлы не больше
+tools.CORRECT_FILE_SIZE не связываются: загрузчики перезаписывают их на месте.
+
+Создание хранилища и перенос уже скачанной библиотеки:
+    python comic_downloader/blobstore.py корень_библиотеки [-workers 8] [-gc]
+"""
+
+import argparse
+import concurrent.futures
+from dataclasses import dataclass
+import hashlib
+import os
+import threading
+from typing import Iterator
+import imagecheck
+from tools import CORRECT_FILE_SIZE
+
+# Папка хранилища в корне библиотеки
+STORE_DIR = ".blobs"
+
+# Файлы, которые не переносятся в хранилище; базы SQLite меняются на месте
+_SKIP_SUFFIXES = (".part", ".tmp", ".layout", ".db", ".db-journal", ".db-wal")
+
+# ioctl FICLONE из linux/fs.h
+_FICLONE = 0x40049409
+
+def new_hash() -> "hashlib._Hash":
+    """Хэш, обновляемый по частям во время скачивания"""
+    return hashlib.sha256()
+
+def hash_file(path: str|os.PathLike, chunk_size: int = 1 << 20) -> str:
+    """SHA-256 файла, читаемого по частям"""
+    digest = new_hash()
+    with open(path, "rb") as file:
+        while chunk := file.read(chunk_size):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _reflink(src: str, dst: str):
+    """Копия с общими блоками на файловых системах с reflink (Btrfs, XFS)"""
+    try:
+        import fcntl
+    except ImportError as exc:
+        raise OSError("reflink недоступен") from exc
+    with open(src, "rb") as src_file, open(dst, "wb") as dst_file:
+        try:
+            fcntl.ioctl(dst_file.fileno(), _FICLONE, src_file.fileno())
+        except OSError:
+            dst_file.close()
+            os.remove(dst)
+            raise
+
+def _clone(src: str, dst: str):
+    """Жёсткая ссылка, иначе reflink"""
+    try:
+        os.link(src, dst)
+    except OSError:
+        _reflink(src, dst)
+
+def _tmp_path(path: str) -> str:
+    return f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+@dataclass(frozen=True)
+class BlobStore:
+    """Хранилище в папке root
+
+    Parameters
+    ----------
+    root: str
+        Папка хранилища, обычно корень_библиотеки/.blobs
+    """
+    root: str
+
+    def blob_path(self, digest: str) -> str:
+        """Путь к содержимому по хэшу"""
+        return os.path.join(self.root, digest[:2], digest)
+
+    def adopt(self, path: str|os.PathLike, digest: str|None = None) -> bool:
+        """Связывание файла библиотеки с хранилищем
+
+        Если такое содержимое уже есть, файл заменяется ссылкой на него, иначе файл
+        сам становится содержимым хранилища.
+
+        Args:
+            path: Файл библиотеки
+            digest: SHA-256 файла, если уже посчитан при скачивании
+
+        Returns:
+            bool: Удалось ли связать файл
+        """
+        path = os.fspath(path)
+        if digest is None:
+            digest = hash_file(path)
+        blob = self.blob_path(digest)
+        tmp = None
+        try:
+            if os.path.exists(blob):
+                if os.path.samefile(blob, path):
+                    return True
+                tmp = _tmp_path(path)
+                _clone(blob, tmp)
+                os.replace(tmp, path)
+            else:
+                os.makedirs(os.path.dirname(blob), exist_ok=True)
+                tmp = _tmp_path(blob)
+                _clone(path, tmp)
+                os.replace(tmp, blob)
+        except OSError:
+            if tmp is not None and os.path.exists(tmp):
+                os.remove(tmp)
+            return False
+        return True
+
+    def gc(self) -> int:
+        """Удаление содержимого, на которое не осталось жёстких ссылок из библиотеки
+
+        Returns:
+            int: Число удалённых файлов
+        """
+        removed = 0
+        for folder, _, names in os.walk(self.root):
+            for name in names:
+                path = os.path.join(folder, name)
+                if os.stat(path).st_nlink == 1:
+                    os.remove(path)
+                    removed += 1
+        return removed
+
+def find_store(folder: str|os.PathLike) -> BlobStore|None:
+    """Хранилище библиотеки: папка .blobs в folder или выше, None — если её нет"""
+    path = os.path.abspath(folder)
+    while True:
+        store = os.path.join(path, STORE_DIR)
+        if os.path.isdir(store):
+            return BlobStore(store)
+        parent = os.path.dirname(path)
+        if parent == path:
+            return None
+        path = parent
+
+def _library_files(root: str) -> Iterator[str]:
+    """Файлы библиотеки, которые стоит перенести в хранилище"""
+    for folder, dirs, names in os.walk(root):
+        if STORE_DIR in dirs:
+            dirs.remove(STORE_DIR)
+        for name in names:
+            if name.endswith(_SKIP_SUFFIXES):
+                continue
+            path = os.path.join(folder, name)
+            stat = os.stat(path)
+            # Файлы с несколькими ссылками уже связаны с хранилищем
+            if stat.st_size > CORRECT_FILE_SIZE and stat.st_nlink == 1:
+                yield path
+
+@dataclass
+class MigrateResult:
+    # Просмотрено файлов
+    files: int = 0
+    # Заменено ссылками на уже имевшееся содержимое
+    deduplicated: int = 0
+    # Освобождено байт
+    saved: int = 0
+    # Не удалось связать
+    failed: int = 0
+    # Битые картинки, их перекачают загрузчики, см. imagecheck
+    broken: int = 0
+
+def migrate(root: str, workers: int = 8) -> MigrateResult:
+    """Перенос библиотеки в хранилище, хэши файлов считаются в пуле потоков"""
+    store = BlobStore(os.path.join(root, STORE_DIR))
+    os.makedirs(store.root, exist_ok=True)
+    result = MigrateResult()
+    lock = threading.Lock()
+
+    def adopt(path: str):
+        size = os.path.getsize(path)
+        if imagecheck.is_checked(path) and not imagecheck.is_correct(imagecheck.check_file(path), size):
+            # Загрузчик перезапишет такой файл на месте
+            with lock:
+                result.broken += 1
+            return
+        digest = hash_file(path)
+        existed = os.path.exists(store.blob_path(digest))
+        linked = store.adopt(path, digest)
+        with lock:
+            result.files += 1
+            if not linked:
+                result.failed += 1
+            elif existed:
+                result.deduplicated += 1
+                result.saved += size
+
+    with concurrent.futures.ThreadPoolExecutor(max(workers, 1)) as executor:
+        for future in concurrent.futures.as_completed(
+            [executor.submit(adopt, path) for path in _library_files(root)]
+        ):
+            future.result()
+    return result
+
+def arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Перенос библиотеки в хранилище содержимого .blobs")
+    parser.add_argument(
+        'root',
+        help = 'Корень библиотеки, в нём создаётся хранилище .blobs',
+        type = str
+    )
+    parser.add_argument(
+        '-workers',
+        help = 'Число потоков подсчёта хэшей',
+        type = int,
+        default = 8
+    )
+    parser.add_argument(
+        '-gc',
+        help = 'Удалить содержимое хранилища, на которое не осталось ссылок из библиотеки',
+        action = 'store_true'
+    )
+    return parser
+
+def main(argv: list[str]|None = None):
+    args = arg_parser().parse_args(argv)
+    result = migrate(args.root, args.workers)
+    print(
+        f"Файлов: {result.files}, заменено ссылками: {result.deduplicated}, "
+        f"освобождено: {result.saved / 2**20:.1f} МБ, не удалось связать: {result.failed}, "
+        f"битых: {result.broken}"
+    )
+    if args.gc:
+        removed = BlobStore(os.path.join(args.root, STORE_DIR)).gc()
+        print(f"Удалено содержимого без ссылок: {removed}")
+
+if __name__ == '__main__':
+    main()
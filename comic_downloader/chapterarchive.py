@@ -0,0 +1,173 @@
+"""
+Архив части комикса в формате CBZ, собираемый по мере скачивания страниц
+
+Страницы приходят не по порядку, поэтому они ждут своей очереди в небольшом буфере
+и пишутся в архив без сжатия строго по номерам. Чтобы буфер не рос, страница начинает
+скачиваться, только когда она не дальше window страниц от следующей записываемой.
+Архив пишется во временный файл .part и переименовывается только после записи
+всех страниц, поэтому готовая часть определяется одним наличием архива.
+Если хоть одна страница не скачалась, временный файл удаляется, и часть качается заново
+при следующем запуске.
+"""
+
+from __future__ import annotations
+import asyncio
+import os
+import threading
+from typing import BinaryIO, Callable
+import zipfile
+
+class ChapterArchive:
+    """Архив части, страницы добавляются по номеру от 0 до pages - 1
+
+    Parameters
+    ----------
+    path: str
+        Путь к готовому архиву
+    pages: int
+        Число страниц части
+    window: int
+        Сколько страниц может скачиваться и ждать записи одновременно
+    on_commit: Callable[[str, int], None]|None
+        Вызывается с путём и размером готового архива
+    """
+    def __init__(
+        self,
+        path: str,
+        pages: int,
+        window: int = 8,
+        on_commit: Callable[[str, int], None]|None = None
+    ):
+        self.path = path
+        self.pages = pages
+        self.window = max(window, 1)
+        self.on_commit = on_commit
+        # Номер следующей записываемой страницы
+        self._next = 0
+        self._buffer: dict[int, tuple[str, bytes|None]] = {}
+        self._failed = False
+        self._file: BinaryIO|None = None
+        self._zip: zipfile.ZipFile|None = None
+        self._cond = threading.Condition()
+        # Асинхронные ожидающие очереди: номер страницы и будущее её цикла событий
+        self._waiters: list[tuple[int, asyncio.Future[None]]] = []
+
+    @property
+    def done(self) -> bool:
+        """Все страницы обработаны"""
+        return self._next >= self.pages
+
+    @property
+    def committed(self) -> bool:
+        """Архив записан полностью"""
+        return self.done and not self._failed
+
+    def _admitted(self, index: int) -> bool:
+        return index < self._next + self.window
+
+    def wait_turn(self, index: int):
+        """Ожидание очереди страницы перед её скачиванием"""
+        with self._cond:
+            self._cond.wait_for(lambda: self._admitted(index))
+
+    async def async_wait_turn(self, index: int):
+        """Асинхронное ожидание очереди страницы перед её скачиванием"""
+        with self._cond:
+            if self._admitted(index):
+                return
+            future: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+            self._waiters.append((index, future))
+        await future
+
+    def _wake(self):
+        self._cond.notify_all()
+        waiting = []
+        for index, future in self._waiters:
+            if self._admitted(index):
+                # Страницы могут добавляться из потоков, будущее завершается в своём цикле
+                future.get_loop().call_soon_threadsafe(_set_done, future)
+            else:
+                waiting.append((index, future))
+        self._waiters = waiting
+
+    def add(self, index: int, name: str, data: bytes|None):
+        """Добавление страницы, None — страница не скачалась
+
+        Страницы до пропуска пишутся сразу, после — ждут в буфере.
+        """
+        with self._cond:
+            if index < self._next or index in self._buffer:
+                raise ValueError(f"Страница {index} уже добавлена")
+            self._buffer[index] = (name, data)
+            while self._next in self._buffer:
+                name, data = self._buffer.pop(self._next)
+                if data is None:
+                    self._failed = True
+                elif not self._failed:
+                    self._write(name, data)
+                self._next += 1
+            if self.done:
+                self._finish()
+            self._wake()
+
+    def _write(self, name: str, data: bytes):
+        if self._zip is None:
+            self._file = open(f"{self.path}.part", "wb")
+            self._zip = zipfile.ZipFile(self._file, "w", compression=zipfile.ZIP_STORED)
+        self._zip.writestr(name, data)
+
+    def _finish(self):
+        """Переименование полного архива или удаление неполного"""
+        tmp_path = f"{self.path}.part"
+        if self._zip is not None and self._file is not None:
+            self._zip.close()
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+            self._zip = self._file = None
+        if self._failed:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+        if not os.path.exists(tmp_path):
+            # Часть без страниц
+            return
+        os.replace(tmp_path, self.path)
+        if self.on_commit is not None:
+            self.on_commit(self.path, os.path.getsize(self.path))
+
+def _set_done(future: asyncio.Future[None]):
+    if not future.done():
+        future.set_result(None)
+
+def pack_folder(folder: str, path: str) -> int:
+    """Упаковка файлов папки части в архив path, как при скачивании
+
+    Returns:
+        int: Число упакованных файлов
+    """
+    names = sorted(
+        entry.name for entry in os.scandir(folder) if entry.is_file()
+    )
+    archive = ChapterArchive(path, len(names))
+    for index, name in enumerate(names):
+        with open(os.path.join(folder, name), "rb") as file:
+            archive.add(index, name, file.read())
+    return len(names)
+
+def unpack_archive(path: str, folder: str) -> int:
+    """Распаковка архива части в папку
+
+    Returns:
+        int: Число распакованных файлов
+    """
+    os.makedirs(folder, exist_ok=True)
+    with zipfile.ZipFile(path) as archive:
+        names = archive.namelist()
+        for name in names:
+            # Имена страниц не содержат папок, а чужие пути не выходят за папку части
+            with archive.open(name) as src, open(
+                os.path.join(folder, os.path.basename(name)), "wb"
+            ) as dst:
+                dst.write(src.read())
+    return len(names)
@@ -0,0 +1,95 @@
+"""
+Проверка наличия новых страниц без скачивания
+
+Для всех незавершённых комиксов в одном цикле событий одновременно вызывается
+async_find_last их загрузчика, одновременных проверок одного хоста не больше заданного.
+"""
+
+import asyncio
+from typing import TypedDict
+import urllib.parse
+import registry
+import rss
+import tools
+
+class CheckResultDict(TypedDict):
+    rss_id: int
+    name: str
+    last_num: int|float
+    # Номер следующей за последней доступной страницы, None — при ошибке
+    available: int|float|None
+    error: str|None
+
+async def check_one(rss_item: rss.RSSRow, semaphore: asyncio.Semaphore) -> CheckResultDict:
+    """Поиск последней доступной страницы одного комикса"""
+    result = CheckResultDict({
+        "rss_id": rss_item.id,
+        "name": rss_item.name,
+        "last_num": rss_item.last_num,
+        "available": None,
+        "error": None,
+    })
+    async with semaphore:
+        try:
+            # Только проверка: папка комикса не создаётся
+            downloader = registry.create(rss_item, create_folder=False)
+            result["available"] = registry.to_number(await downloader.async_find_last())
+        except Exception as exc:
+            result["error"] = f"{type(exc).__name__}: {exc}"
+    return result
+
+def host_key(rss_item: rss.RSSRow) -> str:
+    """Ключ хоста комикса для ограничения одновременных проверок
+
+    Ссылки вида ~name у AComics и имена комиксов MangaLib не содержат хоста,
+    поэтому хостом считается источник из реестра
+    """
+    source = registry.find_source(rss_item.exec_module_path, rss_item.url)
+    if source is not None:
+        return source.id
+    return urllib.parse.urlsplit(rss_item.url).netloc or rss_item.exec_module_path
+
+async def check_all(rss_list: rss.RSSData, per_host: int = 4) -> list[CheckResultDict]:
+    """Одновременная проверка всех незавершённых комиксов
+
+    Args:
+        rss_list: Комиксы из БД
+        per_host: Наибольшее число одновременных проверок комиксов одного хоста
+    """
+    semaphores: dict[str, asyncio.Semaphore] = {}
+    tasks = []
+    for rss_item in rss_list:
+        if rss_item.ended:
+            continue
+        host = host_key(rss_item)
+        if host not in semaphores:
+            semaphores[host] = asyncio.Semaphore(per_host)
+        tasks.append(check_one(rss_item, semaphores[host]))
+    try:
+        return list(await asyncio.gather(*tasks))
+    finally:
+        # Общие клиенты загрузчиков закрываются в том же цикле событий
+        await registry.close()
+
+def has_new(result: CheckResultDict) -> bool:
+    """Есть ли у комикса новые страницы"""
+    return result["available"] is not None and result["available"] - result["last_num"] > 0.001
+
+def format_table(results: list[CheckResultDict]) -> str:
+    """Таблица результатов проверки: сначала комиксы с новыми страницами"""
+    header = ["Комикс", "Следующая", "Доступно до", "Новое"]
+    rows: list[list[str]] = []
+    for result in sorted(results, key=lambda item: (not has_new(item), item["name"] or "")):
+        if result["error"]:
+            status = result["error"]
+        elif has_new(result):
+            status = "есть"
+        else:
+            status = "нет"
+        rows.append([
+            str(result["name"]),
+            f"{result['last_num']:g}",
+            "" if result["available"] is None else f"{result['available']:g}",
+            status,
+        ])
+    return tools.format_table(header, rows)
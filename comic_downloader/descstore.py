@@ -0,0 +1,254 @@
+"""
+Хранилище описаний страниц комикса
+
+Раньше описание каждой страницы AComics (-desc, -imgtitle) писалось в свой файл .txt
+рядом с картинкой. Описания почти всегда меньше tools.CORRECT_FILE_SIZE, поэтому проверка
+файла их не признавала, и они собирались и перезаписывались при каждом запуске.
+Теперь описания комикса хранятся в одном файле SQLite .descriptions.db в папке комикса:
+страница ссылается на текст по его SHA-1, поэтому одинаковые описания хранятся один раз.
+Загрузчик копит описания и пишет их пачками одной транзакцией, а перед тем,
+как вернуть номер новой страницы, записывает остаток.
+
+Выгрузка описаний в файлы .txt и перенос старых файлов .txt в хранилище:
+    python comic_downloader/descstore.py папка_комикса -export
+    python comic_downloader/descstore.py папка_комикса -import
+"""
+
+import argparse
+from contextlib import closing as dbclosing
+import hashlib
+import os
+import sqlite3
+import threading
+from typing import Iterator
+from pagelayout import page_number, read_layout
+
+# Файл хранилища в папке комикса
+STORE_FILE = ".descriptions.db"
+
+def _digest(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+class DescriptionStore:
+    """Описания страниц одного комикса
+
+    Parameters
+    ----------
+    path: str
+        Путь к файлу SQLite, создаётся при первой записи
+    batch: int
+        Сколько описаний копится перед записью
+    """
+    def __init__(self, path: str, batch: int = 100):
+        self.path = path
+        self.batch = max(batch, 1)
+        self._lock = threading.Lock()
+        # Записанные страницы: имя файла описания и хэш текста, читаются при первом обращении
+        self._pages: dict[int, tuple[str, str]]|None = None
+        # Ожидающие записи: страница, имя файла описания, хэш и текст
+        self._pending: dict[int, tuple[str, str, str]] = {}
+
+    @classmethod
+    def of_folder(cls, folder: str, batch: int = 100) -> "DescriptionStore":
+        """Хранилище папки комикса"""
+        return cls(os.path.join(folder, STORE_FILE), batch)
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30)
+
+    def _create(self, connection: sqlite3.Connection):
+        with connection as cursor:
+            cursor.execute(
+                """CREATE TABLE IF NOT EXISTS texts (
+                hash TEXT  PRIMARY KEY,
+                text TEXT  NOT NULL
+                )"""
+            )
+            cursor.execute(
+                """CREATE TABLE IF NOT EXISTS pages (
+                page INTEGER  PRIMARY KEY,
+                name TEXT     NOT NULL,
+                hash TEXT     NOT NULL REFERENCES texts(hash)
+                )"""
+            )
+
+    def _loaded(self) -> dict[int, tuple[str, str]]:
+        """Записанные страницы, вызывается под блокировкой"""
+        if self._pages is None:
+            self._pages = {}
+            # Без файла хранилище не создаётся до первой записи
+            if os.path.isfile(self.path):
+                with dbclosing(self._connect()) as connection:
+                    self._create(connection)
+                    self._pages = {
+                        page: (name, digest)
+                        for page, name, digest in connection.execute(
+                            "select page, name, hash from pages"
+                        )
+                    }
+        return self._pages
+
+    def has(self, page: int, name: str|None = None) -> bool:
+        """Есть ли описание страницы; если передано имя, то под этим именем"""
+        with self._lock:
+            saved = self._pending.get(page) or self._loaded().get(page)
+        return saved is not None and (name is None or saved[0] == name)
+
+    def add(self, page: int, name: str, text: str):
+        """Описание страницы, записывается пачкой; такое же уже записанное не пишется повторно
+
+        Args:
+            page: Номер страницы
+            name: Имя файла описания при выгрузке, например «1 - Заголовок.txt»
+            text: Текст описания
+        """
+        digest = _digest(text)
+        with self._lock:
+            if self._loaded().get(page) == (name, digest):
+                self._pending.pop(page, None)
+                return
+            self._pending[page] = (name, digest, text)
+            if len(self._pending) >= self.batch:
+                self._flush()
+
+    def flush(self) -> int:
+        """Запись накопленных описаний
+
+        Returns:
+            int: Число записанных страниц
+        """
+        with self._lock:
+            return self._flush()
+
+    def _flush(self) -> int:
+        if not self._pending:
+            return 0
+        pages = self._loaded()
+        pending = self._pending
+        with dbclosing(self._connect()) as connection:
+            self._create(connection)
+            with connection as cursor:
+                cursor.executemany(
+                    "insert or ignore into texts (hash, text) values (?, ?)",
+                    {(digest, text) for _, digest, text in pending.values()}
+                )
+                cursor.executemany(
+                    "insert or replace into pages (page, name, hash) values (?, ?, ?)",
+                    [(page, name, digest) for page, (name, digest, _) in pending.items()]
+                )
+                # Тексты, на которые больше не ссылается ни одна страница
+                if any(page in pages for page in pending):
+                    cursor.execute(
+                        "delete from texts where hash not in (select hash from pages)"
+                    )
+        for page, (name, digest, _) in pending.items():
+            pages[page] = (name, digest)
+        self._pending = {}
+        return len(pending)
+
+    def get(self, page: int) -> str|None:
+        """Текст описания страницы, None — если его нет"""
+        with self._lock:
+            if page in self._pending:
+                return self._pending[page][2]
+        if not os.path.isfile(self.path):
+            return None
+        with dbclosing(self._connect()) as connection:
+            row = connection.execute(
+                "select text from pages join texts using (hash) where page=?",
+                (page,)
+            ).fetchone()
+        return None if row is None else row[0]
+
+    def items(self) -> Iterator[tuple[int, str, str]]:
+        """Записанные описания по порядку страниц: номер, имя файла и текст"""
+        self.flush()
+        if not os.path.isfile(self.path):
+            return
+        with dbclosing(self._connect()) as connection:
+            yield from connection.execute(
+                "select page, name, text from pages join texts using (hash) order by page"
+            )
+
+def export_texts(folder: str, store: DescriptionStore|None = None) -> int:
+    """Выгрузка описаний в файлы .txt рядом со страницами по раскладке папки
+
+    Returns:
+        int: Число записанных файлов, совпадающие с уже имеющимися не перезаписываются
+    """
+    store = store or DescriptionStore.of_folder(folder)
+    layout = read_layout(folder)
+    written = 0
+    for page, name, text in store.items():
+        page_dir = layout.page_dir(folder, page)
+        os.makedirs(page_dir, exist_ok=True)
+        path = os.path.join(page_dir, name)
+        try:
+            with open(path, encoding="utf-8") as file:
+                if file.read() == text:
+                    continue
+        except OSError:
+            pass
+        with open(path, "w", encoding="utf-8") as file:
+            file.write(text)
+        written += 1
+    return written
+
+def import_texts(folder: str, store: DescriptionStore|None = None, remove: bool = True) -> int:
+    """Перенос файлов описаний .txt папки комикса и её подпапок в хранилище
+
+    Args:
+        folder: Папка комикса
+        store: Хранилище, по умолчанию хранилище папки
+        remove: Удалять ли перенесённые файлы
+
+    Returns:
+        int: Число перенесённых файлов
+    """
+    store = store or DescriptionStore.of_folder(folder)
+    files: list[str] = []
+    for path, _, names in os.walk(folder):
+        for name in names:
+            if not name.endswith(".txt") or (page := page_number(name)) is None:
+                continue
+            filepath = os.path.join(path, name)
+            with open(filepath, encoding="utf-8") as file:
+                store.add(page, name, file.read())
+            files.append(filepath)
+    store.flush()
+    if remove:
+        for filepath in files:
+            os.remove(filepath)
+    return len(files)
+
+def arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Хранилище описаний страниц комикса")
+    parser.add_argument(
+        'folders',
+        help = 'Папки комиксов',
+        nargs = '+',
+        type = str
+    )
+    parser.add_argument(
+        '-export',
+        help = 'Выгрузить описания в файлы .txt рядом со страницами',
+        action = 'store_true'
+    )
+    parser.add_argument(
+        '-import',
+        help = 'Перенести файлы описаний .txt в хранилище и удалить их',
+        dest = 'import_',
+        action = 'store_true'
+    )
+    return parser
+
+def main(argv: list[str]|None = None):
+    args = arg_parser().parse_args(argv)
+    for folder in args.folders:
+        if args.import_:
+            print(f"{folder}: перенесено описаний {import_texts(folder)}")
+        if args.export:
+            print(f"{folder}: выгружено описаний {export_texts(folder)}")
+
+if __name__ == '__main__':
+    main()
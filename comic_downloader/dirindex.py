@@ -0,0 +1,185 @@
+"""
+Индекс папок комиксов для проверок существования файлов
+
+Папка читается одним проходом os.scandir при первом обращении, дальше проверки
+существования отвечаются из памяти, а записанные загрузчиком файлы добавляются в индекс.
+Размер найденного файла запрашивается только при первой проверке именно этого файла
+(в Windows scandir отдаёт его сразу), поэтому отсутствующие страницы не стоят ни одного
+обращения к диску, что важно для библиотек на сетевых дисках.
+Индекс не следит за изменениями папки со стороны, поэтому загрузчик комикса
+при создании сбрасывает индексы своей папки.
+
+Результат проверки целостности картинки (см. imagecheck) тоже хранится в индексе:
+записанный файл проверяется по ходу записи, а найденный на диске — один раз при первой проверке.
+"""
+
+import os
+import threading
+import imagecheck
+from pagelayout import page_number
+from tools import CORRECT_FILE_SIZE
+
+class DirIndex:
+    """Индекс одной папки: имена файлов с размерами и имена вложенных папок
+
+    Parameters
+    ----------
+    path: str
+        Путь к папке, отсутствующая папка считается пустой
+    """
+    def __init__(self, path: str):
+        self.path = path
+        # Размер или запись scandir, размер которой ещё не запрашивался
+        self._files: dict[str, int|os.DirEntry] = {}
+        self._dirs: set[str] = set()
+        # Результаты проверки целостности файлов
+        self._verdicts: dict[str, bool] = {}
+        # Имена файлов по номеру страницы в начале имени, строится при первом запросе
+        self._numbers: dict[int, set[str]]|None = None
+        try:
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    if entry.is_dir():
+                        self._dirs.add(entry.name)
+                    else:
+                        self._files[entry.name] = entry
+        except (FileNotFoundError, NotADirectoryError):
+            pass
+
+    def size(self, name: str) -> int|None:
+        """Размер файла, None — если его нет"""
+        entry = self._files.get(name)
+        if entry is None or isinstance(entry, int):
+            return entry
+        try:
+            size = entry.stat().st_size
+        except OSError:
+            self.forget(name)
+            return None
+        self._files[name] = size
+        return size
+
+    def record(self, name: str, size: int, correct: bool|None = None):
+        """Учёт записанного файла и, если известен, результата его проверки"""
+        self._files[name] = size
+        if correct is None:
+            self._verdicts.pop(name, None)
+        else:
+            self._verdicts[name] = correct
+        if self._numbers is not None and (number := page_number(name)) is not None:
+            self._numbers.setdefault(number, set()).add(name)
+
+    def forget(self, name: str):
+        """Учёт удалённого или переименованного файла"""
+        self._files.pop(name, None)
+        self._verdicts.pop(name, None)
+        if self._numbers is not None and (number := page_number(name)) is not None:
+            self._numbers.get(number, set()).discard(name)
+
+    def verdict(self, name: str) -> bool|None:
+        """Результат проверки целостности файла, None — если файл ещё не проверялся"""
+        return self._verdicts.get(name)
+
+    def set_verdict(self, name: str, correct: bool):
+        """Учёт результата проверки целостности файла"""
+        self._verdicts[name] = correct
+
+    def numbered(self, number: int) -> list[str]:
+        """Имена файлов, начинающиеся с номера страницы number, см. pagelayout.page_number"""
+        if self._numbers is None:
+            self._numbers = {}
+            for name in self._files:
+                if (name_number := page_number(name)) is not None:
+                    self._numbers.setdefault(name_number, set()).add(name)
+        return sorted(self._numbers.get(number, ()))
+
+    def has_dir(self, name: str) -> bool:
+        """Есть ли вложенная папка"""
+        return name in self._dirs
+
+    def record_dir(self, name: str):
+        """Учёт созданной вложенной папки"""
+        self._dirs.add(name)
+
+class DirIndexes:
+    """Индексы папок процесса, общие для всех загрузчиков и потоков"""
+    def __init__(self):
+        self._indexes: dict[str, DirIndex] = {}
+        self._lock = threading.Lock()
+
+    def get(self, folder: str|os.PathLike) -> DirIndex:
+        """Индекс папки, при первом обращении папка читается"""
+        path = os.path.abspath(folder)
+        with self._lock:
+            if path not in self._indexes:
+                self._indexes[path] = DirIndex(path)
+            return self._indexes[path]
+
+    def file_size(self, filepath: str|os.PathLike) -> int|None:
+        """Размер файла по индексу его папки, None — если его нет"""
+        folder, name = os.path.split(os.path.abspath(filepath))
+        return self.get(folder).size(name)
+
+    def check_corrects_file(self, filepath: str|os.PathLike) -> bool:
+        """Проверка файла на существование и целостность
+
+        Картинки и архивы проверяются по содержимому один раз, см. imagecheck,
+        остальные файлы — по размеру, как tools.check_corrects_file
+        """
+        folder, name = os.path.split(os.path.abspath(filepath))
+        index = self.get(folder)
+        size = index.size(name)
+        if size is None:
+            return False
+        if not imagecheck.is_checked(name):
+            return size > CORRECT_FILE_SIZE
+        correct = index.verdict(name)
+        if correct is None:
+            correct = imagecheck.is_correct(imagecheck.check_file(os.path.join(folder, name)), size)
+            index.set_verdict(name, correct)
+        return correct
+
+    def record(
+        self,
+        filepath: str|os.PathLike,
+        size: int|None = None,
+        correct: bool|None = None
+    ):
+        """Учёт записанного файла
+
+        Args:
+            filepath: Путь к файлу
+            size: Размер в байтах; если не известен, например у текстовых файлов, то запрашивается
+            correct: Результат проверки целостности, полученный при записи, см. imagecheck.is_correct
+        """
+        folder, name = os.path.split(os.path.abspath(filepath))
+        if size is None:
+            size = os.path.getsize(filepath)
+        self.get(folder).record(name, size, correct)
+
+    def rename(self, src: str|os.PathLike, dst: str|os.PathLike):
+        """Переименование файла с учётом в индексах обеих папок"""
+        src_folder, src_name = os.path.split(os.path.abspath(src))
+        src_index = self.get(src_folder)
+        size = src_index.size(src_name)
+        correct = src_index.verdict(src_name)
+        os.replace(src, dst)
+        src_index.forget(src_name)
+        self.record(dst, size, correct)
+
+    def makedirs(self, path: str|os.PathLike):
+        """Создание папки, если её нет по индексу родительской папки"""
+        parent, name = os.path.split(os.path.abspath(path))
+        parent_index = self.get(parent)
+        if parent_index.has_dir(name):
+            return
+        os.makedirs(path, exist_ok=True)
+        parent_index.record_dir(name)
+
+    def forget(self, folder: str|os.PathLike):
+        """Сброс индексов папки и всех вложенных в неё"""
+        path = os.path.abspath(folder)
+        prefix = os.path.join(path, "")
+        with self._lock:
+            for key in [key for key in self._indexes if key == path or key.startswith(prefix)]:
+                del self._indexes[key]
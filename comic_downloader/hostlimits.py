@@ -0,0 +1,304 @@
+"""
+Подбор числа одновременных запросов к хосту
+
+Для каждого хоста число одновременных запросов подбирается по ходу скачивания
+по принципу AIMD: после каждого успешного запроса оно понемногу растёт,
+а при признаках перегрузки (рост задержки, таймауты, ответы 429, обрывы соединения)
+уменьшается вдвое. Подобранное значение сохраняется в файл SQLite,
+и следующий запуск начинает с него.
+
+Задержка сравнивается с наименьшей отдельно для страниц и для файлов (картинок, архивов):
+один хост отдаёт страницу за десятки миллисекунд, а картинку — за сотни, и без разделения
+каждая картинка выглядела бы перегрузкой. Наименьшая задержка понемногу подтягивается
+к текущей, поэтому одна случайно быстрая выборка не считает перегрузкой всё последующее.
+"""
+
+import asyncio
+import atexit
+import contextlib
+from contextlib import closing as dbclosing
+from dataclasses import dataclass
+import os
+import sqlite3
+import threading
+import time
+from typing import AsyncIterator, Iterator
+import urllib.parse
+
+# Доля, на которую наименьшая задержка подтягивается к текущей за каждый запрос
+BASE_DRIFT = .01
+# Расширения адресов страниц, остальные адреса с расширением считаются файлами
+_PAGE_EXTS = frozenset(("", ".html", ".htm", ".php"))
+
+def request_class(url: str) -> str:
+    """Класс запроса для замера задержки: page — страница или API, file — картинка или архив"""
+    ext = os.path.splitext(urllib.parse.urlsplit(url).path)[1].lower()
+    return "page" if ext in _PAGE_EXTS else "file"
+
+@dataclass
+class Latency:
+    """Сглаженная и наименьшая сглаженная задержки запросов одного класса"""
+    latency: float
+    base: float
+
+    def add(self, latency: float):
+        self.latency = .8 * self.latency + .2 * latency
+        self.base = min(self.latency, self.base + (self.latency - self.base) * BASE_DRIFT)
+
+class Slot:
+    """Место для одного запроса, см. AIMDLimiter.slot"""
+    def __init__(self):
+        self.congested = False
+
+    def congestion(self):
+        """Отметка перегрузки хоста, например, по ответу 429"""
+        self.congested = True
+
+class AIMDLimiter:
+    """Ограничитель числа одновременных запросов к одному хосту
+
+    Обычные (slot) и асинхронные (async_slot) запросы ждут освобождения места
+    независимо, поэтому в одном процессе ограничитель используется каким-то одним способом.
+
+    Parameters
+    ----------
+    limit: float
+        Начальное число одновременных запросов
+    minimum: int
+        Наименьшее число одновременных запросов
+    maximum: int
+        Наибольшее число одновременных запросов
+    latency_factor: float
+        Во сколько раз сглаженная задержка должна превысить наименьшую, чтобы считаться перегрузкой
+    decrease: float
+        Множитель уменьшения при перегрузке
+    congestion_errors: tuple[type[BaseException], ...]
+        Исключения, означающие перегрузку хоста
+    """
+    def __init__(
+        self,
+        limit: float = 8,
+        minimum: int = 1,
+        maximum: int = 32,
+        latency_factor: float = 3.,
+        decrease: float = .5,
+        congestion_errors: tuple[type[BaseException], ...] = (TimeoutError, ConnectionError)
+    ):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.limit = float(min(max(limit, minimum), maximum))
+        self.latency_factor = latency_factor
+        self.decrease = decrease
+        self.congestion_errors = congestion_errors
+        self.in_flight = 0
+        # Задержки по классам запросов, см. request_class
+        self.latencies: dict[str, Latency] = {}
+        self._last_decrease = 0.
+        self._condition = threading.Condition()
+        self._async_condition: asyncio.Condition|None = None
+        self._loop: asyncio.AbstractEventLoop|None = None
+
+    @property
+    def allowed(self) -> int:
+        """Сколько запросов можно выполнять одновременно прямо сейчас"""
+        return max(self.minimum, int(self.limit))
+
+    def on_success(self, latency: float, kind: str = "page"):
+        """Учёт успешного запроса класса kind, см. request_class"""
+        with self._condition:
+            stats = self.latencies.get(kind)
+            if stats is None:
+                stats = self.latencies[kind] = Latency(latency, latency)
+            else:
+                stats.add(latency)
+
+            if stats.latency > stats.base * self.latency_factor:
+                self._decrease(stats.latency)
+            else:
+                # Прибавка на каждый запрос, то есть примерно на 1 за круг запросов
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+
+    def on_congestion(self):
+        """Учёт перегрузки хоста"""
+        with self._condition:
+            self._decrease()
+
+    def _decrease(self, window: float|None = None):
+        # Один всплеск ошибок одновременных запросов уменьшает число лишь раз
+        if window is None:
+            window = max((stats.latency for stats in self.latencies.values()), default=0.)
+        now = time.monotonic()
+        if now - self._last_decrease < window:
+            return
+        self._last_decrease = now
+        self.limit = max(float(self.minimum), self.limit * self.decrease)
+
+    def _finish(self, slot: Slot, start: float, kind: str):
+        if slot.congested:
+            self.on_congestion()
+        else:
+            self.on_success(time.perf_counter() - start, kind)
+
+    @contextlib.contextmanager
+    def slot(self, kind: str = "page") -> Iterator[Slot]:
+        """Ожидание места для обычного запроса, на время запроса замеряется задержка
+
+        Args:
+            kind: Класс запроса, задержка сравнивается с задержкой запросов того же класса
+
+        Использование:
+            with limiter.slot() as slot:
+                resp = session.get(url)
+                if resp.status_code == 429:
+                    slot.congestion()
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: self.in_flight < self.allowed)
+            self.in_flight += 1
+        slot = Slot()
+        start = time.perf_counter()
+        try:
+            yield slot
+        except self.congestion_errors:
+            slot.congestion()
+            raise
+        finally:
+            self._finish(slot, start, kind)
+            with self._condition:
+                self.in_flight -= 1
+                self._condition.notify_all()
+
+    def _get_async_condition(self) -> asyncio.Condition:
+        # Условие привязано к циклу событий, при смене цикла создаётся новое
+        loop = asyncio.get_running_loop()
+        if self._async_condition is None or self._loop is not loop:
+            self._async_condition = asyncio.Condition()
+            self._loop = loop
+            self.in_flight = 0
+        return self._async_condition
+
+    @contextlib.asynccontextmanager
+    async def async_slot(self, kind: str = "page") -> AsyncIterator[Slot]:
+        """Ожидание места для асинхронного запроса, см. slot"""
+        condition = self._get_async_condition()
+        async with condition:
+            await condition.wait_for(lambda: self.in_flight < self.allowed)
+            self.in_flight += 1
+        slot = Slot()
+        start = time.perf_counter()
+        try:
+            yield slot
+        except self.congestion_errors:
+            slot.congestion()
+            raise
+        finally:
+            self._finish(slot, start, kind)
+            async with condition:
+                self.in_flight -= 1
+                condition.notify_all()
+
+class HostLimitStore:
+    """Файл подобранных чисел одновременных запросов
+
+    Parameters
+    ----------
+    path: str
+        Путь к файлу SQLite, создаётся при отсутствии
+    """
+    def __init__(self, path: str):
+        self.path = path
+        with dbclosing(self._connect()) as connection:
+            with connection as cursor:
+                cursor.execute(
+                    """CREATE TABLE IF NOT EXISTS host_limits (
+                    host        TEXT     PRIMARY KEY,
+                    concurrency REAL     NOT NULL,
+                    updated     DATETIME NOT NULL
+                    )"""
+                )
+
+    def _connect(self) -> sqlite3.Connection:
+        # Запись идёт из нескольких процессов, поэтому ждём освобождения файла
+        return sqlite3.connect(self.path, timeout=30)
+
+    def get(self, host: str) -> float|None:
+        """Сохранённое число одновременных запросов к хосту"""
+        with dbclosing(self._connect()) as connection:
+            row = connection.execute(
+                "select concurrency from host_limits where host=?",
+                (host,)
+            ).fetchone()
+        return None if row is None else row[0]
+
+    def set_many(self, limits: dict[str, float]):
+        """Сохранение чисел одновременных запросов к хостам"""
+        with dbclosing(self._connect()) as connection:
+            with connection as cursor:
+                cursor.executemany(
+                    """insert or replace into host_limits (host, concurrency, updated)
+                    values (?, ?, datetime('now'))""",
+                    limits.items()
+                )
+
+class HostLimiters:
+    """Ограничители процесса по хостам
+
+    Parameters
+    ----------
+    initial: float
+        Начальное число одновременных запросов к хосту без сохранённого значения
+    maximum: int
+        Наибольшее число одновременных запросов к хосту
+    congestion_errors: tuple[type[BaseException], ...]
+        Исключения, означающие перегрузку хоста
+    """
+    def __init__(
+        self,
+        initial: float = 8,
+        maximum: int = 32,
+        congestion_errors: tuple[type[BaseException], ...] = (TimeoutError, ConnectionError)
+    ):
+        self.initial = initial
+        self.maximum = maximum
+        self.congestion_errors = congestion_errors
+        self.store: HostLimitStore|None = None
+        self._limiters: dict[str, AIMDLimiter] = {}
+        self._lock = threading.Lock()
+
+    def add_congestion_errors(self, *errors: type[BaseException]):
+        """Добавление исключений перегрузки, в том числе для уже созданных ограничителей"""
+        with self._lock:
+            self.congestion_errors = (
+                *self.congestion_errors,
+                *(error for error in errors if error not in self.congestion_errors)
+            )
+            for limiter in self._limiters.values():
+                limiter.congestion_errors = self.congestion_errors
+
+    def use_store(self, path: str):
+        """Подключение файла сохранённых значений, они записываются при выходе из процесса"""
+        if self.store is None:
+            atexit.register(self.save)
+        if self.store is None or self.store.path != path:
+            self.store = HostLimitStore(path)
+
+    def get(self, host: str) -> AIMDLimiter:
+        """Ограничитель хоста"""
+        with self._lock:
+            if host not in self._limiters:
+                limit = None
+                if self.store is not None:
+                    limit = self.store.get(host)
+                self._limiters[host] = AIMDLimiter(
+                    limit = limit or self.initial,
+                    maximum = self.maximum,
+                    congestion_errors = self.congestion_errors
+                )
+            return self._limiters[host]
+
+    def save(self):
+        """Сохранение подобранных значений"""
+        if self.store is not None and self._limiters:
+            self.store.set_many({
+                host: limiter.limit for host, limiter in self._limiters.items()
+            })
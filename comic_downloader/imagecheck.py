@@ -0,0 +1,131 @@
+"""
+Проверка целостности скачанных картинок и архивов частей
+
+Раньше файл считался скачанным, если он больше tools.CORRECT_FILE_SIZE: обрезанная картинка
+или страница ошибки в HTML, сохранённая как .jpg, проходили проверку, а маленькая целая
+картинка — нет. Теперь по первым байтам определяется формат, а по последним — дописан ли
+файл до конца (маркер конца JPEG, блок IEND у PNG, завершающий байт GIF, размер RIFF у WebP,
+конец оглавления ZIP у архивов .cbz). Если сервер сообщил размер, он тоже сверяется.
+
+Для проверки нужны только начало и конец файла, поэтому при скачивании ImageValidator
+получает части по ходу записи, а уже лежащий на диске файл читается через mmap
+двумя небольшими кусками. Файлы неизвестного формата по-прежнему проверяются по размеру.
+"""
+
+import mmap
+import os
+from tools import CORRECT_FILE_SIZE
+
+# Сколько байт начала и конца файла нужно для проверки
+_HEAD = 16
+_TAIL = 64
+
+# Расширения файлов, которые проверяются по содержимому
+CHECKED_EXTS = frozenset((".jpg", ".jpeg", ".png", ".gif", ".webp", ".cbz", ".zip"))
+
+def image_kind(head: bytes) -> str|None:
+    """Формат по первым байтам файла, None — если он не распознан"""
+    if head.startswith(b"\xff\xd8\xff"):
+        return "jpeg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "png"
+    if head.startswith((b"GIF87a", b"GIF89a")):
+        return "gif"
+    if head.startswith(b"RIFF") and head[8:12] == b"WEBP":
+        return "webp"
+    if head.startswith((b"PK\x03\x04", b"PK\x05\x06")):
+        return "zip"
+    if head[4:8] == b"ftyp":
+        # AVIF, HEIC: конец файла ничем не отмечен
+        return "isobmff"
+    if head.lstrip()[:1] in (b"<", b"{"):
+        # Страница ошибки или ответ API вместо картинки
+        return "markup"
+    return None
+
+def verdict(head: bytes, tail: bytes, size: int, expected_size: int|None = None) -> bool|None:
+    """Цел ли файл по его началу, концу и размеру
+
+    Args:
+        head: Первые байты файла
+        tail: Последние байты файла
+        size: Размер файла
+        expected_size: Размер, который сообщил сервер, если известен
+
+    Returns:
+        bool|None: None — если формат не распознан и судить можно только по размеру
+    """
+    if expected_size is not None and size != expected_size:
+        return False
+    kind = image_kind(head)
+    if kind == "jpeg":
+        # После маркера конца бывают несколько байт мусора или выравнивания
+        return b"\xff\xd9" in tail
+    if kind == "png":
+        return b"IEND" in tail
+    if kind == "gif":
+        return tail.rstrip(b"\0").endswith(b";")
+    if kind == "webp":
+        return size >= int.from_bytes(head[4:8], "little") + 8
+    if kind == "zip":
+        return b"PK\x05\x06" in tail
+    if kind == "isobmff":
+        return True
+    if kind == "markup":
+        return False
+    return None
+
+def is_correct(result: bool|None, size: int) -> bool:
+    """Итог проверки: для нераспознанного формата — прежняя проверка размера"""
+    if result is None:
+        return size > CORRECT_FILE_SIZE
+    return result
+
+class ImageValidator:
+    """Проверка файла по мере его записи, без повторного чтения
+
+    Parameters
+    ----------
+    expected_size: int | None
+        Размер, который сообщил сервер, если известен
+    """
+    def __init__(self, expected_size: int|None = None):
+        self.expected_size = expected_size
+        self.size = 0
+        self._head = b""
+        self._tail = b""
+
+    def feed(self, chunk: bytes):
+        """Очередная записанная часть файла"""
+        if len(self._head) < _HEAD:
+            self._head += chunk[:_HEAD - len(self._head)]
+        self._tail = (self._tail + chunk[-_TAIL:])[-_TAIL:]
+        self.size += len(chunk)
+
+    def verdict(self) -> bool|None:
+        """Результат проверки записанного, см. verdict"""
+        return verdict(self._head, self._tail, self.size, self.expected_size)
+
+def check_bytes(data: bytes, expected_size: int|None = None) -> bool|None:
+    """Проверка содержимого, уже скачанного целиком, см. verdict"""
+    return verdict(data[:_HEAD], data[-_TAIL:], len(data), expected_size)
+
+def check_file(path: str|os.PathLike, expected_size: int|None = None) -> bool|None:
+    """Проверка файла на диске: начало и конец читаются через mmap, см. verdict
+
+    Returns:
+        bool|None: False — если файла нет или он пуст
+    """
+    try:
+        with open(path, "rb") as file:
+            size = os.fstat(file.fileno()).st_size
+            if size == 0:
+                return False
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                return verdict(data[:_HEAD], data[-_TAIL:], size, expected_size)
+    except (OSError, ValueError):
+        return False
+
+def is_checked(path: str|os.PathLike) -> bool:
+    """Проверяется ли файл по содержимому, иначе — только по размеру"""
+    return os.path.splitext(path)[1].lower() in CHECKED_EXTS
@@ -2,15 +2,15 @@
 https://www.collectedcurios.com/sequentialart.php
 """
 
-import os
+from __future__ import annotations
 import time
-from typing import Final
-import urllib.request
+from typing import TYPE_CHECKING, Final
 import asyncio
-import aiofile
-import aiohttp
-import requests
-from base_downloader import BaseDownloader, BasePageDownloader
+from base_downloader import BaseDownloader, BasePageDownloader, finishing
+
+if TYPE_CHECKING:
+    import aiohttp
+    import requests
 
 class Downloader(BaseDownloader):
     _COMIC_DOMAIN: Final[str] = "https://www.collectedcurios.com"
@@ -45,7 +45,8 @@ class Downloader(BaseDownloader):
         # Если нынешняя страница слишком большая,
         # то бинарный поиск чаще может оказаться избыточным,
         # например, если в итоге нужная страница окажется следующей
-        with requests.Session() as session:
+        with self._phase("index"):
+            session = self._sync_session()
             if not force_add_mode or self.first < 500:
                 self.last = self._find_last_mul(session=session)
             else:
@@ -56,7 +57,9 @@ class Downloader(BaseDownloader):
         """Бинарный поиск номера следующей за последней доступной
         страницы комикса на сервере
         """
-        exists_page = PageDownloader(self.first)
+        import requests
+
+        exists_page = PageDownloader(self.first, **self._params)
         if exists_page.page is None:
             raise ValueError("page is None")
         exists_page.page = int(exists_page.page)
@@ -126,7 +129,9 @@ class Downloader(BaseDownloader):
         """Последовательный поиск номера следующей за последней доступной
         страницы комикса на сервере
         """
-        exists_page = PageDownloader(self.first)
+        import requests
+
+        exists_page = PageDownloader(self.first, **self._params)
         if exists_page.page is None:
             raise ValueError("page is None")
         exists_page.page = int(exists_page.page)
@@ -147,11 +152,12 @@ class Downloader(BaseDownloader):
         """Запрос страницы комикса на сервере
         Возвращается код ответа
         """
-        if session:
-            _get = session.get
-        else:
-            _get = requests.get
-        with _get(comic_file_link) as response:
+        if session is None:
+            session = self._sync_session()
+        _get = session.get
+        with self._slot(comic_file_link) as slot, _get(comic_file_link) as response:
+            if response.status_code == 429:
+                slot.congestion()
             return response.status_code
 
     async def async_find_last(
@@ -161,8 +167,8 @@ class Downloader(BaseDownloader):
     ) -> int:
         """Поиск номера следующей за последней доступной страницы комикса на сервере
 
-        Поскольку асинхронность при используемом поиске не имеет смысла,
-        данная функция — всего лишь async синоним find_last()
+        Поиск последовательный, каждый шаг зависит от предыдущего ответа, поэтому
+        find_last выполняется в отдельном потоке и не останавливает цикл событий
 
         Parameters
         ----------
@@ -178,15 +184,13 @@ class Downloader(BaseDownloader):
 
             Если на сервере есть страницы с 1 по 10, но 11 ещё не вышла, то вернётся именно 11
         """
-        return self.find_last(force_add_mode=force_add_mode)
+        return await asyncio.to_thread(self.find_last, force_add_mode=force_add_mode)
 
+    @finishing
     def downloadcomic(self) -> int:
         # Асинхронное скачивание
         if self.use_async:
-            loop = asyncio.get_event_loop()
-            last_success = loop.run_until_complete(self.async_downloadcomic())
-            loop.close()
-            return last_success
+            return self._run_async(self.async_downloadcomic())
 
         # Обычное скачивание
         # Установка последней страницы при её отсутствии
@@ -196,38 +200,45 @@ class Downloader(BaseDownloader):
         if self.first >= self.last:
             return self.last
 
-        # Последовательно скачиваем страницы,
+        # Скачиваем страницы в пуле потоков, результаты приходят по порядку,
         # запоминаем, на какой странице необходимо начинать следующее скачивание
         last_success = self.first
-        for num in range(self.first, self.last):
-            # Загрузчик страниц
-            page_downloader = PageDownloader(num, **self._params)
-            if (result := page_downloader.download_comic_page()) and last_success == result:
+        # Загрузчики страниц
+        page_downloaders = (
+            PageDownloader(num, **self._params)
+            for num in range(self.first, self.last)
+        )
+        for result in self._map_in_threads(
+            PageDownloader.download_comic_page,
+            page_downloaders
+        ):
+            if result and last_success == result:
                 last_success = result + 1
         return last_success
 
+    @finishing
     async def async_downloadcomic(self) -> int:
         # Если последняя страница не указана, то узнаём её, собственно, номер
         if not self.last:
-            self.last = self.find_last()
+            self.last = await self.async_find_last()
 
         if self.first >= self.last:
             return self.last
 
         # Скачивание
-        async with aiohttp.ClientSession() as session:
-            # Создание списка задач
-            tasks = []
-            # reversed, так как задачи выполняются последний пришёл - первый ушёл,
-            # а нам надо по порядку
-            for page in reversed(range(self.first, self.last)):
-                # Загрузчик страниц
-                page_downloader = PageDownloader(page, **self._params)
-                tasks.append(page_downloader.async_download_comic_page(session=session))
-            # Запуск задач
-            results = await asyncio.gather(*tasks)
-            # Чистка результатов
-            results: list[int] = sorted(filter(bool, results))
+        session = await self._session()
+        # Создание списка задач
+        tasks = []
+        # reversed, так как задачи выполняются последний пришёл - первый ушёл,
+        # а нам надо по порядку
+        for page in reversed(range(self.first, self.last)):
+            # Загрузчик страниц
+            page_downloader = PageDownloader(page, **self._params)
+            tasks.append(page_downloader.async_download_comic_page(session=session))
+        # Запуск задач
+        results = await asyncio.gather(*tasks)
+        # Чистка результатов
+        results: list[int] = sorted(filter(bool, results))
 
         # Возврат следующей к скачиванию страницы
         if self.last - self.first == len(results):
@@ -265,18 +276,17 @@ class PageDownloader(BasePageDownloader, Downloader):
         return None
 
     def download_comic_page(self) -> int|None:
+        import requests
+
         if self.page is None:
             raise ValueError("page is None")
         # Путь к скачанному файлу
-        comic_filepath = os.path.join(self.folder, self._comic_filename())
+        comic_filepath = self._page_filepath(self._comic_filename())
         # Перескачивать уже существующий файл не нужно
         if not self._check_corrects_file(comic_filepath):
             try:
-                urllib.request.urlretrieve(
-                    self._comic_file_link(),
-                    comic_filepath
-                )
-            except TimeoutError:
+                self._sync_download(self._comic_file_link(), comic_filepath)
+            except (TimeoutError, requests.Timeout):
                 time.sleep(5)
                 return None
         # В случае успеха вернём номер страницы, иначе None
@@ -288,20 +298,38 @@ class PageDownloader(BasePageDownloader, Downloader):
         self,
         session: aiohttp.ClientSession|None = None
     ) -> int|None:
+        import aiofile
+
         if self.page is None:
             raise ValueError("page is None")
-        # Без сессии скачиваем страницу обычным способом
-        if not session:
-            return self.download_comic_page()
+        # Без сессии используем общую сессию запуска
+        if session is None:
+            session = await self._session()
 
         # Путь к скачанному файлу
-        comic_filepath = os.path.join(self.folder, self._comic_filename())
+        comic_filepath = self._page_filepath(self._comic_filename())
         # Перескачивать уже существующий файл не нужно
         if not self._check_corrects_file(comic_filepath):
+            comic_file_link = self._comic_file_link()
             try:
-                async with session.get(self._comic_file_link()) as resp:
+                async with self._async_slot(comic_file_link) as slot:
+                    with self._phase("transfer"):
+                        async with session.get(comic_file_link) as resp:
+                            if resp.status == 429:
+                                slot.congestion()
+                                raise TimeoutError(comic_file_link)
+                            content = await resp.read()
+                            expected_size = self._expected_size(resp.headers)
+                self._unlink_shared(comic_filepath)
+                with self._phase("write"):
                     async with aiofile.async_open(comic_filepath, 'wb') as file:
-                        await file.write(await resp.read())
+                        await file.write(content)
+                self._file_written(
+                    comic_filepath,
+                    len(content),
+                    self._content_digest(content),
+                    self._content_correct(content, expected_size)
+                )
             except TimeoutError:
                 await asyncio.sleep(5)
                 return None
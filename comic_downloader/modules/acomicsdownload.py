@@ -2,15 +2,123 @@
 https://acomics.ru
 """
 
+from __future__ import annotations
 import os
 import time
-from typing import Final, Iterable
-import urllib.request
+from typing import TYPE_CHECKING, Final, Iterable, TypedDict
 import asyncio
-import aiofile
-import aiohttp
-from bs4 import BeautifulSoup, PageElement, SoupStrainer, Tag
-from base_downloader import BaseDownloader, BasePageDownloader
+from base_downloader import BaseDownloader, BasePageDownloader, finishing
+import tools
+
+if TYPE_CHECKING:
+    import aiohttp
+    from bs4 import PageElement, Tag
+
+class _PageContentDict(TypedDict):
+    # Ссылка на файл страницы без домена
+    src: str|None
+    # Найдена ли картинка страницы
+    has_img: bool
+    # Всплывающий текст картинки
+    img_title: str|None
+    # Заголовок, None — если его нет на странице
+    title: str|None
+    # Описание в читаемом виде, None — если поля описания нет на странице
+    description: str|None
+
+def _html_to_text(elements_list: Iterable[PageElement]|Tag) -> str:
+    """Преобразование списка html-элементов страницы в более читаемый вид,
+    см. Downloader.html_to_text
+    """
+    from bs4 import Tag
+
+    text = ""
+    for page_element in elements_list:
+        if isinstance(page_element, str):
+            text += page_element
+        elif isinstance(page_element, Tag):
+            if page_element.name in [
+                'div', 'span', 'p',
+                'em', 'i', 'strong', 'b',
+                'h3', 'h2', 'h1'
+            ]:
+                # Обрабатываем содержимое тега
+                text += _html_to_text(page_element)
+            elif page_element.name == 'hr':
+                text += '-----\n'
+            elif page_element.name == 'br':
+                text += '\n'
+            elif page_element.name == 'a':
+                # Текст ссылки (https://ссылка)
+                text += (
+                    f"{_html_to_text(page_element.children)} "
+                    f"({page_element.attrs.get('href', '')})"
+                )
+            elif page_element.name == 'img':
+                # (# https://ссылка_на_картинку #)
+                text += f"(# {page_element.attrs.get('src')} #)"
+            else:
+                raise ValueError(page_element)
+        else:
+            raise ValueError(page_element)
+    return tools.clear_text_multiplespaces(text)
+
+def parse_last_page(html: bytes) -> int:
+    """Номер последней существующей страницы из меню чтения на главной странице комикса
+
+    Функция верхнего уровня, чтобы её можно было выполнять в пуле разбора
+    """
+    from bs4 import BeautifulSoup, SoupStrainer
+
+    read_menu = BeautifulSoup(
+        html,
+        "lxml",
+        parse_only=SoupStrainer('li', 'read-menu-item-short')
+    )
+    # Внутри класса ссылки на начало, конец и список. Нужен конец
+    link_last: Tag = read_menu.find_all('a', limit=2)[1]
+    href = link_last.attrs.get('href', '')
+    # Вытаскиваем из ссылки номер последней существующей страницы
+    return int(href.split('/')[-1])
+
+def parse_content_page(html: bytes) -> _PageContentDict:
+    """Извлечение со страницы комикса всех нужных для скачивания данных
+
+    Функция верхнего уровня, чтобы её можно было выполнять в пуле разбора
+    """
+    from bs4 import BeautifulSoup, SoupStrainer, Tag
+
+    content = BeautifulSoup(
+        html,
+        "lxml",
+        parse_only=SoupStrainer('div', 'common-content')
+    )
+    record = _PageContentDict({
+        'src': None,
+        'has_img': False,
+        'img_title': None,
+        'title': None,
+        'description': None,
+    })
+
+    img = content.find("img", "issue")
+    if isinstance(img, Tag):
+        record['has_img'] = True
+        record['src'] = img.attrs.get('src', None)
+        record['img_title'] = img.attrs.get('title', None)
+
+    span = content.find("span", "title")
+    if span:
+        record['title'] = span.get_text(strip=True).rstrip(".")
+
+    issue_description_text = content.find("section", "issue-description-text")
+    if isinstance(issue_description_text, Tag):
+        # Форматируем html-разметку в читаемый вид
+        record['description'] = _html_to_text(issue_description_text.children).strip()
+    elif isinstance(issue_description_text, str):
+        # Добавляем чистую строку
+        record['description'] = issue_description_text.strip()
+    return record
 
 class Downloader(BaseDownloader):
     _COMIC_DOMAIN: Final[str] = "https://acomics.ru"
@@ -54,53 +162,18 @@ class Downloader(BaseDownloader):
             <br> заменяется на перевод строки
             <hr> заменяется на 5 дефисов и перевод строки
         """
-        text = ""
-        for page_element in elements_list:
-            if isinstance(page_element, str):
-                text += page_element
-            elif isinstance(page_element, Tag):
-                if page_element.name in [
-                    'div', 'span', 'p',
-                    'em', 'i', 'strong', 'b',
-                    'h3', 'h2', 'h1'
-                ]:
-                    # Обрабатываем содержимое тега
-                    text += self.html_to_text(page_element)
-                elif page_element.name == 'hr':
-                    text += '-----\n'
-                elif page_element.name == 'br':
-                    text += '\n'
-                elif page_element.name == 'a':
-                    # Текст ссылки (https://ссылка)
-                    text += (
-                        f"{self.html_to_text(page_element.children)} "
-                        f"({page_element.attrs.get('href', '')})"
-                    )
-                elif page_element.name == 'img':
-                    # (# https://ссылка_на_картинку #)
-                    text += f"(# {page_element.attrs.get('src')} #)"
-                else:
-                    raise ValueError(page_element)
-            else:
-                raise ValueError(page_element)
-        return self._clear_text_multiplespaces(text)
+        return _html_to_text(elements_list)
 
     def find_last(self) -> int:
-        # Устанавливаем куку для обхода ограничения возраста
-        req = urllib.request.Request(self._comic_main_page_link(), headers=self._REQUEST_HEADERS)
-
         # На самой странице ищем ссылку, указывающую на чтение с конца
-        with urllib.request.urlopen(req) as file:
-            read_menu = BeautifulSoup(
-                file.read(),
-                "lxml",
-                parse_only=SoupStrainer('li', 'read-menu-item-short')
-            )
-        # Внутри класса ссылки на начало, конец и список. Нужен конец
-        link_last: Tag = read_menu.find_all('a', limit=2)[1]
-        href = link_last.attrs.get('href', '')
-        # Вытаскиваем из ссылки номер последней существующей страницы
-        last = int(href.split('/')[-1])
+        # Устанавливаем куку для обхода ограничения возраста
+        url = self._comic_main_page_link()
+        with self._slot(url), self._phase("index"):
+            resp = self._sync_session().get(url, headers=self._REQUEST_HEADERS, timeout=60)
+            resp.raise_for_status()
+            html = resp.content
+        with self._phase("parse"):
+            last = parse_last_page(html)
         # ...и возвращаем следующую
         self.last = last + 1
         return self.last
@@ -109,38 +182,30 @@ class Downloader(BaseDownloader):
         self,
         async_session: aiohttp.ClientSession|None=None
     ) -> int:
-        # Без сессии используем обычный запрос
-        if async_session:
-            _request = async_session.request
-        else:
-            _request = aiohttp.request
+        # Без сессии используем общую сессию запуска
+        if async_session is None:
+            async_session = await self._session()
 
         # На самой странице ищем ссылку, указывающую на чтение с конца
-        async with _request(
-            "GET",
-            self._comic_main_page_link(),
-            headers = self._REQUEST_HEADERS
-        ) as file:
-            read_menu = BeautifulSoup(
-                await file.read(),
-                "lxml",
-                parse_only=SoupStrainer('li', 'read-menu-item-short')
-            )
-        # Внутри класса ссылки на начало, конец и список. Нужен конец
-        link_last: Tag = read_menu.find_all('a', limit=2)[1]
-        href = link_last.attrs.get('href', '')
-        # Вытаскиваем из ссылки номер последней существующей страницы
-        last = int(href.split('/')[-1])
+        url = self._comic_main_page_link()
+        async with self._async_slot(url):
+            with self._phase("index"):
+                async with async_session.request(
+                    "GET",
+                    url,
+                    headers = self._REQUEST_HEADERS
+                ) as file:
+                    html = await file.read()
+        # Разбор вне цикла событий
+        last = await self._parse(parse_last_page, html)
         # ...и возвращаем следующую
         return last + 1
 
+    @finishing
     def downloadcomic(self) -> int:
         # Асинхронное скачивание
         if self.use_async:
-            loop = asyncio.get_event_loop()
-            last_success = loop.run_until_complete(self.async_downloadcomic())
-            loop.close()
-            return last_success
+            return self._run_async(self.async_downloadcomic())
 
         # Обычное скачивание
         # Установка последней страницы при её отсутствии
@@ -152,43 +217,50 @@ class Downloader(BaseDownloader):
         if self.first >= self.last:
             return self.last
 
-        # Последовательно скачиваем страницы,
+        # Скачиваем страницы в пуле потоков, результаты приходят по порядку,
         # запоминаем, на какой странице необходимо начинать следующее скачивание
         last_success = self.first
-        for num in range(self.first, self.last):
-            # Загрузчик страниц
-            page_downloader = PageDownloader(num, **self._params)
-            if (result := page_downloader.download_comic_page()) and last_success == result:
+        # Загрузчики страниц
+        page_downloaders = (
+            PageDownloader(num, **self._params)
+            for num in range(self.first, self.last)
+        )
+        for result in self._map_in_threads(
+            PageDownloader.download_comic_page,
+            page_downloaders
+        ):
+            if result and last_success == result:
                 last_success = result + 1
         return last_success
 
+    @finishing
     async def async_downloadcomic(self) -> int:
-        async with aiohttp.ClientSession() as session:
-            # Установка последней страницы при её отсутствии
-            if not self.last:
-                self.last = await self.async_find_last(async_session=session)
-            else:
-                self.last = min(self.last, await self.async_find_last(async_session=session))
+        session = await self._session()
+        # Установка последней страницы при её отсутствии
+        if not self.last:
+            self.last = await self.async_find_last(async_session=session)
+        else:
+            self.last = min(self.last, await self.async_find_last(async_session=session))
 
-            if self.first >= self.last:
-                return self.last
+        if self.first >= self.last:
+            return self.last
 
-            # Скачивание
-            # Создание списка задач
-            tasks = []
-            # reversed, так как задачи выполняются последний пришёл - первый ушёл,
-            # а нам надо по порядку
-            for page in reversed(range(self.first, self.last)):
-                # Загрузчик страниц
-                page_downloader = PageDownloader(page, **self._params)
-                tasks.append(
-                    asyncio.create_task(
-                        page_downloader.async_download_comic_page(session=session))
-                )
-            # Запуск задач
-            results = await asyncio.gather(*tasks)
-            # Чистка результатов
-            results: list[int] = sorted(filter(bool, results))
+        # Скачивание
+        # Создание списка задач
+        tasks = []
+        # reversed, так как задачи выполняются последний пришёл - первый ушёл,
+        # а нам надо по порядку
+        for page in reversed(range(self.first, self.last)):
+            # Загрузчик страниц
+            page_downloader = PageDownloader(page, **self._params)
+            tasks.append(
+                asyncio.create_task(
+                    page_downloader.async_download_comic_page(session=session))
+            )
+        # Запуск задач
+        results = await asyncio.gather(*tasks)
+        # Чистка результатов
+        results: list[int] = sorted(filter(bool, results))
 
         # Возврат следующей к скачиванию страницы
         if self.last - self.first == len(results):
@@ -208,42 +280,40 @@ class PageDownloader(BasePageDownloader, Downloader):
     def __init__(self, page: int|str|None = None, **kwargs):
         super().__init__(**kwargs)
         self.page = page
-        self.content: BeautifulSoup|None = None
+        self.content: _PageContentDict|None = None
 
-    def _comic_get_content_page(self) -> BeautifulSoup:
-        """Получение html-контента, содержащего всю необходимую информцию"""
+    def _comic_get_content_page(self) -> _PageContentDict:
+        """Получение данных страницы, содержащих всю необходимую информцию"""
         # Устанавливаем куку для обхода ограничения возраста
-        req = urllib.request.Request(self._comic_file_page_link(), headers=self._REQUEST_HEADERS)
-
-        with urllib.request.urlopen(req) as file:
-            self.content = BeautifulSoup(
-                file.read(),
-                "lxml",
-                parse_only=SoupStrainer('div', 'common-content')
-            )
+        url = self._comic_file_page_link()
+        with self._slot(url), self._phase("metadata"):
+            resp = self._sync_session().get(url, headers=self._REQUEST_HEADERS, timeout=60)
+            resp.raise_for_status()
+            html = resp.content
+        with self._phase("parse"):
+            self.content = parse_content_page(html)
         return self.content
 
     async def _async_comic_get_content_page(
         self,
         async_session: aiohttp.ClientSession|None=None
-    ) -> BeautifulSoup:
-        """Асинхронное получение html-контента, содержащего всю необходимую информцию"""
-        # Без сессии скачиваем страницу обычным запросом
-        if async_session:
-            _request = async_session.request
-        else:
-            _request = aiohttp.request
-
-        async with _request('GET',
-            self._comic_file_page_link(),
-            headers = self._REQUEST_HEADERS
-        ) as file:
-            content_page = BeautifulSoup(
-                await file.read(),
-                "lxml",
-                parse_only=SoupStrainer('div', 'common-content')
-            )
-        return content_page
+    ) -> _PageContentDict:
+        """Асинхронное получение данных страницы, содержащих всю необходимую информцию"""
+        # Без сессии используем общую сессию запуска
+        if async_session is None:
+            async_session = await self._session()
+
+        url = self._comic_file_page_link()
+        async with self._async_slot(url):
+            with self._phase("metadata"):
+                async with async_session.request('GET',
+                    url,
+                    headers = self._REQUEST_HEADERS
+                ) as file:
+                    html = await file.read()
+        # Разбор вне цикла событий, обратно возвращаются только извлечённые данные
+        self.content = await self._parse(parse_content_page, html)
+        return self.content
 
     def _comic_file_page_link(self) -> str:
         if self.page is None:
@@ -254,8 +324,7 @@ class PageDownloader(BasePageDownloader, Downloader):
         if self.content is None:
             self.content = self._comic_get_content_page()
 
-        img = self.content.find("img", "issue")
-        if isinstance(img, Tag) and (src := img.attrs.get('src', None)):
+        if src := self.content['src']:
             return f"{self._COMIC_DOMAIN}{src}"
         raise ValueError(self.content)
 
@@ -274,9 +343,8 @@ class PageDownloader(BasePageDownloader, Downloader):
         if self.content is None:
             self.content = self._comic_get_content_page()
 
-        span = self.content.find("span", "title")
-        if span:
-            return span.get_text(strip=True).rstrip(".")
+        if (title := self.content['title']) is not None:
+            return title
         raise ValueError(self.content)
 
     def _comic_page_description(self) -> str|None:
@@ -286,64 +354,147 @@ class PageDownloader(BasePageDownloader, Downloader):
         page_description: list[str] = []
         # Достаём текст из всплывающего сообщения на самом изображении
         if self.is_write_img_description:
-            img = self.content.find("img", "issue")
-
-            if not isinstance(img, Tag):
+            if not self.content['has_img']:
                 raise ValueError(self.content)
 
-            if img_description := img.attrs.get('title', None):
+            if img_description := self.content['img_title']:
                 page_description.append(img_description)
 
         # Достаём текст из поля описания
         if self.is_write_description:
-            issue_description_text = self.content.find("section", "issue-description-text")
-
-            if isinstance(issue_description_text, Tag):
-                # Форматируем html-разметку в читаемый вид
-                description_list = issue_description_text.children
-                if description := self.html_to_text(description_list).strip():
-                    page_description.append(description)
-            elif isinstance(issue_description_text, str):
-                # Добавляем чистую строку
-                if description := issue_description_text.strip():
-                    page_description.append(description)
-            else:
+            if (description := self.content['description']) is None:
                 raise ValueError(self.content)
+            if description:
+                page_description.append(description)
 
         # Сводим текст
         if page_description:
             return "\n\n-----\n\n".join(page_description)
         return None
 
+    def _description_saved(self, description_filepath: str) -> bool:
+        """Сохранено ли описание страницы: в хранилище описаний комикса под этим именем
+        или в файле .txt, который проверяется без учёта размера
+        """
+        if self.descriptions is not None and self.descriptions.has(
+            int(self.page), os.path.basename(description_filepath)
+        ):
+            return True
+        return any(
+            self._file_size(path) is not None
+            for path in (description_filepath, self._target_path(description_filepath))
+        )
+
+    def _store_description(self, description_filepath: str, description: str):
+        """Описание в хранилище описаний комикса под именем файла описания"""
+        if self.descriptions is None:
+            raise ValueError("descriptions is None")
+        with self._phase("write"):
+            self.descriptions.add(int(self.page), os.path.basename(description_filepath), description)
+
+    def _retitled_file(self, comic_filepath: str) -> str|None:
+        """Файл этой же страницы с прежним заголовком в имени: «{page} - *» или «{page}.*»
+        с тем же расширением, None — если его нет
+        """
+        ext = os.path.splitext(comic_filepath)[1]
+        for path in self._numbered_files(comic_filepath):
+            name = os.path.basename(path)
+            if (
+                (name == f"{self.page}{ext}" or name.startswith(f"{self.page} - "))
+                and name.endswith(ext)
+                and self._check_corrects_file(path)
+            ):
+                return path
+        return None
+
+    def _rename_retitled(self, old_filepath: str, comic_filepath: str, description_filepath: str):
+        """Переименование файлов страницы под новый заголовок"""
+        # Уже перенесённый из промежуточной папки файл переименовывается в папке комикса
+        if self.target is not None and os.path.commonpath(
+            (os.path.abspath(old_filepath), os.path.abspath(self.folder))
+        ) != os.path.abspath(self.folder):
+            comic_filepath = self._target_path(comic_filepath)
+            description_filepath = self._target_path(description_filepath)
+        self._rename_file(old_filepath, comic_filepath)
+        old_description = f"{os.path.splitext(old_filepath)[0]}.txt"
+        if self._file_size(old_description) is not None and self._file_size(description_filepath) is None:
+            self._rename_file(old_description, description_filepath)
+
+    def _remote_size(self, url: str) -> int|None:
+        """Размер файла на сервере по запросу HEAD, None — если сервер его не сообщил"""
+        import requests
+
+        try:
+            with self._slot(url), self._phase("metadata"):
+                resp = self._sync_session().head(
+                    url,
+                    headers = self._REQUEST_HEADERS,
+                    timeout = 60,
+                    allow_redirects = True
+                )
+        except requests.RequestException:
+            return None
+        length = resp.headers.get("Content-Length", "")
+        return int(length) if resp.ok and length.isdigit() else None
+
+    async def _async_remote_size(self, session: aiohttp.ClientSession, url: str) -> int|None:
+        """Асинхронный размер файла на сервере, см. _remote_size"""
+        import aiohttp
+
+        try:
+            async with self._async_slot(url):
+                with self._phase("metadata"):
+                    async with session.head(
+                        url,
+                        headers = self._REQUEST_HEADERS,
+                        allow_redirects = True
+                    ) as resp:
+                        length = resp.headers.get("Content-Length", "")
+                        return int(length) if resp.ok and length.isdigit() else None
+        except aiohttp.ClientError:
+            return None
+
     def download_comic_page(self) -> int|None:
+        import requests
+
         if self.page is None:
             raise ValueError("page is None")
         # Путь к скачанному файлу
         ext = os.path.splitext(self._comic_file_link())[-1] or ".jpg"
-        comic_filepath = os.path.join(
-            self.folder,
-            self._comic_filename(ext=ext)
-        )
-        comic_filepath_description = os.path.join(
-            self.folder,
-            self._comic_filename(ext=".txt")
-        )
+        comic_filepath = self._page_filepath(self._comic_filename(ext=ext))
+        comic_filepath_description = self._page_filepath(self._comic_filename(ext=".txt"))
+
+        # Страница с изменённым заголовком переименовывается, если картинка на сервере та же
+        if (
+            not self._check_corrects_file(comic_filepath)
+            and (old_filepath := self._retitled_file(comic_filepath)) is not None
+            and self._remote_size(self._comic_file_link()) == self._file_size(old_filepath)
+        ):
+            self._rename_retitled(old_filepath, comic_filepath, comic_filepath_description)
 
         # Перескачивать уже существующий файл не нужно
         if not self._check_corrects_file(comic_filepath):
             # Скачивание
+            comic_file_link = self._comic_file_link()
             try:
-                urllib.request.urlretrieve(self._comic_file_link(), comic_filepath)
-            except TimeoutError:
+                self._sync_download(comic_file_link, comic_filepath)
+            except (TimeoutError, requests.Timeout):
                 time.sleep(5)
                 return None
 
-        # Перескачивать уже существующий файл описания не нужно
-        if not self._check_corrects_file(comic_filepath_description):
+        # Повторно сохранять уже сохранённое описание не нужно
+        if not self._description_saved(comic_filepath_description):
             # Описание при странице
             if description := self._comic_page_description():
-                with open(comic_filepath_description, "w", encoding="utf-8") as file:
-                    file.write(description)
+                if self.descriptions is not None:
+                    self._store_description(comic_filepath_description, description)
+                else:
+                    with (
+                        self._phase("write"),
+                        open(comic_filepath_description, "w", encoding="utf-8") as file
+                    ):
+                        file.write(description)
+                    self._file_written(comic_filepath_description)
 
         # В случае успеха вернём номер страницы, иначе None
         if self._check_corrects_file(comic_filepath):
@@ -354,46 +505,73 @@ class PageDownloader(BasePageDownloader, Downloader):
         self,
         session: aiohttp.ClientSession|None = None
     ) -> int|None:
+        import aiofile
+
         if self.page is None:
             raise ValueError("page is None")
-        # Без сессии скачиваем страницу обычным запросом
-        if session:
-            _request = session.request
-        else:
-            _request = aiohttp.request
+        # Без сессии используем общую сессию запуска
+        if session is None:
+            session = await self._session()
+        # Данные страницы получаем асинхронно, а не обычным запросом внутри цикла событий
+        if self.content is None:
+            await self._async_comic_get_content_page(session)
 
         # Путь к скачанному файлу
         ext = os.path.splitext(self._comic_file_link())[-1] or ".jpg"
-        comic_filepath = os.path.join(
-            self.folder,
-            self._comic_filename(ext=ext)
-            )
-        comic_filepath_description = os.path.join(
-            self.folder,
-            self._comic_filename(ext=".txt")
-        )
+        comic_filepath = self._page_filepath(self._comic_filename(ext=ext))
+        comic_filepath_description = self._page_filepath(self._comic_filename(ext=".txt"))
+
+        # Страница с изменённым заголовком переименовывается, если картинка на сервере та же
+        if (
+            not self._check_corrects_file(comic_filepath)
+            and (old_filepath := self._retitled_file(comic_filepath)) is not None
+            and await self._async_remote_size(session, self._comic_file_link())
+            == self._file_size(old_filepath)
+        ):
+            self._rename_retitled(old_filepath, comic_filepath, comic_filepath_description)
 
         # Перескачивать уже существующий файл не нужно
         if not self._check_corrects_file(comic_filepath):
             # Скачивание
+            comic_file_link = self._comic_file_link()
             try:
-                async with _request("GET", self._comic_file_link()) as resp:
+                async with self._async_slot(comic_file_link) as slot:
+                    with self._phase("transfer"):
+                        async with session.request("GET", comic_file_link) as resp:
+                            if resp.status == 429:
+                                slot.congestion()
+                                raise TimeoutError(comic_file_link)
+                            content = await resp.read()
+                            expected_size = self._expected_size(resp.headers)
+                self._unlink_shared(comic_filepath)
+                with self._phase("write"):
                     async with aiofile.async_open(comic_filepath, 'wb') as file:
-                        await file.write(await resp.read())
+                        await file.write(content)
+                self._file_written(
+                    comic_filepath,
+                    len(content),
+                    self._content_digest(content),
+                    self._content_correct(content, expected_size)
+                )
             except TimeoutError:
                 await asyncio.sleep(5)
                 return None
 
-        # Перескачивать уже существующий файл описания не нужно
-        if not self._check_corrects_file(comic_filepath_description):
+        # Повторно сохранять уже сохранённое описание не нужно
+        if not self._description_saved(comic_filepath_description):
             # Описание при странице
             if description := self._comic_page_description():
-                async with aiofile.async_open(
-                    comic_filepath_description,
-                    "w",
-                    encoding="utf-8"
-                ) as file:
-                    await file.write(description)
+                if self.descriptions is not None:
+                    self._store_description(comic_filepath_description, description)
+                else:
+                    with self._phase("write"):
+                        async with aiofile.async_open(
+                            comic_filepath_description,
+                            "w",
+                            encoding="utf-8"
+                        ) as file:
+                            await file.write(description)
+                    self._file_written(comic_filepath_description)
 
         # В случае успеха вернём номер страницы, иначе None
         if self._check_corrects_file(comic_filepath):
@@ -1,16 +1,388 @@
 """Базовый модуль скачивания комиксов
+
+Тяжёлые библиотеки (aiohttp, requests, httpx) импортируются при первом использовании,
+а не при загрузке модуля, чтобы запуск загрузчика не платил за неиспользуемые.
 """
 
+from __future__ import annotations
 from abc import ABC, abstractmethod
 import argparse
+import asyncio
+from collections import deque
+import concurrent.futures
+import contextlib
+import functools
 import os
+import ssl
 import sys
-from typing import Any
-import aiohttp
-sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+import threading
+from types import SimpleNamespace
+from typing import (
+    TYPE_CHECKING,
+    Any, AsyncContextManager, AsyncIterator, Callable, ContextManager, Coroutine, Iterable, Iterator, Mapping, TypeVar
+)
+import urllib.parse
+# Загрузчики запускаются и отдельными скриптами, вне пакета comic_downloader,
+# поэтому его модули импортируются по имени из папки пакета
+_PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+if _PACKAGE_DIR not in sys.path:
+    sys.path.append(_PACKAGE_DIR)
+import blobstore
+from blobstore import BlobStore
+from descstore import DescriptionStore
+from dirindex import DirIndexes
+from hostlimits import HostLimiters, Slot, request_class
+import imagecheck
+from netcache import NetCache, NetStats
+import pagelayout
+from pagelayout import PageLayout
+import profiling
+import staging
 import tools
 
+if TYPE_CHECKING:
+    import aiohttp
+    import requests
+
+# Разобранные аргументы командной строки процесса: из argv и значения по умолчанию
+_CLI_ARGS: dict[bool, argparse.Namespace] = {}
+
+_T = TypeVar("_T")
+_I = TypeVar("_I")
+_F = TypeVar("_F", bound=Callable[..., Any])
+
+@functools.cache
+def ssl_context() -> ssl.SSLContext:
+    """Общий контекст TLS процесса
+
+    Сертификаты загружаются один раз, а не на каждую сессию
+    """
+    return ssl.create_default_context()
+
+class SessionFactory:
+    """Общие на весь запуск клиенты для запросов
+
+    Все асинхронные запросы запуска идут через одну сессию aiohttp с настроенным пулом
+    соединений, поэтому соединения с хостом переиспользуются, а не открываются на каждую
+    страницу. Сессия привязана к циклу событий: при смене цикла создаётся новая.
+    Обычные запросы идут через сессии requests, по одной на поток.
+
+    Parameters
+    ----------
+    limit: int
+        Максимум одновременных соединений
+    limit_per_host: int
+        Максимум одновременных соединений с одним хостом
+    ttl_dns_cache: int
+        Время жизни кэша DNS в секундах
+    keepalive_timeout: float
+        Время удержания простаивающего соединения в секундах
+    """
+    def __init__(
+        self,
+        limit: int = 100,
+        limit_per_host: int = 32,
+        ttl_dns_cache: int = 600,
+        keepalive_timeout: float = 60
+    ):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.ttl_dns_cache = ttl_dns_cache
+        self.keepalive_timeout = keepalive_timeout
+        self._loop: asyncio.AbstractEventLoop|None = None
+        self._session: aiohttp.ClientSession|None = None
+        self._http2_client: Any = None
+        # Сколько скачиваний цикла событий сейчас пользуются клиентами, см. using
+        self._users = 0
+        # Сессии requests по потокам
+        self._local = threading.local()
+        self._sync_sessions: list[requests.Session] = []
+        self._sync_lock = threading.Lock()
+        # Общий на запуск кэш и счётчики процесса
+        self.netcache: NetCache|None = None
+        self.stats = NetStats()
+
+    def use_netcache(self, path: str):
+        """Подключение общего сетевого кэша запуска"""
+        if self.netcache is None or self.netcache.path != path:
+            if self.netcache is not None:
+                self.netcache.close()
+            self.netcache = NetCache(path)
+
+    def _connector(self) -> aiohttp.TCPConnector:
+        import aiohttp
+
+        resolver = None
+        if self.netcache is not None:
+            from netresolver import CachingResolver
+
+            resolver = CachingResolver(self.netcache, self.stats, self.ttl_dns_cache)
+        return aiohttp.TCPConnector(
+            limit = self.limit,
+            limit_per_host = self.limit_per_host,
+            ttl_dns_cache = self.ttl_dns_cache,
+            keepalive_timeout = self.keepalive_timeout,
+            resolver = resolver,
+            ssl = ssl_context()
+        )
+
+    def _trace_config(self) -> aiohttp.TraceConfig:
+        """Учёт новых и переиспользованных соединений"""
+        import aiohttp
+
+        stats = self.stats
+
+        async def on_request_start(
+            session: aiohttp.ClientSession,
+            context: SimpleNamespace,
+            params: aiohttp.TraceRequestStartParams
+        ):
+            context.is_tls = params.url.scheme == "https"
+
+        async def on_connection_create_end(
+            session: aiohttp.ClientSession,
+            context: SimpleNamespace,
+            params: aiohttp.TraceConnectionCreateEndParams
+        ):
+            stats.connections_new += 1
+            if getattr(context, "is_tls", False):
+                stats.tls_new += 1
+
+        async def on_connection_reuseconn(
+            session: aiohttp.ClientSession,
+            context: SimpleNamespace,
+            params: aiohttp.TraceConnectionReuseconnParams
+        ):
+            stats.connections_reused += 1
+            if getattr(context, "is_tls", False):
+                stats.tls_reused += 1
+
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_request_start.append(on_request_start)
+        trace_config.on_connection_create_end.append(on_connection_create_end)
+        trace_config.on_connection_reuseconn.append(on_connection_reuseconn)
+        return trace_config
+
+    def _check_loop(self):
+        """Сброс клиентов, созданных в другом цикле событий"""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._session = None
+            self._http2_client = None
+            self._users = 0
+
+    @contextlib.asynccontextmanager
+    async def using(self) -> AsyncIterator[SessionFactory]:
+        """Пользование общими клиентами: их закрывает последний вышедший пользователь цикла событий
+
+        Одновременные скачивания одного цикла делят соединения, а после последнего
+        клиенты закрываются, и вызывающему не нужно закрывать их самому.
+
+        Использование:
+            async with SESSIONS.using():
+                session = await SESSIONS.session()
+        """
+        self._check_loop()
+        self._users += 1
+        try:
+            yield self
+        finally:
+            self._users -= 1
+            if not self._users:
+                await self.close()
+
+    async def session(self) -> aiohttp.ClientSession:
+        """Общая сессия aiohttp"""
+        import aiohttp
+
+        self._check_loop()
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector = self._connector(),
+                trace_configs = [self._trace_config()]
+            )
+        return self._session
+
+    async def http2_client(self):
+        """Общий клиент httpx с поддержкой HTTP/2
+
+        Return
+        ------
+        httpx.AsyncClient
+        """
+        import httpx
+
+        self._check_loop()
+        if self._http2_client is None or self._http2_client.is_closed:
+            self._http2_client = httpx.AsyncClient(
+                http2 = True,
+                verify = ssl_context(),
+                limits = httpx.Limits(
+                    max_connections = self.limit,
+                    max_keepalive_connections = self.limit_per_host,
+                    keepalive_expiry = self.keepalive_timeout
+                )
+            )
+        return self._http2_client
+
+    def sync_session(self) -> requests.Session:
+        """Сессия requests текущего потока
+
+        Сессия requests не потокобезопасна, поэтому у каждого потока пула своя,
+        а соединения переиспользуются между запросами одного потока
+        """
+        import requests
+        import requests.adapters
+
+        session: requests.Session|None = getattr(self._local, "session", None)
+        if session is None:
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(
+                pool_connections = self.limit_per_host,
+                pool_maxsize = self.limit_per_host
+            )
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            self._local.session = session
+            with self._sync_lock:
+                self._sync_sessions.append(session)
+        return session
+
+    def close_sync(self):
+        """Закрытие сессий requests всех потоков"""
+        with self._sync_lock:
+            sessions, self._sync_sessions = self._sync_sessions, []
+        for session in sessions:
+            session.close()
+        self._local = threading.local()
+
+    async def close(self):
+        """Закрытие клиентов текущего цикла событий"""
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+        if self._http2_client is not None:
+            await self._http2_client.aclose()
+            self._http2_client = None
+        self.save_stats()
+
+    def save_stats(self):
+        """Перенос счётчиков процесса в общий кэш"""
+        if self.netcache is not None and self.stats != NetStats():
+            self.netcache.add_stats(self.stats)
+            self.stats.reset()
+
+# Клиенты процесса
+SESSIONS = SessionFactory()
+
+class ParserPool:
+    """Пул разбора html вне цикла событий
+
+    Разбор BeautifulSoup занимает процессор и блокирует цикл событий, поэтому
+    асинхронные загрузчики отдают его в пул, а обратно получают только извлечённые данные.
+    Функции разбора должны быть верхнего уровня модуля, а их аргументы и результат —
+    простыми значениями, чтобы их можно было передавать в процессы.
+
+    Parameters
+    ----------
+    kind: str
+        "thread" — пул потоков, "process" — пул процессов,
+        "none" — разбор прямо в цикле событий
+    workers: int|None
+        Количество исполнителей, по умолчанию — по числу процессоров, но не больше 4
+    """
+    KINDS = ("thread", "process", "none")
+
+    def __init__(self, kind: str = "thread", workers: int|None = None):
+        self.kind = kind
+        self.workers = workers
+        self._executor: concurrent.futures.Executor|None = None
+
+    def configure(self, kind: str, workers: int|None = None):
+        """Смена вида пула, уже запущенный пул останавливается"""
+        if kind not in self.KINDS:
+            raise ValueError(f"Unknown parse pool: {kind}")
+        if (kind, workers) != (self.kind, self.workers):
+            self.shutdown()
+            self.kind = kind
+            self.workers = workers
+
+    def _get_executor(self) -> concurrent.futures.Executor:
+        if self._executor is None:
+            workers = self.workers or min(4, os.cpu_count() or 1)
+            if self.kind == "process":
+                self._executor = concurrent.futures.ProcessPoolExecutor(workers)
+            else:
+                self._executor = concurrent.futures.ThreadPoolExecutor(
+                    workers,
+                    thread_name_prefix = "parser"
+                )
+        return self._executor
+
+    async def run(self, func: Callable[..., _T], *args: Any) -> _T:
+        """Выполнение функции разбора в пуле"""
+        if self.kind == "none":
+            return func(*args)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._get_executor(), func, *args)
+
+    def shutdown(self):
+        """Остановка пула, при следующем разборе он создастся заново"""
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+# Пул разбора процесса
+PARSERS = ParserPool()
+
+# Подбор числа одновременных запросов к хостам
+HOSTS = HostLimiters(maximum=SESSIONS.limit_per_host)
+
+# Индексы папок комиксов для проверок существования файлов
+DIRS = DirIndexes()
+
+@functools.cache
+def _add_sync_congestion_errors():
+    """Ошибки requests, означающие перегрузку хоста, учитываются с первым обычным запросом"""
+    import requests
+
+    HOSTS.add_congestion_errors(requests.ConnectionError, requests.Timeout)
+
+@functools.cache
+def _add_async_congestion_errors():
+    """Ошибки aiohttp, означающие перегрузку хоста, учитываются с первым асинхронным запросом"""
+    import aiohttp
+
+    HOSTS.add_congestion_errors(aiohttp.ClientConnectionError, aiohttp.ClientPayloadError)
+
+def finishing(method: _F) -> _F:
+    """Декоратор скачивания комикса: накопленное записывается в папку комикса до того,
+    как возвращается номер новой страницы, см. BaseDownloader._finish_download
+
+    Асинхронное скачивание пользуется общими клиентами через SessionFactory.using,
+    поэтому после последнего скачивания цикла событий они закрываются
+    """
+    if asyncio.iscoroutinefunction(method):
+        @functools.wraps(method)
+        async def async_wrapper(self: BaseDownloader, *args: Any, **kwargs: Any) -> Any:
+            async with SESSIONS.using():
+                result = await method(self, *args, **kwargs)
+            await asyncio.to_thread(self._finish_download)
+            return result
+        return async_wrapper  # type: ignore[return-value]
+
+    @functools.wraps(method)
+    def wrapper(self: BaseDownloader, *args: Any, **kwargs: Any) -> Any:
+        result = method(self, *args, **kwargs)
+        self._finish_download()
+        return result
+    return wrapper  # type: ignore[return-value]
+
 class BaseDownloader(ABC):
+    # Загрузчик работает внутри загрузчика комикса и не сбрасывает индекс его папки
+    _reuse_dir_index: bool = False
+
     def __init__(
         self, *,
         comic_name: str|None = None,
@@ -20,9 +392,29 @@ class BaseDownloader(ABC):
         is_write_img_description: bool|None = None,
         folder: str|os.PathLike|None = None,
         use_async: bool|None = None,
+        workers: int|None = None,
+        layout: PageLayout|None = None,
+        blobs: BlobStore|None = None,
+        stage: str|None = None,
+        target: str|None = None,
+        descriptions: DescriptionStore|None = None,
         **kwargs
     ):
-        args, _ = self.arg_parser.parse_known_args()
+        # Командная строка нужна, только если что-то не передано явно.
+        # Загрузчики страниц и частей создаёт загрузчик комикса, они её не разбирают:
+        # в процессе оркестратора в ней нет ссылки на комикс
+        from_argv = not self._reuse_dir_index and any(
+            value is None
+            for value in (
+                comic_name,
+                first,
+                is_write_description,
+                is_write_img_description,
+                folder,
+                use_async
+            )
+        )
+        args = self._cli_args(from_argv=from_argv)
 
         self.comic_name: str = comic_name or args.comic
 
@@ -58,6 +450,29 @@ class BaseDownloader(ABC):
             self.folder = folder.__fspath__()
         else:
             self.folder = folder
+        # Папка комикса, если файлы пишутся в промежуточную папку self.folder, см. staging
+        self.target: str|None = target
+        stage = stage or args.stage
+        if stage and not self._reuse_dir_index:
+            self.target = self.folder
+            self.folder = staging.stage_folder(stage, self.folder)
+            os.makedirs(self.folder, exist_ok=True)
+        # Загрузчик комикса начинает с нового чтения папки, загрузчики страниц пользуются его индексом
+        if not self._reuse_dir_index:
+            DIRS.forget(self.folder)
+            if self.target is not None:
+                DIRS.forget(self.target)
+
+        # Раскладка страниц по папкам, загрузчики страниц получают её от загрузчика комикса
+        self.layout: PageLayout = layout if layout is not None else self._read_layout(self._comic_folder)
+        # Хранилище содержимого библиотеки, если оно создано, см. blobstore
+        self.blobs: BlobStore|None = (
+            blobs if self._reuse_dir_index else blobstore.find_store(self._comic_folder)
+        )
+        # Описания страниц комикса, у отдельно созданного загрузчика страницы их нет, см. descstore
+        self.descriptions: DescriptionStore|None = descriptions
+        if not self._reuse_dir_index and (self.is_write_description or self.is_write_img_description):
+            self.descriptions = DescriptionStore.of_folder(self._comic_folder)
 
         self.use_async: bool
         if use_async is None:
@@ -65,6 +480,29 @@ class BaseDownloader(ABC):
         else:
             self.use_async = use_async
 
+        # Количество потоков обычного скачивания
+        self.workers: int = workers or args.workers
+
+        # Подобранные прошлыми запусками числа одновременных запросов
+        if args.hostlimits:
+            HOSTS.use_store(args.hostlimits)
+
+        # Общий сетевой кэш запуска
+        if args.netcache:
+            SESSIONS.use_netcache(args.netcache)
+        # Пул разбора страниц в асинхронном режиме, при явных параметрах остаётся как есть
+        if from_argv:
+            PARSERS.configure(args.parse_pool, args.parse_workers)
+
+        # Профилирование включается один раз на процесс
+        if args.profile or args.pstats:
+            profiling.enable(
+                module = type(self).__module__,
+                comic = self.comic_name,
+                output = args.profile,
+                pstats_output = args.pstats
+            )
+
     @property
     def _params(self) -> dict[str, Any]:
         return dict({
@@ -74,9 +512,29 @@ class BaseDownloader(ABC):
             "is_write_description": self.is_write_description,
             "is_write_img_description": self.is_write_img_description,
             "folder": self.folder,
-            "use_async": self.use_async
+            "use_async": self.use_async,
+            "workers": self.workers,
+            "layout": self.layout,
+            "blobs": self.blobs,
+            "target": self.target,
+            "descriptions": self.descriptions
         })
 
+    def _cli_args(self, from_argv: bool=True) -> argparse.Namespace:
+        """Аргументы командной строки, разбираются один раз на процесс
+
+        Parameters
+        ----------
+        from_argv: bool
+            Разбирать ли sys.argv, иначе возвращаются значения по умолчанию
+        """
+        if from_argv not in _CLI_ARGS:
+            if from_argv:
+                _CLI_ARGS[from_argv], _ = self.arg_parser.parse_known_args()
+            else:
+                _CLI_ARGS[from_argv] = self.arg_parser.parse_args([""])
+        return _CLI_ARGS[from_argv]
+
     @property
     def arg_parser(self) -> argparse.ArgumentParser:
         """Парсер аргументов командной строки
@@ -125,15 +583,193 @@ class BaseDownloader(ABC):
             help = 'Отключение быстрого (асинхронного) скачивания',
             action = 'store_true'
         )
+        parser.add_argument(
+            '-workers',
+            help = (
+                'Наибольшее количество потоков скачивания при отключённом асинхронном скачивании, '
+                'сколько из них одновременно обращаются к хосту, подбирается по ходу скачивания'
+            ),
+            type = int,
+            default = 16
+        )
+        parser.add_argument(
+            '-hostlimits',
+            help = 'Файл, в котором между запусками хранится подобранное число одновременных запросов к хостам',
+            type = str,
+            default = None
+        )
+        parser.add_argument(
+            '-parse-pool',
+            help = (
+                'Где разбирать страницы при асинхронном скачивании: '
+                'в пуле потоков (thread), процессов (process) или в цикле событий (none)'
+            ),
+            choices = ParserPool.KINDS,
+            default = 'thread'
+        )
+        parser.add_argument(
+            '-parse-workers',
+            help = 'Количество исполнителей пула разбора',
+            type = int,
+            default = None
+        )
+        parser.add_argument(
+            '-stage',
+            help = (
+                'Быстрая локальная папка, в которой готовятся файлы комикса: '
+                'они переносятся в папку комикса по окончании скачивания'
+            ),
+            type = str,
+            default = None
+        )
+        parser.add_argument(
+            '-netcache',
+            help = 'Файл общего на запуск сетевого кэша (адреса DNS и статистика соединений)',
+            type = str,
+            default = None
+        )
+        parser.add_argument(
+            '-profile',
+            help = 'Файл json, в который сохраняется время этапов скачивания',
+            type = str,
+            default = None
+        )
+        parser.add_argument(
+            '-pstats',
+            help = 'Файл, в который сохраняется статистика cProfile',
+            type = str,
+            default = None
+        )
         return parser
 
     @abstractmethod
     def _comic_main_page_link(self) -> str:
         """Получение ссылки на главную страницу комикса"""
 
+    @property
+    def _comic_folder(self) -> str:
+        """Папка комикса, в которой файлы оказываются по окончании скачивания"""
+        return self.folder if self.target is None else self.target
+
+    def _target_path(self, filepath: str|os.PathLike) -> str:
+        """Место файла промежуточной папки в папке комикса"""
+        filepath = os.fspath(filepath)
+        if self.target is None:
+            return filepath
+        return os.path.join(self.target, os.path.relpath(filepath, self.folder))
+
     def _check_corrects_file(self, filepath: str|os.PathLike) -> bool:
-        """Проверка файла на существование и корректность"""
-        return tools.check_corrects_file(filepath)
+        """Проверка файла на существование и корректность по индексу папки
+
+        При скачивании в промежуточную папку подходит и уже перенесённый в папку комикса файл
+        """
+        return DIRS.check_corrects_file(filepath) or (
+            self.target is not None and DIRS.check_corrects_file(self._target_path(filepath))
+        )
+
+    def _finish_download(self):
+        """Запись накопленных описаний и перенос файлов промежуточной папки
+
+        Загрузчик комикса вызывает его перед тем, как вернуть номер новой страницы,
+        поэтому при ошибке записи номер в БД не меняется
+        """
+        if self._reuse_dir_index:
+            return
+        if self.descriptions is not None:
+            with self._phase("write"):
+                self.descriptions.flush()
+        self._commit_stage()
+
+    def _commit_stage(self):
+        """Перенос файлов промежуточной папки в папку комикса, см. staging"""
+        if self.target is None:
+            return
+        with self._phase("write"):
+            staging.commit(self.folder, self.target, on_file=self._file_committed)
+        DIRS.forget(self.folder)
+
+    def _file_committed(self, filepath: str, size: int):
+        """Учёт перенесённого в папку комикса файла"""
+        DIRS.record(filepath, size)
+        if self.blobs is not None and DIRS.check_corrects_file(filepath):
+            self.blobs.adopt(filepath)
+
+    @staticmethod
+    def _read_layout(folder: str) -> PageLayout:
+        """Раскладка страниц папки комикса, см. pagelayout"""
+        # Без файла раскладки папка не открывается лишний раз: её наличие видно по индексу
+        if DIRS.file_size(os.path.join(folder, pagelayout.LAYOUT_FILE)) is None:
+            return PageLayout()
+        return pagelayout.read_layout(folder)
+
+    def _file_written(
+        self,
+        filepath: str|os.PathLike,
+        size: int|None = None,
+        digest: str|None = None,
+        correct: bool|None = None
+    ):
+        """Учёт записанного файла в индексе папки и связывание с хранилищем содержимого
+
+        Args:
+            filepath: Путь к файлу
+            size: Размер в байтах, см. dirindex.DirIndexes.record
+            digest: SHA-256, посчитанный при скачивании, см. _content_digest
+            correct: Результат проверки целостности при скачивании, см. _content_correct
+        """
+        DIRS.record(filepath, size, correct)
+        # Из промежуточной папки файл связывается с хранилищем после переноса,
+        # битый файл не связывается: он будет перезаписан
+        if self.blobs is not None and self.target is None and DIRS.check_corrects_file(filepath):
+            self.blobs.adopt(filepath, digest)
+
+    def _unlink_shared(self, filepath: str|os.PathLike):
+        """Удаление перезаписываемого файла, связанного с хранилищем содержимого:
+        запись поверх него испортила бы общее содержимое
+        """
+        if self.blobs is None or self._file_size(filepath) is None:
+            return
+        try:
+            if os.stat(filepath).st_nlink > 1:
+                os.remove(filepath)
+        except OSError:
+            pass
+
+    @staticmethod
+    def _expected_size(headers: Mapping[str, str]) -> int|None:
+        """Размер файла по Content-Length, None — если он не сообщён или ответ сжат"""
+        length = headers.get("Content-Length", "")
+        if headers.get("Content-Encoding") or not length.isdigit():
+            return None
+        return int(length)
+
+    @staticmethod
+    def _content_correct(content: bytes, expected_size: int|None = None) -> bool:
+        """Проверка целостности скачанного целиком файла, см. imagecheck"""
+        return imagecheck.is_correct(imagecheck.check_bytes(content, expected_size), len(content))
+
+    @staticmethod
+    def _file_size(filepath: str|os.PathLike) -> int|None:
+        """Размер файла по индексу папки, None — если его нет"""
+        return DIRS.file_size(filepath)
+
+    @staticmethod
+    def _rename_file(src: str|os.PathLike, dst: str|os.PathLike):
+        """Переименование файла с учётом в индексах папок"""
+        DIRS.rename(src, dst)
+
+    def _content_digest(self, content: bytes) -> str|None:
+        """SHA-256 скачанного содержимого, считается только при наличии хранилища"""
+        if self.blobs is None or self.target is not None:
+            return None
+        digest = blobstore.new_hash()
+        digest.update(content)
+        return digest.hexdigest()
+
+    @staticmethod
+    def _makedirs(path: str|os.PathLike):
+        """Создание папки, если её нет по индексу родительской папки"""
+        DIRS.makedirs(path)
 
     @staticmethod
     def _clear_text_multiplespaces(text: str) -> str:
@@ -143,7 +779,123 @@ class BaseDownloader(ABC):
     @staticmethod
     def make_safe_filename(filename: str) -> str:
         """Преобразование имени файла в безопасное"""
-        return tools.make_safe_filename(filename)
+        with profiling.phase("filename"):
+            return tools.make_safe_filename(filename)
+
+    @staticmethod
+    async def _session() -> aiohttp.ClientSession:
+        """Общая на весь запуск сессия aiohttp"""
+        return await SESSIONS.session()
+
+    @staticmethod
+    def _slot(url: str) -> ContextManager[Slot]:
+        """Место для обычного запроса к хосту url, см. hostlimits.AIMDLimiter.slot"""
+        _add_sync_congestion_errors()
+        return HOSTS.get(urllib.parse.urlsplit(url).netloc).slot(request_class(url))
+
+    @staticmethod
+    def _async_slot(url: str) -> AsyncContextManager[Slot]:
+        """Место для асинхронного запроса к хосту url, см. hostlimits.AIMDLimiter.async_slot"""
+        _add_async_congestion_errors()
+        return HOSTS.get(urllib.parse.urlsplit(url).netloc).async_slot(request_class(url))
+
+    @staticmethod
+    def _sync_session() -> requests.Session:
+        """Сессия requests текущего потока, см. SessionFactory.sync_session"""
+        return SESSIONS.sync_session()
+
+    def _sync_download(
+        self,
+        url: str,
+        filepath: str|os.PathLike,
+        headers: dict[str, str]|None = None,
+        timeout: float = 60
+    ):
+        """Скачивание файла через сессию потока
+
+        При коде ответа ошибки выбрасывается requests.HTTPError
+        """
+        with (
+            self._phase("transfer"),
+            self._slot(url) as slot,
+            self._sync_session().get(url, headers=headers, timeout=timeout, stream=True) as resp
+        ):
+            if resp.status_code == 429:
+                slot.congestion()
+            resp.raise_for_status()
+            size = 0
+            # Хэш для хранилища содержимого и проверка целостности считаются по ходу скачивания
+            digest = (
+                blobstore.new_hash() if self.blobs is not None and self.target is None else None
+            )
+            validator = imagecheck.ImageValidator(self._expected_size(resp.headers))
+            self._unlink_shared(filepath)
+            with open(filepath, "wb") as file:
+                for chunk in resp.iter_content(chunk_size=65536):
+                    size += file.write(chunk)
+                    validator.feed(chunk)
+                    if digest is not None:
+                        digest.update(chunk)
+        self._file_written(
+            filepath,
+            size,
+            digest.hexdigest() if digest is not None else None,
+            imagecheck.is_correct(validator.verdict(), size)
+        )
+
+    def _map_in_threads(
+        self,
+        func: Callable[[_I], _T],
+        items: Iterable[_I]
+    ) -> Iterator[_T]:
+        """Выполнение func для items в пуле из self.workers потоков
+
+        Результаты возвращаются в порядке items, чтобы сохранялся подсчёт
+        последней успешно скачанной подряд страницы. Одновременно в работе не больше
+        удвоенного числа потоков, остальные элементы берутся по мере освобождения.
+        """
+        if self.workers <= 1:
+            yield from map(func, items)
+            return
+
+        with concurrent.futures.ThreadPoolExecutor(
+            self.workers,
+            thread_name_prefix = "downloader"
+        ) as executor:
+            futures: deque[concurrent.futures.Future[_T]] = deque()
+            try:
+                for item in items:
+                    futures.append(executor.submit(func, item))
+                    if len(futures) >= self.workers * 2:
+                        yield futures.popleft().result()
+                while futures:
+                    yield futures.popleft().result()
+            finally:
+                # При ошибке не ждём оставшиеся в очереди задачи
+                for future in futures:
+                    future.cancel()
+
+    @staticmethod
+    def _run_async(coro: Coroutine[Any, Any, _T]) -> _T:
+        """Выполнение корутины в цикле событий с закрытием общих клиентов по окончании"""
+        loop = asyncio.get_event_loop()
+        try:
+            return loop.run_until_complete(coro)
+        finally:
+            loop.run_until_complete(SESSIONS.close())
+            loop.close()
+            PARSERS.shutdown()
+
+    @staticmethod
+    async def _parse(func: Callable[..., _T], *args: Any) -> _T:
+        """Разбор страницы функцией func в пуле разбора, не блокируя цикл событий"""
+        with profiling.phase("parse"):
+            return await PARSERS.run(func, *args)
+
+    @staticmethod
+    def _phase(name: str):
+        """Контекст замера этапа скачивания, см. profiling.PHASES"""
+        return profiling.phase(name)
 
     @abstractmethod
     def find_last(self) -> int:
@@ -168,7 +920,7 @@ class BaseDownloader(ABC):
         ----------
         session: ClientSession | None
             Сессия для проведения асинхронных запросов
-            Если не передана, то будет производиться обычный поиск
+            Если не передана, то используется общая сессия запуска
 
         Return
         ------
@@ -212,10 +964,49 @@ class BasePageDownloader(BaseDownloader):
     page: int | str
         Номер скачиваемой страницы
     """
+    _reuse_dir_index = True
+
     def __init__(self, page: int|str|None = None, **kwargs):
         super().__init__(**kwargs)
         self.page = page
 
+    def _page_filepath(self, filename: str) -> str:
+        """Путь к файлу страницы по раскладке папки комикса
+
+        Файл, ещё не перенесённый из папки комикса в папку-диапазон, остаётся на своём месте
+        и не скачивается заново. Папка-диапазон создаётся при необходимости.
+        """
+        if self.page is None:
+            raise ValueError("page is None")
+        page_dir = self.layout.page_dir(self.folder, int(self.page))
+        filepath = os.path.join(page_dir, filename)
+        if page_dir == self.folder or self._check_corrects_file(filepath):
+            return filepath
+        flat_filepath = os.path.join(self.folder, filename)
+        if self._check_corrects_file(flat_filepath):
+            return flat_filepath
+        self._makedirs(page_dir)
+        return filepath
+
+    def _numbered_files(self, filepath: str) -> list[str]:
+        """Другие файлы этой страницы: имена с номером страницы в начале в папке filepath
+        и в папке комикса, по индексам папок
+
+        При скачивании в промежуточную папку просматриваются и соответствующие папки комикса
+        """
+        if self.page is None:
+            raise ValueError("page is None")
+        name = os.path.basename(filepath)
+        folders = [os.path.dirname(filepath), self.folder]
+        if self.target is not None:
+            folders += [os.path.dirname(self._target_path(filepath)), self.target]
+        return [
+            os.path.join(folder, other)
+            for folder in dict.fromkeys(map(os.path.abspath, folders))
+            for other in DIRS.get(folder).numbered(int(self.page))
+            if other != name
+        ]
+
     @abstractmethod
     def _comic_file_page_link(self) -> str:
         """Получение ссылки на страницу комикса"""
@@ -276,7 +1067,7 @@ class BasePageDownloader(BaseDownloader):
         ----------
         session: ClientSession | None
             Сессия для проведения асинхронных запросов
-            Если не передана, то будет производиться обычное скачивание
+            Если не передана, то используется общая сессия запуска
 
         Return
         ------
@@ -2,21 +2,19 @@
 https://hentailib.me/
 """
 
+from __future__ import annotations
+import functools
 import json
-
-try:
-    import tomlkit as tomllib
-except ModuleNotFoundError:
-    import tomllib
-from typing import Any, NotRequired, TypedDict
+from types import ModuleType
+from typing import TYPE_CHECKING, Any, NotRequired, TypedDict
 import urllib.parse
 import asyncio
-import aiohttp
-from bs4 import BeautifulSoup, SoupStrainer
-import httpx
-from base_downloader import BaseDownloader
+from base_downloader import SESSIONS, BaseDownloader, finishing
 import mangalib
 
+if TYPE_CHECKING:
+    import httpx
+
 ChapterNumber = mangalib.ChapterNumber
 
 class _BS_JSONPageDataDict(TypedDict):
@@ -27,6 +25,33 @@ class _CookieTokenDict(TypedDict):
     mangalib_session: str
     mangalib_remember_web: NotRequired[str]
 
+@functools.cache
+def _tomllib() -> ModuleType:
+    """Модуль чтения toml: tomlkit, если установлен, иначе стандартный tomllib"""
+    try:
+        import tomlkit as tomllib
+    except ModuleNotFoundError:
+        import tomllib
+    return tomllib
+
+def parse_chapter_pages(content: bytes) -> list[_BS_JSONPageDataDict]|None:
+    """Список страниц части из жаваскрипта на странице части, None — если его нет
+
+    Функция верхнего уровня, чтобы её можно было выполнять в пуле разбора
+    """
+    from bs4 import BeautifulSoup, SoupStrainer
+
+    content_data = BeautifulSoup(
+        content,
+        "lxml",
+        parse_only=SoupStrainer("script", {"id": "pg"})
+    ).find("script")
+    if not content_data:
+        return None
+    # Так как список страниц хранится в жаваскрипте, выдираем его
+    json_string = content_data.get_text(strip=True).split("=", 1)[-1].strip(";")
+    return json.loads(json_string)
+
 class Downloader(mangalib.Downloader):
     def __init__(
         self,
@@ -89,6 +114,8 @@ class Downloader(mangalib.Downloader):
         return token
 
     def _get_user_id(self) -> int:
+        import httpx
+
         # Устанавливаем куки
         cookies = {"mangalib_session": self.token["mangalib_session"]}
         if "mangalib_remember_web" in self.token:
@@ -113,13 +140,11 @@ class Downloader(mangalib.Downloader):
         user_id = int(location.rsplit("-", 1)[-1])
         return user_id
 
+    @finishing
     def downloadcomic(self) -> ChapterNumber:
         # Асинхронное скачивание
         if self.use_async:
-            loop = asyncio.get_event_loop()
-            last_success = loop.run_until_complete(self.async_downloadcomic())
-            loop.close()
-            return last_success
+            return self._run_async(self.async_downloadcomic())
 
         # Обычное скачивание
         # Установка последней части при её отсутствии
@@ -148,6 +173,11 @@ class Downloader(mangalib.Downloader):
             # Начиная с последней, прекращаем
             if self.last <= ChapterNumber(num_chapter):
                 break
+            # Часть, уже сохранённая архивом, не запрашивается
+            if self._chapter_archived(chapter):
+                if all_chapters_correct:
+                    last_success = num_chapter
+                continue
             # # Берём номер тома
             # num_volume = self._to_number(chapter.get("volume", None))
             # if num_volume is None:
@@ -158,9 +188,12 @@ class Downloader(mangalib.Downloader):
             pages_in_chapter = len(chapter_downloader.data.get("pages", []))
             # Количество страниц, которые мы скачали
             succesed_pages = 0
-            # Последовательно скачиваем страницы
-            for page_downloader in chapter_downloader:
-                if page_downloader.download_comic_page() is not None:
+            # Скачиваем страницы части в пуле потоков
+            for result in self._map_in_threads(
+                PageDownloader.download_comic_page,
+                chapter_downloader
+            ):
+                if result is not None:
                     succesed_pages = succesed_pages + 1
             # Если ДО ЭТОГО части были скачаны успешно,
             if all_chapters_correct:
@@ -178,66 +211,70 @@ class Downloader(mangalib.Downloader):
         # Были неуспешные скачивания, возвращаем первый неуспешный
         return last_success
 
+    @finishing
     async def async_downloadcomic(self) -> ChapterNumber:
-        async with aiohttp.ClientSession() as session:
-            # Установка последней страницы при её отсутствии
-            if not self.last:
-                self.last = await self.async_find_last(async_session=session)
-
-            if self.first >= self.last:
-                return self.last
-
-            # Получаем данные частей
-            if not self.chapters_data:
-                self.chapters_data = await self._async_get_chapters_data(async_session=session)
-
-            # Скачивание
-            # Создание списка задач
-            tasks: dict[str, mangalib._AsyncDownloadTaskDict] = {}
-            for chapter in self.chapters_data:
-                # Берём номер части
-                num_chapter = chapter.get("number", None)
-                if num_chapter is None:
-                    raise ValueError(f'{num_chapter=}')
-                # Если часть до первой нужной, то пропускаем
-                if self.first > ChapterNumber(num_chapter):
-                    continue
-                # Начиная с последней, пропускаем
-                if self.last <= ChapterNumber(num_chapter):
-                    break
-                # Берём номер тома
-                # num_volume = chapter.get("volume", None)
-                # if num_volume is None:
-                #     raise ValueError(f'{num_volume=}')
-                # Загрузчик частей
-                chapter_downloader = ChapterDownloader(chapter, **self._params)
-                # Количество страниц, которые мы должны скачать
-                pages_in_chapter = len(chapter_downloader.data.get("pages", []))
-                # Создаём задачи
-                tasks[num_chapter] = {
-                    'pages_in_chapter': pages_in_chapter,
-                    'tasks': [],
-                    'results': None,
-                    'succesed_pages': 0
-                }
-                # reversed, так как задачи выполняются последний пришёл - первый ушёл,
-                # а нам надо по порядку
-                for page_downloader in reversed(chapter_downloader):
-                    tasks[num_chapter]['tasks'].append(
-                        asyncio.create_task(
-                            page_downloader.async_download_comic_page(session=session)
-                        )
+        session = await self._session()
+        # Установка последней страницы при её отсутствии
+        if not self.last:
+            self.last = await self.async_find_last(async_session=session)
+
+        if self.first >= self.last:
+            return self.last
+
+        # Получаем данные частей
+        if not self.chapters_data:
+            self.chapters_data = await self._async_get_chapters_data(async_session=session)
+
+        # Скачивание
+        # Создание списка задач
+        tasks: dict[str, mangalib._AsyncDownloadTaskDict] = {}
+        for chapter in self.chapters_data:
+            # Берём номер части
+            num_chapter = chapter.get("number", None)
+            if num_chapter is None:
+                raise ValueError(f'{num_chapter=}')
+            # Если часть до первой нужной, то пропускаем
+            if self.first > ChapterNumber(num_chapter):
+                continue
+            # Начиная с последней, пропускаем
+            if self.last <= ChapterNumber(num_chapter):
+                break
+            # Часть, уже сохранённая архивом, не запрашивается
+            if self._chapter_archived(chapter):
+                continue
+            # Берём номер тома
+            # num_volume = chapter.get("volume", None)
+            # if num_volume is None:
+            #     raise ValueError(f'{num_volume=}')
+            # Загрузчик частей
+            chapter_downloader = await ChapterDownloader.async_create(chapter, **self._params)
+            # Количество страниц, которые мы должны скачать
+            pages_in_chapter = len(chapter_downloader.data.get("pages", []))
+            # Создаём задачи
+            tasks[num_chapter] = {
+                'pages_in_chapter': pages_in_chapter,
+                'tasks': [],
+                'results': None,
+                'succesed_pages': 0
+            }
+            # reversed, так как задачи выполняются последний пришёл - первый ушёл,
+            # а нам надо по порядку
+            for page_downloader in reversed(chapter_downloader):
+                tasks[num_chapter]['tasks'].append(
+                    asyncio.create_task(
+                        page_downloader.async_download_comic_page(session=session)
                     )
-                # Запуск задач (но идём дальше)
-                tasks[num_chapter]['results'] = asyncio.gather(*(tasks[num_chapter]['tasks']))
-            # Ожидание результатов
-            for num_chapter, task in tasks.items():
-                if task['results'] is not None:
-                    results: list[int|None] = await task['results']
-                    # Чистка результатов
-                    task['succesed_pages'] = sum(1 for result in results if result is not None)
-                    del task['results']
-                    del task['tasks']
+                )
+            # Запуск задач (но идём дальше)
+            tasks[num_chapter]['results'] = asyncio.gather(*(tasks[num_chapter]['tasks']))
+        # Ожидание результатов
+        for num_chapter, task in tasks.items():
+            if task['results'] is not None:
+                results: list[int|None] = await task['results']
+                # Чистка результатов
+                task['succesed_pages'] = sum(1 for result in results if result is not None)
+                del task['results']
+                del task['tasks']
 
         # Возврат следующей к скачиванию страницы
         for num_chapter, task in tasks.items():
@@ -254,7 +291,8 @@ class ChapterDownloader(Downloader, mangalib.ChapterDownloader):
         **kwargs
     ):
         Downloader.__init__(self, **kwargs)
-        self.data = self._get_chapter_data(chapter_data)
+        if not self.use_async:
+            self.data = self._get_chapter_data(chapter_data)
 
     @classmethod
     async def async_create(
@@ -262,53 +300,51 @@ class ChapterDownloader(Downloader, mangalib.ChapterDownloader):
         chapter_data: mangalib._ChapterDataDict,
         **kwargs
     ):
-        return cls(chapter_data=chapter_data, **kwargs)
+        """Создание объекта ChapterDownloader с использованием асинхронных методов
+        """
+        self = cls(chapter_data=chapter_data, **kwargs)
+        if self.use_async:
+            self.data = await self._async_get_chapter_data(chapter_data)
+        return self
 
-    def _get_chapter_data(
-        self,
-        chapter_data: mangalib._ChapterDataDict
-    ) -> mangalib._ChapterDataDict:
-        # Инициализируем из доступных данных главу, часть и ид части
+    def _chapter_page_url(self, chapter_data: mangalib._ChapterDataDict) -> str:
+        """Ссылка на первую страницу части, на которой есть данные всех страниц"""
+        # Инициализируем из доступных данных главу и часть
         volume: str = chapter_data.get("volume", None)
         if volume is None:
             raise ValueError(f'{volume=}')
         chapter: str = chapter_data.get("number", None)
         if chapter is None:
             raise ValueError(f'{chapter=}')
-        chapter_id: int = chapter_data.get("id", None)
-        if chapter_id is None:
-            raise ValueError(f'{chapter_id=}')
+        return f"{self._COMIC_DOMAIN}/{self.comic_name}/v{volume}/c{chapter}?ui={self.user_id}&page=1"
 
-        # Устанавливаем куки
+    def _cookies(self) -> dict[str, str]:
+        """Куки авторизации"""
         cookies = {"mangalib_session": self.token["mangalib_session"]}
         if "mangalib_remember_web" in self.token:
             mangalib_remember_web = self.token["mangalib_remember_web"].split('=', 1)
             cookies.update({mangalib_remember_web[0]: mangalib_remember_web[1]})
-        # Подключение к хентайлибу по http/2
-        with httpx.Client(
-            headers = self._HEADERS,
-            cookies = cookies,
-            http2 = True
-        ) as client:
-            # Нужные нам данные можно получить на первой открытой странице
-            url = f"{self._COMIC_DOMAIN}/{self.comic_name}/v{volume}/c{chapter}?ui={self.user_id}&page=1"
-            resp = client.get(url)
-            # Обновляем куку
-            if token := resp.cookies.get("mangalib_session"):
-                self.token["mangalib_session"] = token
-                if self.token_path:
-                    update_token(token, path=self.token_path)
-            content_data = BeautifulSoup(
-                resp.content,
-                "lxml",
-                parse_only=SoupStrainer("script", {"id": "pg"})
-            ).find("script")
-        if content_data:
-            # Так как список страниц хранится в жаваскрипте, выдираем его
-            json_string = content_data.get_text(strip=True).split("=", 1)[-1].strip(";")
-        else:
+        return cookies
+
+    def _update_token_from(self, resp: httpx.Response):
+        """Обновление куки из ответа"""
+        if token := resp.cookies.get("mangalib_session"):
+            self.token["mangalib_session"] = token
+            if self.token_path:
+                update_token(token, path=self.token_path)
+
+    def _fill_chapter_pages(
+        self,
+        chapter_data: mangalib._ChapterDataDict,
+        pages_data: list[_BS_JSONPageDataDict]|None,
+        url: str
+    ) -> mangalib._ChapterDataDict:
+        """Дописывание данных части данными страниц, разобранными со страницы части"""
+        chapter_id: int = chapter_data.get("id", None)
+        if chapter_id is None:
+            raise ValueError(f'{chapter_id=}')
+        if pages_data is None:
             raise ValueError(f"Illegal json on {url}")
-        pages_data: list[_BS_JSONPageDataDict] = json.loads(json_string)
         # Дописываем данные части нужными данными
         chapter_data.update({
             "pages": [
@@ -321,22 +357,60 @@ class ChapterDownloader(Downloader, mangalib.ChapterDownloader):
         })
         return chapter_data
 
+    def _get_chapter_data(
+        self,
+        chapter_data: mangalib._ChapterDataDict
+    ) -> mangalib._ChapterDataDict:
+        import httpx
+
+        # Нужные нам данные можно получить на первой открытой странице
+        url = self._chapter_page_url(chapter_data)
+        # Подключение к хентайлибу по http/2
+        with httpx.Client(
+            headers = self._HEADERS,
+            cookies = self._cookies(),
+            http2 = True
+        ) as client:
+            with self._slot(url) as slot, self._phase("metadata"):
+                resp = client.get(url)
+                if resp.status_code == 429:
+                    slot.congestion()
+            # Обновляем куку
+            self._update_token_from(resp)
+        with self._phase("parse"):
+            pages_data = parse_chapter_pages(resp.content)
+        return self._fill_chapter_pages(chapter_data, pages_data, url)
+
     async def _async_get_chapter_data(
         self,
         chapter_data: mangalib._ChapterDataDict
     ) -> mangalib._ChapterDataDict:
-        return self._get_chapter_data(chapter_data)
-
-    def __iter__(self):
-        for page in self.data.get("pages", []):
-            yield PageDownloader(
-                page = page.get("slug"),
-                volume = self.data.get("volume"),
-                chapter = self.data.get("number"),
-                chapter_title = self.data.get("name"),
-                data = page,
-                **self._params
-            )
+        # Нужные нам данные можно получить на первой открытой странице
+        url = self._chapter_page_url(chapter_data)
+        # Общий клиент http/2, куки передаются заголовком, чтобы не смешиваться в общем хранилище
+        client = await SESSIONS.http2_client()
+        headers = dict(self._HEADERS)
+        headers["cookie"] = "; ".join(f"{name}={value}" for name, value in self._cookies().items())
+        async with self._async_slot(url) as slot:
+            with self._phase("metadata"):
+                resp = await client.get(url, headers=headers)
+            if resp.status_code == 429:
+                slot.congestion()
+        # Обновляем куку
+        self._update_token_from(resp)
+        # Разбор вне цикла событий
+        pages_data = await self._parse(parse_chapter_pages, resp.content)
+        return self._fill_chapter_pages(chapter_data, pages_data, url)
+
+    def _new_page_downloader(self, page: mangalib._PageDataDict) -> PageDownloader:
+        return PageDownloader(
+            page = page.get("slug"),
+            volume = self.data.get("volume"),
+            chapter = self.data.get("number"),
+            chapter_title = self.data.get("name"),
+            data = page,
+            **self._params
+        )
 
 class PageDownloader(Downloader, mangalib.PageDownloader):
     def __init__(
@@ -445,7 +519,7 @@ def get_token(path: str = "config.toml") -> _CookieTokenDict:
     mangalib_remember_web = "remember_web_***=***"
     """
     with open(path, "rb") as file:
-        config = tomllib.load(file)
+        config = _tomllib().load(file)
     return _CookieTokenDict({
         'mangalib_session': str(config['mangalib_session']),
         'mangalib_remember_web': str(config['mangalib_remember_web']),
@@ -456,6 +530,7 @@ def update_token(token: str, path: str = "config.toml"):
     """
     # Для обновления нужен tomlkit, но его установка необязательна -
     # без него обновление токена должно игнорироваться
+    tomllib = _tomllib()
     try:
         with open(path, "rb") as file:
             config = tomllib.load(file)
@@ -2,15 +2,18 @@
 https://mangalib.me/
 """
 
+from __future__ import annotations
 from collections import UserList
+import functools
 import os
 import time
-from typing import Final, Iterable, Iterator, NotRequired, TypedDict, overload
+from typing import TYPE_CHECKING, Final, Iterable, Iterator, NotRequired, TypedDict, overload
 import asyncio
-import aiofile
-import aiohttp
-import requests
-from base_downloader import BaseDownloader, BasePageDownloader
+from base_downloader import BaseDownloader, BasePageDownloader, finishing
+
+if TYPE_CHECKING:
+    import aiohttp
+    from chapterarchive import ChapterArchive
 
 _HeadersDict = dict[str, str]
 
@@ -186,6 +189,8 @@ class Downloader(BaseDownloader):
         "https://img4.hentaicdn.org",
         "https://img3.imglib.info",
     )
+    # Сколько страниц части может скачиваться и ждать записи в архив одновременно
+    _ARCHIVE_WINDOW: Final[int] = 8
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
@@ -217,6 +222,25 @@ class Downloader(BaseDownloader):
     def _comic_main_page_link(self) -> str:
         return f"{self._COMIC_DOMAIN}/{self.comic_name}"
 
+    def _chapter_folder(self, chapter: str|None, chapter_title: str|None) -> str:
+        """Имя папки части"""
+        if chapter and chapter_title:
+            return self.make_safe_filename(f"{chapter} - {chapter_title}")
+        if chapter_title:
+            return self.make_safe_filename(chapter_title)
+        if chapter:
+            return self.make_safe_filename(chapter)
+        raise ValueError("self.chapter_title or self.chapter is None")
+
+    def _chapter_archive_path(self, chapter_data: _ChapterDataDict) -> str:
+        """Путь к архиву части при раскладке cbz"""
+        chapter_folder = self._chapter_folder(chapter_data.get("number"), chapter_data.get("name"))
+        return os.path.join(self.folder, f"{chapter_folder}.cbz")
+
+    def _chapter_archived(self, chapter_data: _ChapterDataDict) -> bool:
+        """Сохранена ли часть архивом: готовая часть определяется только наличием архива"""
+        return self.layout.cbz and self._check_corrects_file(self._chapter_archive_path(chapter_data))
+
     def _get_chapters_data(self, use_async: bool=True) -> list[_ChapterDataDict]:
         url = f"{self._API_DOMAIN}/api/manga/{self.comic_name}/chapters"
         if use_async:
@@ -225,42 +249,51 @@ class Downloader(BaseDownloader):
 
         resp = None
         retry = True
-        while retry:
-            retry = False
-            resp = requests.get(url, timeout=60)
-            if resp.status_code == 429:
-                retry = True
-                time.sleep(5)
-            elif not resp.ok:
-                raise ConnectionError(resp.status_code)
+        with self._phase("index"):
+            while retry:
+                retry = False
+                with self._slot(url) as slot:
+                    resp = self._sync_session().get(url, timeout=60)
+                    if resp.status_code == 429:
+                        slot.congestion()
+                if resp.status_code == 429:
+                    retry = True
+                    time.sleep(5)
+                elif not resp.ok:
+                    raise ConnectionError(resp.status_code)
         if resp is None:
             raise ValueError("Response is None")
 
-        data = resp.json().get("data", [])
+        with self._phase("parse"):
+            data = resp.json().get("data", [])
         return data
 
     async def _async_get_chapters_data(
         self,
         async_session: aiohttp.ClientSession|None = None
     ) -> list[_ChapterDataDict]:
-        # Без сессии используем обычный запрос
-        if async_session:
-            _request = async_session.request
-        else:
-            _request = aiohttp.request
+        # Без сессии используем общую сессию запуска
+        if async_session is None:
+            async_session = await self._session()
 
         url = f"{self._API_DOMAIN}/api/manga/{self.comic_name}/chapters"
 
         data = None
         retry = True
-        while retry:
-            retry = False
-            async with _request('GET', url) as resp:
-                if resp.status == 429:
-                    retry = True
+        with self._phase("index"):
+            while retry:
+                retry = False
+                async with (
+                    self._async_slot(url) as slot,
+                    async_session.request('GET', url) as resp
+                ):
+                    if resp.status == 429:
+                        slot.congestion()
+                        retry = True
+                    else:
+                        data = (await resp.json()).get("data", [])
+                if retry:
                     await asyncio.sleep(5)
-                else:
-                    data = (await resp.json()).get("data", [])
         if data is None:
             raise ValueError("Data is None")
 
@@ -289,13 +322,11 @@ class Downloader(BaseDownloader):
         # Запросов не делается, просто возвращаем как обычно
         return self.find_last()
 
+    @finishing
     def downloadcomic(self) -> ChapterNumber:
         # Асинхронное скачивание
         if self.use_async:
-            loop = asyncio.get_event_loop()
-            last_success = loop.run_until_complete(self.async_downloadcomic())
-            loop.close()
-            return last_success
+            return self._run_async(self.async_downloadcomic())
 
         # Обычное скачивание
         # Установка последней части при её отсутствии
@@ -323,6 +354,11 @@ class Downloader(BaseDownloader):
             # Начиная с последней, прекращаем
             if self.last <= ChapterNumber(num_chapter):
                 break
+            # Часть, уже сохранённая архивом, не запрашивается
+            if self._chapter_archived(chapter):
+                if all_chapters_correct:
+                    last_success = num_chapter
+                continue
             # Берём номер тома
             num_volume = self._to_number(chapter.get("volume", None))
             if num_volume is None:
@@ -333,9 +369,12 @@ class Downloader(BaseDownloader):
             pages_in_chapter = len(chapter_downloader.data.get("pages", []))
             # Количество страниц, которые мы скачали
             succesed_pages = 0
-            # Последовательно скачиваем страницы
-            for page_downloader in chapter_downloader:
-                if page_downloader.download_comic_page() is not None:
+            # Скачиваем страницы части в пуле потоков
+            for result in self._map_in_threads(
+                PageDownloader.download_comic_page,
+                chapter_downloader
+            ):
+                if result is not None:
                     succesed_pages = succesed_pages + 1
             # Если ДО ЭТОГО части были скачаны успешно,
             if all_chapters_correct:
@@ -353,69 +392,73 @@ class Downloader(BaseDownloader):
         # Были неуспешные скачивания, возвращаем первый неуспешный
         return last_success
 
+    @finishing
     async def async_downloadcomic(self) -> ChapterNumber:
-        async with aiohttp.ClientSession() as session:
-            # Установка последней страницы при её отсутствии
-            if not self.last:
-                self.last = await self.async_find_last(async_session=session)
+        session = await self._session()
+        # Установка последней страницы при её отсутствии
+        if not self.last:
+            self.last = await self.async_find_last(async_session=session)
 
-            if self.first >= self.last:
-                return self.last
+        if self.first >= self.last:
+            return self.last
 
-            if not self.chapters_data:
-                self.chapters_data = await self._async_get_chapters_data(async_session=session)
+        if not self.chapters_data:
+            self.chapters_data = await self._async_get_chapters_data(async_session=session)
 
-            # Скачивание
-            # Создание списка задач
-            tasks: dict[str, _AsyncDownloadTaskDict] = {}
-            for chapter in self.chapters_data:
-                # Берём номер части
-                num_chapter = chapter.get("number", None)
-                if num_chapter is None:
-                    raise ValueError(f'{num_chapter=}')
-                # Если часть до первой нужной, то пропускаем
-                if self.first > ChapterNumber(num_chapter):
-                    continue
-                # Начиная с последней, пропускаем
-                if self.last <= ChapterNumber(num_chapter):
-                    break
-                # Берём номер тома
-                num_volume = chapter.get("volume", None)
-                if num_volume is None:
-                    raise ValueError(f'{num_volume=}')
-                # Загрузчик частей
-                chapter_downloader = await ChapterDownloader.async_create(
-                    num_volume,
-                    num_chapter,
-                    **self._params
-                )
-                # Количество страниц, которые мы должны скачать
-                pages_in_chapter = len(chapter_downloader.data.get("pages", []))
-                # Создаём задачи
-                tasks[num_chapter] = _AsyncDownloadTaskDict({
-                    'pages_in_chapter': pages_in_chapter,
-                    'tasks': [],
-                    'results': None,
-                    'succesed_pages': 0
-                })
-                # reversed, так как задачи выполняются последний пришёл - первый ушёл,
-                # а нам надо по порядку
-                for page_downloader in reversed(chapter_downloader):
-                    tasks[num_chapter]['tasks'].append(
-                        asyncio.create_task(
-                            page_downloader.async_download_comic_page(session=session)
-                        )
+        # Скачивание
+        # Создание списка задач
+        tasks: dict[str, _AsyncDownloadTaskDict] = {}
+        for chapter in self.chapters_data:
+            # Берём номер части
+            num_chapter = chapter.get("number", None)
+            if num_chapter is None:
+                raise ValueError(f'{num_chapter=}')
+            # Если часть до первой нужной, то пропускаем
+            if self.first > ChapterNumber(num_chapter):
+                continue
+            # Начиная с последней, пропускаем
+            if self.last <= ChapterNumber(num_chapter):
+                break
+            # Часть, уже сохранённая архивом, не запрашивается
+            if self._chapter_archived(chapter):
+                continue
+            # Берём номер тома
+            num_volume = chapter.get("volume", None)
+            if num_volume is None:
+                raise ValueError(f'{num_volume=}')
+            # Загрузчик частей
+            chapter_downloader = await ChapterDownloader.async_create(
+                num_volume,
+                num_chapter,
+                **self._params
+            )
+            # Количество страниц, которые мы должны скачать
+            pages_in_chapter = len(chapter_downloader.data.get("pages", []))
+            # Создаём задачи
+            tasks[num_chapter] = _AsyncDownloadTaskDict({
+                'pages_in_chapter': pages_in_chapter,
+                'tasks': [],
+                'results': None,
+                'succesed_pages': 0
+            })
+            # reversed, так как задачи выполняются последний пришёл - первый ушёл,
+            # а нам надо по порядку
+            for page_downloader in reversed(chapter_downloader):
+                tasks[num_chapter]['tasks'].append(
+                    asyncio.create_task(
+                        page_downloader.async_download_comic_page(session=session)
                     )
-                # Запуск задач (но идём дальше)
-                tasks[num_chapter]['results'] = asyncio.gather(*(tasks[num_chapter]['tasks']))
-            # Ожидание результатов
-            for num_chapter, task in tasks.items():
-                if task['results'] is not None:
-                    results: list[int|None] = await task['results']
-                    # Чистка результатов
-                    task['succesed_pages'] = sum(1 for result in results if result is not None)
-                    del task['results']
-                    del task['tasks']
+                )
+            # Запуск задач (но идём дальше)
+            tasks[num_chapter]['results'] = asyncio.gather(*(tasks[num_chapter]['tasks']))
+        # Ожидание результатов
+        for num_chapter, task in tasks.items():
+            if task['results'] is not None:
+                results: list[int|None] = await task['results']
+                # Чистка результатов
+                task['succesed_pages'] = sum(1 for result in results if result is not None)
+                del task['results']
+                del task['tasks']
 
         # Возврат следующей к скачиванию страницы
         for num_chapter, task in tasks.items():
@@ -426,6 +469,9 @@ class Downloader(BaseDownloader):
         return self.last
 
 class ChapterDownloader(Downloader):
+    # Части пишутся в папку комикса, индекс которой ведёт загрузчик комикса
+    _reuse_dir_index = True
+
     def __init__(
         self,
         volume: str|ChapterNumber,
@@ -477,65 +523,106 @@ class ChapterDownloader(Downloader):
 
         resp = None
         retry = True
-        while retry:
-            retry = False
-            resp = requests.get(url, timeout=60)
-            if resp.status_code == 429:
-                retry = True
-                time.sleep(5)
-            elif not resp.ok:
-                raise ConnectionError(resp.status_code)
+        with self._phase("metadata"):
+            while retry:
+                retry = False
+                with self._slot(url) as slot:
+                    resp = self._sync_session().get(url, timeout=60)
+                    if resp.status_code == 429:
+                        slot.congestion()
+                if resp.status_code == 429:
+                    retry = True
+                    time.sleep(5)
+                elif not resp.ok:
+                    raise ConnectionError(resp.status_code)
         if resp is None:
             raise ValueError("Response is None")
-        data = resp.json().get("data", {})
+        with self._phase("parse"):
+            data = resp.json().get("data", {})
         if toast := data.get("toast", None):
             raise ValueError(toast.get("message", ""), data)
         return data
 
-    async def _async_get_chapter_data(self, volume: str, chapter: str) -> _ChapterDataDict:
+    async def _async_get_chapter_data(
+        self,
+        volume: str,
+        chapter: str,
+        async_session: aiohttp.ClientSession|None = None
+    ) -> _ChapterDataDict:
+        # Без сессии используем общую сессию запуска
+        if async_session is None:
+            async_session = await self._session()
+
         url = (
             f"{self._API_DOMAIN}"
             f"/api/manga/{self.comic_name}/chapter?number={chapter}&volume={volume}"
         )
         data = None
         retry = True
-        while retry:
-            retry = False
-            async with aiohttp.request('GET', url) as resp:
-                if resp.status == 429:
-                    retry = True
+        with self._phase("metadata"):
+            while retry:
+                retry = False
+                async with (
+                    self._async_slot(url) as slot,
+                    async_session.request('GET', url) as resp
+                ):
+                    if resp.status == 429:
+                        slot.congestion()
+                        retry = True
+                    else:
+                        data = (await resp.json()).get("data", {})
+                if retry:
                     await asyncio.sleep(5)
-                else:
-                    data = (await resp.json()).get("data", {})
         if data is None:
             raise ValueError("Data is None")
         if toast := data.get("toast", None):
             raise ValueError(toast.get("message", ""), data)
         return data
 
+    @functools.cached_property
+    def archive(self) -> ChapterArchive|None:
+        """Архив части при раскладке cbz, общий для её страниц"""
+        if not self.layout.cbz:
+            return None
+        from chapterarchive import ChapterArchive
+        return ChapterArchive(
+            self._chapter_archive_path(self.data),
+            len(self.data.get("pages", [])),
+            window = self._ARCHIVE_WINDOW,
+            on_commit = self._file_written
+        )
+
+    def _new_page_downloader(self, page: _PageDataDict) -> PageDownloader:
+        return PageDownloader(
+            page = page.get("slug"),
+            volume = self.data.get("volume"),
+            chapter = self.data.get("number"),
+            chapter_title = self.data.get("name"),
+            data = page,
+            **self._params
+        )
+
+    def _page_downloader(self, index: int, page: _PageDataDict) -> PageDownloader:
+        """Загрузчик страницы части с её местом в архиве части"""
+        page_downloader = self._new_page_downloader(page)
+        page_downloader.index = index
+        page_downloader.archive = self.archive
+        return page_downloader
+
     def __iter__(self):
-        for page in self.data.get("pages", []):
-            yield PageDownloader(
-                page = page.get("slug"),
-                volume = self.data.get("volume"),
-                chapter = self.data.get("number"),
-                chapter_title = self.data.get("name"),
-                data = page,
-                **self._params
-            )
+        for index, page in enumerate(self.data.get("pages", [])):
+            yield self._page_downloader(index, page)
 
     def __reversed__(self):
-        for page in reversed(self.data.get("pages", [])):
-            yield PageDownloader(
-                page = page.get("slug"),
-                volume = self.data.get("volume"),
-                chapter = self.data.get("number"),
-                chapter_title = self.data.get("name"),
-                data = page,
-                **self._params
-            )
+        pages = self.data.get("pages", [])
+        for index in reversed(range(len(pages))):
+            yield self._page_downloader(index, pages[index])
 
 class PageDownloader(BasePageDownloader, Downloader):
+    # Номер страницы в части и архив части, их задаёт ChapterDownloader
+    index: int = 0
+    archive: ChapterArchive|None = None
+
     def __init__(
         self,
         page: int|None = None,
@@ -620,22 +707,95 @@ class PageDownloader(BasePageDownloader, Downloader):
     def _comic_page_description(self) -> str|None:
         return None
 
+    def _fetch_content(self) -> bytes|None:
+        """Скачивание файла страницы с перебором доменов картинок, None — если не удалось"""
+        import requests
+
+        for img_domain in range(len(self._IMG_DOMAIN)):
+            comic_file_link = self._comic_file_link(img_domain=img_domain)
+            try:
+                with (
+                    self._slot(comic_file_link) as slot,
+                    self._phase("transfer"),
+                    self._sync_session().get(
+                        comic_file_link,
+                        headers = self._HEADERS,
+                        timeout = 180
+                    ) as resp
+                ):
+                    if resp.status_code == 429:
+                        slot.congestion()
+                    if not resp.ok:
+                        raise requests.exceptions.HTTPError(response=resp)
+                    # Обрезанная картинка или страница ошибки берётся с другого домена
+                    if not self._content_correct(resp.content, self._expected_size(resp.headers)):
+                        raise requests.exceptions.HTTPError(response=resp)
+                    return resp.content
+            except (
+                requests.exceptions.ConnectionError,
+                requests.exceptions.HTTPError
+            ) as exc:
+                pass
+        return None
+
+    async def _async_fetch_content(self, session: aiohttp.ClientSession) -> bytes|None:
+        """Асинхронное скачивание файла страницы, следующий домен картинок берётся
+        только при ошибке соединения, None — если не удалось
+        """
+        import aiohttp
+
+        for img_domain in range(len(self._IMG_DOMAIN)):
+            comic_file_link = self._comic_file_link(img_domain)
+            try:
+                content = None
+                async with self._async_slot(comic_file_link) as slot:
+                    with self._phase("transfer"):
+                        async with session.request(
+                            "GET",
+                            comic_file_link,
+                            headers=self._HEADERS
+                        ) as resp:
+                            if resp.status == 429:
+                                slot.congestion()
+                            if resp.ok:
+                                content = await resp.read()
+                                if not self._content_correct(
+                                    content, self._expected_size(resp.headers)
+                                ):
+                                    content = None
+                return content
+            except aiohttp.ClientConnectionError as exc:
+                pass
+        return None
+
+    def _archived_page(self, content: bytes|None) -> bytes|None:
+        """Содержимое для архива части, None — если страница не скачалась"""
+        if content is None or not self._content_correct(content):
+            return None
+        return content
+
     def download_comic_page(self) -> int|None:
         if not self.data:
             raise ValueError("data is None")
         # Путь к скачанному файлу
         ext = os.path.splitext(self._comic_file_link())[-1] or ".jpg"
-        if self.chapter and self.chapter_title:
-            chapter_folder = self.make_safe_filename(f"{self.chapter} - {self.chapter_title}")
-        elif self.chapter_title:
-            chapter_folder = self.make_safe_filename(self.chapter_title)
-        elif self.chapter:
-            chapter_folder = self.make_safe_filename(self.chapter)
-        else:
-            raise ValueError("self.chapter_title or self.chapter is None")
+
+        # Страница части, собираемой в архив, пишется в него по порядку
+        if self.archive is not None:
+            content = None
+            try:
+                self.archive.wait_turn(self.index)
+                content = self._archived_page(self._fetch_content())
+            except TimeoutError:
+                time.sleep(5)
+            finally:
+                with self._phase("write"):
+                    self.archive.add(self.index, self._comic_filename(ext=ext), content)
+            return self.page if content is not None else None
+
         chapter_dir = os.path.join(
             self.folder,
-            chapter_folder
+            self._chapter_folder(self.chapter, self.chapter_title)
         )
         comic_filepath = os.path.join(
             chapter_dir,
@@ -644,33 +804,24 @@ class PageDownloader(BasePageDownloader, Downloader):
 
         # Перескачивать уже существующий файл не нужно
         if not self._check_corrects_file(comic_filepath):
-            if not os.path.isdir(chapter_dir):
-                os.makedirs(chapter_dir)
+            # Страницы части качаются параллельно, папку может создать соседний поток
+            self._makedirs(chapter_dir)
             # Скачивание
             try:
-                for img_domain in range(len(self._IMG_DOMAIN)):
-                    try:
-                        with requests.get(
-                            self._comic_file_link(img_domain=img_domain),
-                            headers = self._HEADERS,
-                            timeout = 180
-                        ) as resp:
-                            if resp.ok:
-                                if int(resp.headers.get("Content-Length", 0)) < 512:
-                                    raise requests.exceptions.HTTPError(response=resp)
-                                with open(comic_filepath, 'wb') as file:
-                                    file.write(resp.content)
-                            else:
-                                raise requests.exceptions.HTTPError(response=resp)
-                        break
-                    except (
-                        requests.exceptions.ConnectionError,
-                        requests.exceptions.HTTPError
-                    ) as exc:
-                        pass
+                content = self._fetch_content()
             except TimeoutError:
                 time.sleep(5)
                 return None
+            if content is not None:
+                self._unlink_shared(comic_filepath)
+                with self._phase("write"), open(comic_filepath, 'wb') as file:
+                    file.write(content)
+                self._file_written(
+                    comic_filepath,
+                    len(content),
+                    self._content_digest(content),
+                    self._content_correct(content)
+                )
 
         # В случае успеха вернём номер страницы, иначе None
         if self._check_corrects_file(comic_filepath):
@@ -681,27 +832,38 @@ class PageDownloader(BasePageDownloader, Downloader):
         self,
         session: aiohttp.ClientSession|None = None
     ) -> int|None:
+        import aiofile
+
         if self.page is None:
             raise ValueError("page is None")
-        # Без сессии скачиваем страницу обычным запросом
-        if session:
-            _request = session.request
-        else:
-            _request = aiohttp.request
+        # Без сессии используем общую сессию запуска
+        if session is None:
+            session = await self._session()
 
         # Путь к скачанному файлу
         ext = os.path.splitext(self._comic_file_link())[-1] or ".jpg"
-        if self.chapter and self.chapter_title:
-            chapter_folder = self.make_safe_filename(f"{self.chapter} - {self.chapter_title}")
-        elif self.chapter_title:
-            chapter_folder = self.make_safe_filename(self.chapter_title)
-        elif self.chapter:
-            chapter_folder = self.make_safe_filename(self.chapter)
-        else:
-            raise ValueError("self.chapter_title or self.chapter is None")
+
+        # Страница части, собираемой в архив, пишется в него по порядку
+        if self.archive is not None:
+            content = None
+            try:
+                await self.archive.async_wait_turn(self.index)
+                content = self._archived_page(await self._async_fetch_content(session))
+            except TimeoutError:
+                await asyncio.sleep(1)
+            finally:
+                with self._phase("write"):
+                    await asyncio.to_thread(
+                        self.archive.add,
+                        self.index,
+                        self._comic_filename(ext=ext),
+                        content
+                    )
+            return self.page if content is not None else None
+
         chapter_dir = os.path.join(
             self.folder,
-            chapter_folder
+            self._chapter_folder(self.chapter, self.chapter_title)
         )
         comic_filepath = os.path.join(
             chapter_dir,
@@ -710,27 +872,24 @@ class PageDownloader(BasePageDownloader, Downloader):
 
         # Перескачивать уже существующий файл не нужно
         if not self._check_corrects_file(comic_filepath):
-            if not os.path.isdir(chapter_dir):
-                os.makedirs(chapter_dir)
+            self._makedirs(chapter_dir)
             # Скачивание
             try:
-                for img_domain in range(len(self._IMG_DOMAIN)):
-                    try:
-                        async with _request(
-                            "GET",
-                            self._comic_file_link(img_domain),
-                            headers=self._HEADERS
-                        ) as resp:
-                            if resp.ok:
-                                if int(resp.headers.get("Content-Length", 0)) >= 512:
-                                    async with aiofile.async_open(comic_filepath, 'wb') as file:
-                                        await file.write(await resp.read())
-                        break
-                    except aiohttp.ClientConnectionError as exc:
-                        pass
+                content = await self._async_fetch_content(session)
             except TimeoutError:
                 await asyncio.sleep(1)
                 return None
+            if content is not None:
+                self._unlink_shared(comic_filepath)
+                with self._phase("write"):
+                    async with aiofile.async_open(comic_filepath, 'wb') as file:
+                        await file.write(content)
+                self._file_written(
+                    comic_filepath,
+                    len(content),
+                    self._content_digest(content),
+                    self._content_correct(content)
+                )
 
         # В случае успеха вернём номер страницы, иначе None
         if self._check_corrects_file(comic_filepath):
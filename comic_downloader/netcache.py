@@ -0,0 +1,144 @@
+"""
+Общий на запуск сетевой кэш: адреса DNS и статистика соединений
+
+Хранится в файле SQLite, поэтому его разделяют все процессы-загрузчики одного запуска:
+хост, разрешённый одним загрузчиком, остальные берут из кэша.
+"""
+
+from dataclasses import asdict, dataclass, fields
+import json
+import sqlite3
+import threading
+import time
+from typing import Any
+
+@dataclass
+class NetStats:
+    """Счётчики сетевой активности"""
+    # Разрешения имён из общего кэша и через DNS
+    dns_hits: int = 0
+    dns_misses: int = 0
+    # Новые и переиспользованные соединения
+    connections_new: int = 0
+    connections_reused: int = 0
+    # Из них защищённые: новое соединение — полное рукопожатие TLS
+    tls_new: int = 0
+    tls_reused: int = 0
+
+    def reset(self):
+        """Обнуление счётчиков"""
+        for field in fields(self):
+            setattr(self, field.name, 0)
+
+    @property
+    def handshakes_saved(self) -> int:
+        """Сэкономлено рукопожатий TLS благодаря переиспользованию соединений"""
+        return self.tls_reused
+
+    def __str__(self) -> str:
+        return (
+            f"DNS: из кэша {self.dns_hits}, запросов {self.dns_misses}; "
+            f"соединений: новых {self.connections_new}, переиспользовано {self.connections_reused}; "
+            f"сэкономлено рукопожатий TLS: {self.handshakes_saved}"
+        )
+
+class NetCache:
+    """Файл сетевого кэша
+
+    Parameters
+    ----------
+    path: str
+        Путь к файлу SQLite, создаётся при отсутствии
+    """
+    def __init__(self, path: str):
+        self.path = path
+        # Копия в памяти, чтобы не обращаться к файлу на каждое разрешение
+        self._dns: dict[tuple[str, int, int], tuple[float, list[dict[str, Any]]]] = {}
+        # Одно соединение на кэш: к файлу обращаются из потоков, см. CachingResolver
+        self._connection: sqlite3.Connection|None = None
+        self._lock = threading.Lock()
+        with self._lock:
+            with self._connect() as cursor:
+                cursor.execute(
+                    """CREATE TABLE IF NOT EXISTS dns (
+                    host    TEXT     NOT NULL,
+                    port    INTEGER  NOT NULL,
+                    family  INTEGER  NOT NULL,
+                    addrs   TEXT     NOT NULL,
+                    expires REAL     NOT NULL,
+                    PRIMARY KEY (host, port, family)
+                    )"""
+                )
+                cursor.execute(
+                    """CREATE TABLE IF NOT EXISTS stats (
+                    name  TEXT     PRIMARY KEY,
+                    value INTEGER  NOT NULL
+                    )"""
+                )
+
+    def _connect(self) -> sqlite3.Connection:
+        """Соединение кэша, вызывается под self._lock"""
+        if self._connection is None:
+            # Запись идёт из нескольких процессов, поэтому ждём освобождения файла
+            self._connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        return self._connection
+
+    def close(self):
+        """Закрытие соединения с файлом, при следующем обращении оно откроется снова"""
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    def cached_dns(self, host: str, port: int, family: int) -> list[dict[str, Any]]|None:
+        """Адреса хоста из копии в памяти, без обращения к файлу"""
+        entry = self._dns.get((host, port, family))
+        if entry is not None and entry[0] > time.time():
+            return entry[1]
+        return None
+
+    def get_dns(self, host: str, port: int, family: int) -> list[dict[str, Any]]|None:
+        """Адреса хоста из кэша или None, если их нет или они устарели"""
+        if (addrs := self.cached_dns(host, port, family)) is not None:
+            return addrs
+        now = time.time()
+        with self._lock:
+            row = self._connect().execute(
+                """select addrs, expires from dns
+                where host=? and port=? and family=? and expires>?""",
+                (host, port, family, now)
+            ).fetchone()
+        if row is None:
+            return None
+        addrs = json.loads(row[0])
+        self._dns[(host, port, family)] = (row[1], addrs)
+        return addrs
+
+    def set_dns(self, host: str, port: int, family: int, addrs: list[dict[str, Any]], ttl: float):
+        """Сохранение адресов хоста на ttl секунд"""
+        expires = time.time() + ttl
+        self._dns[(host, port, family)] = (expires, addrs)
+        with self._lock:
+            with self._connect() as cursor:
+                cursor.execute(
+                    """insert or replace into dns (host, port, family, addrs, expires)
+                    values (?, ?, ?, ?, ?)""",
+                    (host, port, family, json.dumps(addrs), expires)
+                )
+
+    def add_stats(self, stats: NetStats):
+        """Прибавление счётчиков процесса к общим"""
+        with self._lock:
+            with self._connect() as cursor:
+                cursor.executemany(
+                    """insert into stats (name, value) values (?, ?)
+                    on conflict(name) do update set value=value+excluded.value""",
+                    asdict(stats).items()
+                )
+
+    def get_stats(self) -> NetStats:
+        """Общие счётчики всех процессов"""
+        with self._lock:
+            rows = self._connect().execute("select name, value from stats").fetchall()
+        known = {field.name for field in fields(NetStats)}
+        return NetStats(**{name: value for name, value in rows if name in known})
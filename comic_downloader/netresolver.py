@@ -0,0 +1,50 @@
+"""
+Разрешение имён через общий сетевой кэш запуска
+
+Отдельный модуль, так как зависит от aiohttp и импортируется только при создании сессии
+"""
+
+import asyncio
+import socket
+from aiohttp.abc import AbstractResolver, ResolveResult
+from aiohttp.resolver import DefaultResolver
+from netcache import NetCache, NetStats
+
+class CachingResolver(AbstractResolver):
+    """Разрешение имён через общий сетевой кэш запуска
+
+    Parameters
+    ----------
+    cache: NetCache
+        Общий кэш
+    stats: NetStats
+        Счётчики, куда учитываются попадания и промахи
+    ttl: float
+        Время жизни новых записей в секундах
+    """
+    def __init__(self, cache: NetCache, stats: NetStats, ttl: float):
+        self._cache = cache
+        self._stats = stats
+        self._ttl = ttl
+        self._resolver = DefaultResolver()
+
+    async def resolve(
+        self,
+        host: str,
+        port: int = 0,
+        family: socket.AddressFamily = socket.AF_INET
+    ) -> list[ResolveResult]:
+        # Копия в памяти отвечает сразу, а файл кэша читается и пишется вне цикла событий
+        addrs = self._cache.cached_dns(host, port, int(family))
+        if addrs is None:
+            addrs = await asyncio.to_thread(self._cache.get_dns, host, port, int(family))
+        if addrs is not None:
+            self._stats.dns_hits += 1
+            return addrs # type: ignore
+        addrs = await self._resolver.resolve(host, port, family)
+        self._stats.dns_misses += 1
+        await asyncio.to_thread(self._cache.set_dns, host, port, int(family), addrs, self._ttl) # type: ignore
+        return addrs
+
+    async def close(self):
+        await self._resolver.close()
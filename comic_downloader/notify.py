@@ -0,0 +1,132 @@
+"""
+Уведомления об обновлениях комиксов
+
+Обновления копятся за весь запуск и показываются одной сводкой в фоновом потоке,
+чтобы не задерживать скачивание. Способ показа выбирается параметром -notify:
+- toast: всплывающее уведомление Windows (win10toast импортируется только при показе);
+- stdout: вывод в консоль;
+- file: дописывание в файл;
+- none: без уведомлений.
+"""
+
+from abc import ABC, abstractmethod
+import datetime
+import importlib.util
+import sys
+import threading
+
+KINDS = ("auto", "toast", "stdout", "file", "none")
+
+class Notifier(ABC):
+    """Сборщик обновлений запуска
+
+    Parameters
+    ----------
+    limit: int|None
+        Сколько обновлений перечислять в сводке, остальные только считаются
+    """
+    def __init__(self, limit: int|None = None):
+        self.limit = limit
+        self.updates: list[tuple[str, str]] = []
+        self._thread: threading.Thread|None = None
+
+    def add(self, name: str, text: str):
+        """Добавление обновления комикса в сводку"""
+        self.updates.append((name, text))
+
+    def summary(self) -> tuple[str, str]:
+        """Заголовок и текст сводки"""
+        updates = self.updates if self.limit is None else self.updates[:self.limit]
+        lines = [f"{name}: {text}" for name, text in updates]
+        if hidden := len(self.updates) - len(updates):
+            lines.append(f"…и ещё {hidden}")
+        return f"RSS: обновлено комиксов {len(self.updates)}", "\n".join(lines)
+
+    @abstractmethod
+    def _send(self, title: str, message: str):
+        """Показ сводки"""
+
+    def flush(self):
+        """Показ сводки накопленных обновлений в фоновом потоке"""
+        if not self.updates:
+            return
+        self.join()
+        title, message = self.summary()
+        self.updates = []
+        # Поток не фоновый: процесс дождётся показа, но уже после всей работы
+        self._thread = threading.Thread(target=self._send, args=(title, message))
+        self._thread.start()
+
+    def join(self):
+        """Ожидание окончания показа"""
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+class NullNotifier(Notifier):
+    """Без уведомлений"""
+    def _send(self, title: str, message: str):
+        pass
+
+class StdoutNotifier(Notifier):
+    """Вывод сводки в консоль"""
+    def _send(self, title: str, message: str):
+        print(f"{title}\n{message}")
+
+class FileNotifier(Notifier):
+    """Дописывание сводки в файл
+
+    Parameters
+    ----------
+    path: str
+        Путь к файлу
+    """
+    def __init__(self, path: str, limit: int|None = None):
+        super().__init__(limit)
+        self.path = path
+
+    def _send(self, title: str, message: str):
+        with open(self.path, "a", encoding="utf-8") as file:
+            file.write(f"[{datetime.datetime.now():%Y-%m-%d %H:%M:%S}] {title}\n{message}\n\n")
+
+class ToastNotifier(Notifier):
+    """Всплывающее уведомление Windows
+
+    В уведомление помещается немного текста, поэтому перечисляются первые обновления
+    """
+    def __init__(self, limit: int|None = 5, duration: int = 5):
+        super().__init__(limit)
+        self.duration = duration
+
+    def _send(self, title: str, message: str):
+        from win10toast import ToastNotifier as Toaster
+
+        Toaster().show_toast(title, message, duration=self.duration)
+
+def create(kind: str = "auto", path: str|None = None) -> Notifier:
+    """Создание уведомителя
+
+    Parameters
+    ----------
+    kind: str
+        Способ показа, см. KINDS; auto — toast в Windows при наличии win10toast, иначе stdout
+    path: str|None
+        Файл для способа file
+    """
+    if kind == "auto":
+        # Наличие модуля проверяется без его импорта
+        if sys.platform == "win32" and importlib.util.find_spec("win10toast") is not None:
+            kind = "toast"
+        else:
+            kind = "stdout"
+    if kind == "toast":
+        return ToastNotifier()
+    if kind == "stdout":
+        return StdoutNotifier()
+    if kind == "file":
+        if not path:
+            raise ValueError("path is None")
+        return FileNotifier(path)
+    if kind == "none":
+        return NullNotifier()
+    raise ValueError(f"Unknown notifier: {kind}")
@@ -0,0 +1,253 @@
+"""
+Раскладка страниц комикса по папкам
+
+По умолчанию страницы лежат прямо в папке комикса. У длинных комиксов (AComics, Sequential Art)
+там набираются десятки тысяч файлов, и обход папки, резервное копирование и сетевые диски
+начинают тормозить, поэтому страницы можно раскладывать по вложенным папкам-диапазонам
+номеров: 00000-00999, 01000-01999 и так далее. У комиксов с частями (MangaLib, HentaiLib)
+вместо папок частей с отдельными страницами можно хранить по архиву CBZ на часть,
+см. chapterarchive.
+
+Раскладка записывается в файл .layout в папке комикса, загрузчик читает её оттуда,
+поэтому менять её нужно только этим инструментом, переносящим уже скачанные страницы:
+    python comic_downloader/pagelayout.py папка [папка ...] -layout range:1000
+    python comic_downloader/pagelayout.py -db rss.db -layout range:1000
+    python comic_downloader/pagelayout.py папка -layout cbz
+Прерванный перенос безопасно запускать повторно.
+"""
+
+import argparse
+from dataclasses import dataclass
+import os
+import re
+
+# Файл с раскладкой в папке комикса
+LAYOUT_FILE = ".layout"
+
+# Номер страницы в начале имени файла: «12 - Заголовок.jpg», «12.txt», «SA_0012_small.jpg»
+_PAGE_NUMBER = re.compile(r"(?:[A-Za-z]+_)?(\d+)(?=[ ._-]|$)")
+# Имя папки-диапазона
+_BUCKET_NAME = re.compile(r"\d+-\d+")
+
+@dataclass(frozen=True)
+class PageLayout:
+    """Раскладка страниц
+
+    Parameters
+    ----------
+    bucket: int
+        Число страниц в папке-диапазоне, 0 — все страницы в папке комикса
+    cbz: bool
+        Части хранятся архивами CBZ, а не папками
+    """
+    bucket: int = 0
+    cbz: bool = False
+
+    @classmethod
+    def parse(cls, spec: str) -> "PageLayout":
+        """Раскладка из строки flat, range[:размер] или cbz"""
+        kind, _, size = spec.strip().partition(":")
+        if kind == "flat" and not size:
+            return cls()
+        if kind == "cbz" and not size:
+            return cls(cbz=True)
+        if kind == "range":
+            bucket = int(size or 1000)
+            if bucket > 0:
+                return cls(bucket)
+        raise ValueError(f"Неизвестная раскладка: {spec!r}")
+
+    def __str__(self) -> str:
+        if self.cbz:
+            return "cbz"
+        return f"range:{self.bucket}" if self.bucket else "flat"
+
+    def bucket_name(self, page: int) -> str|None:
+        """Имя папки-диапазона страницы, None — если раскладка плоская"""
+        if not self.bucket:
+            return None
+        start = page // self.bucket * self.bucket
+        return f"{start:0>5}-{start + self.bucket - 1:0>5}"
+
+    def page_dir(self, folder: str, page: int) -> str:
+        """Папка страницы"""
+        if (name := self.bucket_name(page)) is None:
+            return folder
+        return os.path.join(folder, name)
+
+def read_layout(folder: str|os.PathLike) -> PageLayout:
+    """Раскладка папки комикса, без файла .layout — плоская"""
+    try:
+        with open(os.path.join(folder, LAYOUT_FILE), encoding="utf-8") as file:
+            return PageLayout.parse(file.read())
+    except FileNotFoundError:
+        return PageLayout()
+
+def write_layout(folder: str|os.PathLike, layout: PageLayout):
+    """Запись раскладки папки комикса"""
+    path = os.path.join(folder, LAYOUT_FILE)
+    if layout == PageLayout():
+        if os.path.exists(path):
+            os.remove(path)
+        return
+    with open(f"{path}.tmp", "w", encoding="utf-8") as file:
+        file.write(str(layout))
+    os.replace(f"{path}.tmp", path)
+
+def page_number(filename: str) -> int|None:
+    """Номер страницы по имени файла, None — если это не файл страницы"""
+    if match := _PAGE_NUMBER.match(filename):
+        return int(match[1])
+    return None
+
+def page_files(folder: str) -> list[tuple[str, str]]:
+    """Файлы страниц папки комикса и её папок-диапазонов: (папка, имя)"""
+    files = []
+    with os.scandir(folder) as entries:
+        for entry in entries:
+            if entry.is_dir() and _BUCKET_NAME.fullmatch(entry.name):
+                with os.scandir(entry.path) as bucket_entries:
+                    files.extend((entry.path, sub.name) for sub in bucket_entries if sub.is_file())
+            elif entry.is_file() and entry.name != LAYOUT_FILE and not entry.name.endswith(".cbz"):
+                files.append((folder, entry.name))
+    return files
+
+def _migrate_chapters(folder: str, layout: PageLayout, dry_run: bool) -> int:
+    """Упаковка папок частей в архивы или распаковка архивов в папки
+
+    Returns:
+        int: Число упакованных или распакованных частей
+    """
+    import shutil
+    import chapterarchive
+
+    moved = 0
+    with os.scandir(folder) as entries:
+        chapters = [
+            entry for entry in entries
+            if (
+                entry.is_dir() and not _BUCKET_NAME.fullmatch(entry.name)
+                if layout.cbz
+                else entry.is_file() and entry.name.endswith(".cbz")
+            )
+        ]
+    for entry in chapters:
+        if layout.cbz:
+            with os.scandir(entry.path) as chapter_entries:
+                if not any(sub.is_file() for sub in chapter_entries):
+                    continue
+            moved += 1
+            if not dry_run:
+                chapterarchive.pack_folder(entry.path, f"{entry.path}.cbz")
+                shutil.rmtree(entry.path)
+        else:
+            moved += 1
+            if not dry_run:
+                chapterarchive.unpack_archive(entry.path, entry.path.removesuffix(".cbz"))
+                os.remove(entry.path)
+    return moved
+
+def migrate(folder: str, layout: PageLayout, dry_run: bool = False) -> int:
+    """Перенос страниц папки комикса в раскладку layout
+
+    Файлы без номера страницы остаются на месте. Если на новом месте уже есть файл,
+    то остаётся больший из двух: меньший считается недокачанным.
+    Папки частей упаковываются в архивы при раскладке cbz и распаковываются при других.
+
+    Returns:
+        int: Число перенесённых файлов и частей
+    """
+    moved = 0
+    created: set[str] = set()
+    for src_dir, name in page_files(folder):
+        if (page := page_number(name)) is None:
+            continue
+        dst_dir = layout.page_dir(folder, page)
+        if dst_dir == src_dir:
+            continue
+        moved += 1
+        if dry_run:
+            continue
+        if dst_dir not in created:
+            os.makedirs(dst_dir, exist_ok=True)
+            created.add(dst_dir)
+        src, dst = os.path.join(src_dir, name), os.path.join(dst_dir, name)
+        if os.path.exists(dst) and os.path.getsize(dst) >= os.path.getsize(src):
+            os.remove(src)
+        else:
+            os.replace(src, dst)
+    moved += _migrate_chapters(folder, layout, dry_run)
+    if not dry_run:
+        # Раскладка записывается после переноса: прерванный перенос повторяется с начала
+        write_layout(folder, layout)
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                if entry.is_dir() and _BUCKET_NAME.fullmatch(entry.name):
+                    try:
+                        os.rmdir(entry.path)
+                    except OSError:
+                        pass
+    return moved
+
+# Источники, комиксы которых переносятся в раскладку при -db
+_LAYOUT_SOURCES = {
+    "flat": ("acomics", "sequentialart", "mangalib", "hentailib"),
+    "range": ("acomics", "sequentialart"),
+    "cbz": ("mangalib", "hentailib"),
+}
+
+def _db_folders(db_name: str, layout: PageLayout) -> list[str]:
+    """Папки комиксов из rss.db, к которым подходит раскладка layout"""
+    import sqlite3
+    import registry
+
+    with sqlite3.connect(db_name) as connection:
+        rows = connection.execute("select url, dir, exec_module_path from rss_list").fetchall()
+    connection.close()
+    return [
+        folder for url, folder, exec_module_path in rows
+        if (source := registry.find_source(exec_module_path, url)) is not None
+        and source.id in _LAYOUT_SOURCES[str(layout).partition(":")[0]]
+        and os.path.isdir(folder)
+    ]
+
+def arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Перенос страниц комиксов в другую раскладку папок")
+    parser.add_argument(
+        'folders',
+        nargs = '*',
+        help = 'Папки комиксов',
+        type = str
+    )
+    parser.add_argument(
+        '-db',
+        help = 'Перенести все подходящие комиксы из этой rss.db: AComics и Sequential Art для range, MangaLib и HentaiLib для cbz',
+        type = str,
+        default = None
+    )
+    parser.add_argument(
+        '-layout',
+        help = 'Раскладка: flat — все страницы в папке комикса, range:N — по N страниц в папке, cbz — части архивами',
+        type = PageLayout.parse,
+        default = PageLayout(1000)
+    )
+    parser.add_argument(
+        '-dry-run',
+        help = 'Только посчитать, сколько файлов будет перенесено',
+        action = 'store_true'
+    )
+    return parser
+
+def main(argv: list[str]|None = None):
+    args = arg_parser().parse_args(argv)
+    folders = list(args.folders)
+    if args.db:
+        folders.extend(_db_folders(args.db, args.layout))
+    if not folders:
+        arg_parser().error("не указаны папки комиксов")
+    for folder in folders:
+        moved = migrate(folder, args.layout, args.dry_run)
+        print(f"{folder}: {moved} файлов и частей {'к переносу' if args.dry_run else 'перенесено'} в {args.layout}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,185 @@
+"""
+Профилирование: замер времени этапов скачивания
+
+По умолчанию выключено, и замеры ничего не стоят.
+Включается через enable() (в загрузчиках — параметром -profile),
+после чего каждый этап, обёрнутый в phase(), суммируется по количеству и времени.
+"""
+
+import atexit
+import cProfile
+import json
+import os
+import pstats
+import time
+from typing import Iterable, TypedDict
+import tools
+
+# Этапы, по которым ведётся учёт, в порядке вывода в таблице
+PHASES: dict[str, str] = {
+    'index': "Индекс",
+    'metadata': "Метаданные",
+    'parse': "Разбор",
+    'filename': "Имена",
+    'transfer': "Передача",
+    'write': "Запись",
+    'db': "БД",
+}
+
+class ProfileRecordDict(TypedDict):
+    module: str
+    comic: str
+    phases: dict[str, list[float]]
+
+class _NullPhase:
+    """Заглушка этапа при выключенном профилировании"""
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+class _Phase:
+    """Замер одного прохождения этапа"""
+    __slots__ = ('timer', 'name', 'start')
+
+    def __init__(self, timer: "PhaseTimer", name: str):
+        self.timer = timer
+        self.name = name
+        self.start = 0.
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.timer.add(self.name, time.perf_counter() - self.start)
+        return False
+
+_NULL_PHASE = _NullPhase()
+
+class PhaseTimer:
+    """Накопитель времени по этапам
+
+    Для асинхронного кода замеряется время от входа до выхода из этапа,
+    поэтому одновременно идущие задачи учитываются каждая полностью
+    """
+    def __init__(self, module: str = "", comic: str = ""):
+        self.enabled = False
+        self.module = module
+        self.comic = comic
+        # Этап -> [количество, суммарное время]
+        self.phases: dict[str, list[float]] = {}
+
+    def phase(self, name: str) -> _Phase|_NullPhase:
+        """Контекст замера этапа name"""
+        if not self.enabled:
+            return _NULL_PHASE
+        return _Phase(self, name)
+
+    def add(self, name: str, duration: float, count: int = 1):
+        """Учёт времени этапа"""
+        stat = self.phases.setdefault(name, [0, 0.])
+        stat[0] += count
+        stat[1] += duration
+
+    @property
+    def record(self) -> ProfileRecordDict:
+        """Накопленные данные в сериализуемом виде"""
+        return ProfileRecordDict({
+            'module': self.module,
+            'comic': self.comic,
+            'phases': self.phases,
+        })
+
+    def dump(self, path: str|os.PathLike):
+        """Сохранение накопленных данных в json"""
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump(self.record, file, ensure_ascii=False)
+
+# Таймер текущего процесса
+TIMER = PhaseTimer()
+
+def phase(name: str) -> _Phase|_NullPhase:
+    """Контекст замера этапа name таймером процесса"""
+    return TIMER.phase(name)
+
+def enable(
+    module: str = "",
+    comic: str = "",
+    output: str|os.PathLike|None = None,
+    pstats_output: str|os.PathLike|None = None
+):
+    """Включение профилирования в текущем процессе
+
+    Args:
+        module: Имя модуля-загрузчика для отчёта
+        comic: Имя комикса для отчёта
+        output: Файл, куда при выходе будут сохранены замеры этапов
+        pstats_output: Файл, куда при выходе будет сохранена статистика cProfile
+    """
+    if TIMER.enabled:
+        return
+    TIMER.enabled = True
+    TIMER.module = module
+    TIMER.comic = comic
+    if output:
+        atexit.register(TIMER.dump, output)
+    if pstats_output:
+        profiler = cProfile.Profile()
+        profiler.enable()
+        def _dump_pstats():
+            profiler.disable()
+            profiler.dump_stats(pstats_output)
+        atexit.register(_dump_pstats)
+
+def load_records(paths: Iterable[str|os.PathLike]) -> list[ProfileRecordDict]:
+    """Загрузка сохранённых замеров, отсутствующие и битые файлы пропускаются"""
+    records: list[ProfileRecordDict] = []
+    for path in paths:
+        try:
+            with open(path, encoding="utf-8") as file:
+                records.append(json.load(file))
+        except (OSError, ValueError):
+            continue
+    return records
+
+def merge_pstats(paths: Iterable[str|os.PathLike], output: str|os.PathLike) -> bool:
+    """Объединение файлов cProfile в один
+
+    Returns:
+        bool: Было ли что объединять
+    """
+    existing = [path for path in paths if os.path.exists(path)]
+    if not existing:
+        return False
+    stats = pstats.Stats(*map(str, existing))
+    stats.dump_stats(output)
+    return True
+
+def format_table(records: Iterable[ProfileRecordDict]) -> str:
+    """Сводная таблица времени этапов: по комиксам и итого по модулям, в секундах"""
+    records = list(records)
+    phase_names = list(PHASES)
+    for record in records:
+        for name in record['phases']:
+            if name not in phase_names:
+                phase_names.append(name)
+
+    header = ["Модуль", "Комикс", *(PHASES.get(name, name) for name in phase_names), "Всего"]
+    rows: list[list[str]] = []
+
+    def _row(module: str, comic: str, phases: dict[str, list[float]]) -> list[str]:
+        totals = [phases.get(name, [0, 0.])[1] for name in phase_names]
+        return [module, comic, *(f"{total:.3f}" for total in totals), f"{sum(totals):.3f}"]
+
+    module_totals: dict[str, PhaseTimer] = {}
+    for record in sorted(records, key=lambda record: (record['module'], record['comic'])):
+        rows.append(_row(record['module'], record['comic'], record['phases']))
+        module_timer = module_totals.setdefault(record['module'], PhaseTimer(record['module']))
+        for name, (count, total) in record['phases'].items():
+            module_timer.add(name, total, int(count))
+    for module, module_timer in module_totals.items():
+        rows.append(_row(module, "Итого", module_timer.phases))
+
+    return tools.format_table(header, rows)
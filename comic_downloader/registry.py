@@ -0,0 +1,208 @@
+"""
+Реестр загрузчиков
+
+Сопоставляет комиксу из rss.db класс загрузчика без запуска отдельного скрипта:
+по идентификатору источника или имени файла модуля в exec_module_path, затем по хосту ссылки.
+Модуль загрузчика импортируется при первом обращении и кэшируется на процесс,
+поэтому создание загрузчика в уже работающем процессе почти ничего не стоит.
+Собственные загрузчики подключаются через register или, как раньше, путём к файлу.
+"""
+
+from __future__ import annotations
+import asyncio
+import contextlib
+from dataclasses import dataclass
+import functools
+import importlib
+import importlib.util
+import os
+import sys
+from types import ModuleType
+from typing import TYPE_CHECKING, Any, Iterator
+import urllib.parse
+
+if TYPE_CHECKING:
+    from base_downloader import BaseDownloader
+    import rss
+
+MODULES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "modules")
+
+def _add_path(folder: str):
+    """Папка, из которой загрузчики импортируются по имени, как при запуске отдельным скриптом
+
+    Загрузчики остаются скриптами, которые запускаются и без пакета comic_downloader,
+    поэтому импортируют base_downloader и соседние модули по имени, а не относительно
+    """
+    if folder not in sys.path:
+        sys.path.append(folder)
+
+@dataclass(frozen=True)
+class Source:
+    """Источник комиксов"""
+    # Идентификатор, который можно указать в exec_module_path
+    id: str
+    # Имя модуля загрузчика в папке modules или в sys.path
+    module: str
+    # Хосты ссылок на комиксы, поддомены тоже подходят
+    hosts: tuple[str, ...] = ()
+
+SOURCES: dict[str, Source] = {}
+
+def register(source_id: str, module: str, hosts: tuple[str, ...] = ()):
+    """Добавление источника в реестр"""
+    SOURCES[source_id] = Source(source_id, module, hosts)
+
+register("acomics", "acomicsdownload", ("acomics.ru",))
+register("sequentialart", "SAdownload", ("collectedcurios.com",))
+register("mangalib", "mangalib", ("mangalib.me", "mangalib.org"))
+register("hentailib", "hentailib", ("hentailib.me", "hentailib.org", "slashlib.me"))
+
+_MODULES: dict[str, ModuleType] = {}
+
+def load_module(path: str) -> ModuleType:
+    """Загрузка модуля загрузчика по пути к его файлу, один раз на процесс"""
+    path = os.path.abspath(path)
+    if path not in _MODULES:
+        # Загрузчики импортируют соседние модули, например base_downloader
+        _add_path(os.path.dirname(path))
+        name = os.path.splitext(os.path.basename(path))[0]
+        if name in sys.modules:
+            _MODULES[path] = sys.modules[name]
+        else:
+            spec = importlib.util.spec_from_file_location(name, path)
+            if spec is None or spec.loader is None:
+                raise ImportError(path)
+            module = importlib.util.module_from_spec(spec)
+            sys.modules[name] = module
+            try:
+                spec.loader.exec_module(module)
+            except BaseException:
+                del sys.modules[name]
+                raise
+            _MODULES[path] = module
+    return _MODULES[path]
+
+@functools.cache
+def get_module(source_id: str) -> ModuleType:
+    """Модуль загрузчика источника, импортируется при первом обращении"""
+    _add_path(MODULES_DIR)
+    return importlib.import_module(SOURCES[source_id].module)
+
+def find_source(exec_module_path: str|None, url: str|None = None) -> Source|None:
+    """Источник комикса по exec_module_path или хосту ссылки, None — если не найден"""
+    if exec_module_path:
+        if exec_module_path in SOURCES:
+            return SOURCES[exec_module_path]
+        name = os.path.splitext(os.path.basename(exec_module_path))[0]
+        for source in SOURCES.values():
+            if source.module == name:
+                return source
+    if url:
+        host = urllib.parse.urlsplit(url if "//" in url else f"//{url}").hostname or ""
+        for source in SOURCES.values():
+            if any(host == known or host.endswith(f".{known}") for known in source.hosts):
+                return source
+    return None
+
+def script_path(exec_module_path: str, url: str|None = None) -> str:
+    """Файл загрузчика для запуска отдельным процессом
+
+    Существующий файл запускается как есть, идентификатор источника заменяется
+    файлом его модуля в папке modules. Иначе возвращается exec_module_path,
+    и ошибку сообщит сам запуск.
+    """
+    if exec_module_path and os.path.isfile(exec_module_path):
+        return exec_module_path
+    source = find_source(exec_module_path, url)
+    if source is not None:
+        path = os.path.join(MODULES_DIR, f"{source.module}.py")
+        if os.path.isfile(path):
+            return path
+    return exec_module_path
+
+def resolve(exec_module_path: str|None, url: str|None = None) -> type[BaseDownloader]:
+    """Класс загрузчика комикса
+
+    Сначала ищется зарегистрированный источник, иначе exec_module_path считается путём
+    к файлу собственного загрузчика
+    """
+    source = find_source(exec_module_path, url)
+    if source is not None:
+        return get_module(source.id).Downloader
+    if exec_module_path and os.path.isfile(exec_module_path):
+        return load_module(exec_module_path).Downloader
+    raise LookupError(f"Загрузчик не найден: {exec_module_path or url}")
+
+def create(rss_item: rss.RSSRow, create_folder: bool = True, **kwargs: Any) -> BaseDownloader:
+    """Загрузчик комикса из rss.db с явными параметрами, без разбора командной строки
+
+    Args:
+        rss_item: Комикс
+        create_folder: Создавать ли папку комикса, для одной проверки она не нужна
+        **kwargs: Дополнительные параметры загрузчика, например use_async
+    """
+    kwargs.setdefault("use_async", True)
+    downloader_class = resolve(rss_item.exec_module_path, rss_item.url)
+    return downloader_class(
+        comic_name = rss_item.url,
+        first = rss_item.last_num,
+        folder = rss_item.get_dir(create_folder),
+        is_write_description = rss_item.desc,
+        is_write_img_description = rss_item.imgtitle,
+        **kwargs
+    )
+
+def configure(netcache: str|None = None, hostlimits: str|None = None):
+    """Общие для загрузчиков процесса настройки, которые иначе передаются им командной строкой
+
+    Args:
+        netcache: Файл общего сетевого кэша
+        hostlimits: Файл подобранных чисел одновременных запросов
+    """
+    _add_path(MODULES_DIR)
+    import base_downloader
+
+    if netcache:
+        base_downloader.SESSIONS.use_netcache(netcache)
+    if hostlimits:
+        base_downloader.HOSTS.use_store(hostlimits)
+
+async def close():
+    """Закрытие общих клиентов загрузчиков в цикле событий, в котором они работали"""
+    if "base_downloader" in sys.modules:
+        await sys.modules["base_downloader"].SESSIONS.close()
+        sys.modules["base_downloader"].PARSERS.shutdown()
+
+def save_stats():
+    """Перенос сетевых счётчиков загрузчиков в общий кэш, не закрывая клиентов"""
+    if "base_downloader" in sys.modules:
+        sys.modules["base_downloader"].SESSIONS.save_stats()
+
+@contextlib.contextmanager
+def session_loop() -> Iterator[asyncio.Runner]:
+    """Цикл событий на весь сеанс, например на время работы демона
+
+    Общие клиенты загрузчиков, их соединения и кэш DNS живут от входа до выхода,
+    а не закрываются после каждого runner.run.
+    """
+    _add_path(MODULES_DIR)
+    import base_downloader
+
+    with asyncio.Runner() as runner:
+        users = base_downloader.SESSIONS.using()
+        runner.run(users.__aenter__())
+        try:
+            yield runner
+        finally:
+            runner.run(users.__aexit__(None, None, None))
+            base_downloader.PARSERS.shutdown()
+
+def to_number(value: Any) -> int|float:
+    """Номер страницы, который вернул загрузчик, в виде, в котором он хранится в БД
+
+    Номера частей вида 58.1.1 сокращаются до двух чисел, как при обычном скачивании
+    """
+    number = float(".".join(str(value).split(".")[:2]))
+    if number.is_integer():
+        return int(number)
+    return number
@@ -1,13 +1,57 @@
 from collections import UserDict
-from datetime import datetime
+from dataclasses import dataclass
+from datetime import datetime, timedelta
 import os
 import sqlite3
 from contextlib import closing as dbclosing
+import statistics
+import threading
 from typing import Any, Iterable, Self, overload
 import tools
 
 DB_NAME = "rss.db"
 
+# Границы интервала между проверками комикса
+MIN_CHECK_INTERVAL = timedelta(hours=1)
+MAX_CHECK_INTERVAL = timedelta(days=14)
+# Сколько последних обновлений учитывается при оценке частоты
+HISTORY_SIZE = 10
+# Срок аренды комикса узлом без продления
+LEASE_TTL = timedelta(minutes=10)
+# Базы, уже приведённые к текущей схеме в этом процессе
+_MIGRATED: set[str] = set()
+
+class LeaseLostError(RuntimeError):
+    """Аренда комикса истекла или передана другому узлу, результат не записан"""
+
+@dataclass
+class Lease:
+    """Аренда комикса узлом распределённого скачивания"""
+    rss_id: int
+    # Идентификатор узла
+    owner: str
+    # Номер выдачи, растёт при каждой новой аренде комикса
+    token: int
+
+def check_interval(updates: list[datetime], now: datetime) -> timedelta:
+    """Интервал до следующей проверки по истории обновлений комикса
+
+    Комикс проверяется примерно дважды за свой обычный промежуток между обновлениями,
+    а давно не обновлявшийся — всё реже, пропорционально времени простоя.
+
+    Args:
+        updates: Времена обновлений по возрастанию
+        now: Текущее время
+    """
+    if not updates:
+        return MIN_CHECK_INTERVAL
+    idle = now - updates[-1]
+    gaps = [later - earlier for earlier, later in zip(updates, updates[1:])]
+    interval = idle / 4
+    if gaps:
+        interval = max(statistics.median(gaps) / 2, interval)
+    return min(max(interval, MIN_CHECK_INTERVAL), MAX_CHECK_INTERVAL)
+
 class RSSRow(UserDict):
     _KEYS = (
         'id',
@@ -21,6 +65,7 @@ class RSSRow(UserDict):
         'imgtitle',
         'last_chk',
         'last_upd',
+        'next_chk',
     )
 
     """Строка данных из БД"""
@@ -50,9 +95,15 @@ class RSSRow(UserDict):
 
     @property
     def dir(self) -> str:
-        """Путь для скачивания"""
+        """Путь для скачивания, папка создаётся при отсутствии"""
         return self.make_safe_path(self.data['dir'])
 
+    def get_dir(self, create_path: bool=True) -> str:
+        """Путь для скачивания, без create_path папка не создаётся"""
+        if create_path:
+            return self.dir
+        return self.make_safe_path(self.data['dir'], create_path=False)
+
     @property
     def last_num(self) -> int|float:
         """Номер выпуска, с которого необходимо производить обновление"""
@@ -70,6 +121,11 @@ class RSSRow(UserDict):
         """Время последнего успешного обновления"""
         return self._norm_datetime(self.data['last_upd'])
 
+    @property
+    def next_chk(self) -> datetime:
+        """Время, начиная с которого комикс нужно проверить"""
+        return self._norm_datetime(self.data.get('next_chk'))
+
     @property
     def desc(self) -> bool:
         """Скачивать ли описания"""
@@ -178,6 +234,14 @@ class RSSDB:
     """Класс работы с БД"""
     def __init__(self, db_name: str):
         self.db_name = db_name
+        # Аренды этого узла: запись результатов по ним проверяется, см. lease_due
+        self.leases: dict[int, Lease] = {}
+        # Комиксы, аренду которых узел потерял: их результат не записывается
+        self.lost: set[int] = set()
+        # Узел распределённого скачивания; если он задан, записываются только арендованные комиксы
+        self.owner: str|None = None
+        # Аренды меняются и фоновым продлением, см. LeaseKeeper
+        self._leases_lock = threading.Lock()
 
     def create_db(self):
         """Создание таблицы БД
@@ -205,17 +269,103 @@ class RSSDB:
                     imgtitle         BOOLEAN  DEFAULT (0)
                                               NOT NULL,
                     last_chk         DATETIME,
-                    last_upd         DATETIME
+                    last_upd         DATETIME,
+                    next_chk         DATETIME
                     );
                     """
                 )
+        self._migrate(force=True)
         print(f"БД {self.db_name} успешно создана")
 
+    def _migrate(self, force: bool = False):
+        """Добавление в БД прежних версий таблиц и полей расписания проверок
+
+        Выполняется один раз за процесс для каждой БД, чтобы чтение не открывало
+        транзакцию записи. Правки, внесённые в БД вручную во время работы,
+        приводятся к схеме при следующем обслуживании, см. service_db.
+
+        Args:
+            force: Выполнить, даже если БД в этом процессе уже обновлялась
+        """
+        key = os.path.abspath(self.db_name)
+        if key in _MIGRATED and not force:
+            return
+        with dbclosing(sqlite3.connect(self.db_name)) as connection:
+            with connection as cursor:
+                columns = [row[1] for row in cursor.execute("pragma table_info(rss_list)")]
+                if "next_chk" not in columns:
+                    cursor.execute("alter table rss_list add column next_chk DATETIME")
+                # Отбор по расписанию сравнивает ended с 0, а прежние версии и ручная правка
+                # могли записать его текстом 'True'/'False', см. RSSRow._norm_boolean
+                cursor.execute(
+                    """update rss_list
+                    set ended=(typeof(ended)='text' and lower(ended)='true')
+                    where typeof(ended)!='integer'"""
+                )
+                cursor.execute(
+                    """CREATE INDEX IF NOT EXISTS rss_list_next_chk
+                    ON rss_list (ended, next_chk)"""
+                )
+                cursor.execute(
+                    """CREATE TABLE IF NOT EXISTS rss_history (
+                    rss_id  INTEGER  NOT NULL
+                                     REFERENCES rss_list (id) ON DELETE CASCADE,
+                    upd     DATETIME NOT NULL
+                    )"""
+                )
+                cursor.execute(
+                    """CREATE INDEX IF NOT EXISTS rss_history_rss_id
+                    ON rss_history (rss_id, upd)"""
+                )
+                cursor.execute(
+                    """CREATE TABLE IF NOT EXISTS rss_available (
+                    rss_id    INTEGER  PRIMARY KEY
+                                       REFERENCES rss_list (id) ON DELETE CASCADE,
+                    last_num  NUMERIC  NOT NULL,
+                    available NUMERIC,
+                    error     TEXT,
+                    checked   DATETIME NOT NULL
+                    )"""
+                )
+                cursor.execute(
+                    """CREATE TABLE IF NOT EXISTS rss_leases (
+                    rss_id  INTEGER  PRIMARY KEY
+                                     REFERENCES rss_list (id) ON DELETE CASCADE,
+                    owner   TEXT     NOT NULL,
+                    token   INTEGER  NOT NULL,
+                    expires DATETIME NOT NULL
+                    )"""
+                )
+                cursor.execute(
+                    """CREATE TABLE IF NOT EXISTS rss_repair (
+                    rss_id  INTEGER  NOT NULL
+                                     REFERENCES rss_list (id) ON DELETE CASCADE,
+                    item    TEXT     NOT NULL,
+                    reason  TEXT     NOT NULL,
+                    path    TEXT     NOT NULL
+                                     DEFAULT (''),
+                    found   DATETIME NOT NULL
+                    )"""
+                )
+                cursor.execute(
+                    """CREATE INDEX IF NOT EXISTS rss_repair_rss_id
+                    ON rss_repair (rss_id, item)"""
+                )
+                # Прежние обновления известны только последним временем
+                cursor.execute(
+                    """insert into rss_history (rss_id, upd)
+                    select id, last_upd from rss_list
+                    where last_upd is not null
+                    and id not in (select rss_id from rss_history)"""
+                )
+        _MIGRATED.add(key)
+
     def service_db(self):
         """Обслуживание БД"""
         if not os.path.exists(self.db_name):
             self.create_db()
         else:
+            self._migrate(force=True)
             with dbclosing(sqlite3.connect(self.db_name)) as connection:
                 with connection as cursor:
                     cursor.execute('vacuum')
@@ -239,10 +389,233 @@ class RSSDB:
             raise exc
         return RSSData(res)
 
+    def get_due(self) -> RSSData:
+        """Получить из БД незавершённые комиксы, которые пора проверить"""
+        if not os.path.exists(self.db_name):
+            self.create_db()
+        self._migrate()
+        with dbclosing(sqlite3.connect(self.db_name)) as connection:
+            connection.row_factory = sqlite3.Row
+            with connection as cursor:
+                res = cursor.execute(
+                    """select * from rss_list
+                    where ended=0 and (next_chk is null or next_chk<=datetime('now'))
+                    and id not in (
+                        select rss_id from rss_leases where expires>datetime('now')
+                    )
+                    order by id"""
+                ).fetchall()
+        return RSSData(res)
+
+    def lease_due(self, owner: str, limit: int, ttl: timedelta = LEASE_TTL) -> RSSData:
+        """Взять в аренду незавершённые комиксы, которые пора проверить
+
+        Комикс, арендованный другим узлом, не выдаётся, пока аренда не истечёт,
+        поэтому комиксы упавшего узла подхватываются остальными через ttl.
+        Пока аренда действует, set_last_num и set_last_chk записывают результат,
+        только если она не перешла к другому узлу, иначе выбрасывается LeaseLostError.
+
+        Args:
+            owner: Идентификатор узла
+            limit: Сколько комиксов взять
+            ttl: Срок аренды без продления, см. renew_leases
+        """
+        if not os.path.exists(self.db_name):
+            self.create_db()
+        self._migrate()
+        self.owner = owner
+        with dbclosing(sqlite3.connect(self.db_name, timeout=30, isolation_level=None)) as connection:
+            connection.row_factory = sqlite3.Row
+            # Выдача идёт под блокировкой записи, поэтому узлы не получат один комикс
+            connection.execute("begin immediate")
+            try:
+                res = connection.execute(
+                    """select rss_list.* from rss_list
+                    left join rss_leases on rss_leases.rss_id=rss_list.id
+                    where rss_list.ended=0
+                    and (rss_list.next_chk is null or rss_list.next_chk<=datetime('now'))
+                    and (rss_leases.rss_id is null or rss_leases.expires<=datetime('now'))
+                    order by rss_list.next_chk, rss_list.id
+                    limit ?""",
+                    (limit,)
+                ).fetchall()
+                for row in res:
+                    token = connection.execute(
+                        """insert into rss_leases (rss_id, owner, token, expires)
+                        values (?, ?, 1, datetime('now', ?))
+                        on conflict(rss_id) do update
+                        set owner=excluded.owner, token=token+1, expires=excluded.expires
+                        returning token""",
+                        (row["id"], owner, f"+{ttl.total_seconds():.0f} seconds")
+                    ).fetchone()[0]
+                    with self._leases_lock:
+                        self.leases[row["id"]] = Lease(row["id"], owner, token)
+                        self.lost.discard(row["id"])
+                connection.execute("commit")
+            except BaseException:
+                connection.execute("rollback")
+                raise
+        return RSSData(res)
+
+    def renew_leases(self, ttl: timedelta = LEASE_TTL) -> list[int]:
+        """Продление аренд этого узла, возвращаются комиксы, аренда которых потеряна"""
+        lost: list[int] = []
+        with self._leases_lock:
+            leases = list(self.leases.values())
+        with dbclosing(sqlite3.connect(self.db_name, timeout=30)) as connection:
+            with connection as cursor:
+                for lease in leases:
+                    renewed = cursor.execute(
+                        """update rss_leases set expires=datetime('now', ?)
+                        where rss_id=? and owner=? and token=? and expires>datetime('now')""",
+                        (f"+{ttl.total_seconds():.0f} seconds", lease.rss_id, lease.owner, lease.token)
+                    ).rowcount
+                    if renewed:
+                        continue
+                    with self._leases_lock:
+                        # Аренду могли вернуть записью результата, пока шло продление
+                        if self.leases.get(lease.rss_id) is lease:
+                            del self.leases[lease.rss_id]
+                            self.lost.add(lease.rss_id)
+                            lost.append(lease.rss_id)
+        return lost
+
+    def release_leases(self):
+        """Возврат всех аренд этого узла"""
+        with self._leases_lock:
+            leases = list(self.leases.values())
+            self.leases.clear()
+        with dbclosing(sqlite3.connect(self.db_name, timeout=30)) as connection:
+            with connection as cursor:
+                cursor.executemany(
+                    "delete from rss_leases where rss_id=? and owner=? and token=?",
+                    [(lease.rss_id, lease.owner, lease.token) for lease in leases]
+                )
+
+    def _check_lease(self, cursor: sqlite3.Connection, rss_id: int):
+        """Проверка аренды комикса перед записью результата и её возврат
+
+        Узел распределённого скачивания не записывает комиксы, которые он не арендовал
+        или аренду которых потерял
+        """
+        with self._leases_lock:
+            lease = self.leases.pop(rss_id, None)
+            lost = rss_id in self.lost
+        if lost:
+            raise LeaseLostError(rss_id)
+        if lease is None:
+            if self.owner is not None:
+                raise LeaseLostError(rss_id)
+            return
+        held = cursor.execute(
+            """delete from rss_leases
+            where rss_id=? and owner=? and token=? and expires>datetime('now')""",
+            (lease.rss_id, lease.owner, lease.token)
+        ).rowcount
+        if not held:
+            with self._leases_lock:
+                self.lost.add(rss_id)
+            raise LeaseLostError(rss_id)
+
+    def seconds_to_next_check(self) -> float|None:
+        """Сколько секунд осталось до ближайшей проверки, None — если проверять нечего"""
+        with dbclosing(sqlite3.connect(self.db_name)) as connection:
+            row = connection.execute(
+                """select (julianday(min(coalesce(next_chk, datetime('now'))))
+                - julianday('now')) * 86400
+                from rss_list where ended=0"""
+            ).fetchone()
+        return None if row is None or row[0] is None else row[0]
+
+    def set_available(self, results: Iterable[dict[str, Any]]):
+        """Сохранить результаты проверки наличия новых страниц
+
+        Args:
+            results: Словари с ключами rss_id, last_num, available, error, см. check.CheckResultDict
+        """
+        self._migrate()
+        with dbclosing(sqlite3.connect(self.db_name)) as connection:
+            with connection as cursor:
+                cursor.executemany(
+                    """insert or replace into rss_available
+                    (rss_id, last_num, available, error, checked)
+                    values (:rss_id, :last_num, :available, :error, datetime('now'))""",
+                    results
+                )
+
+    def get_available(self) -> list[dict[str, Any]]:
+        """Получить последние результаты проверки комиксов, у которых есть новые страницы"""
+        self._migrate()
+        with dbclosing(sqlite3.connect(self.db_name)) as connection:
+            connection.row_factory = sqlite3.Row
+            res = connection.execute(
+                """select rss_available.*, rss_list.name from rss_available
+                join rss_list on rss_list.id=rss_available.rss_id
+                where rss_available.available-rss_list.last_num>0.001
+                order by rss_list.name"""
+            ).fetchall()
+        return [dict(row) for row in res]
+
+    def set_repair(self, rss_id: int, items: Iterable[dict[str, Any]]):
+        """Заменить очередь починки комикса
+
+        Args:
+            rss_id: Комикс
+            items: Словари с ключами item, reason, path, см. audit.RepairItemDict
+        """
+        self._migrate()
+        with dbclosing(sqlite3.connect(self.db_name, timeout=30)) as connection:
+            with connection as cursor:
+                cursor.execute("delete from rss_repair where rss_id=?", (rss_id,))
+                cursor.executemany(
+                    """insert into rss_repair (rss_id, item, reason, path, found)
+                    values (:rss_id, :item, :reason, :path, datetime('now'))""",
+                    [{**item, "rss_id": rss_id} for item in items]
+                )
+
+    def get_repair(self) -> list[dict[str, Any]]:
+        """Получить очередь починки всех комиксов"""
+        self._migrate()
+        with dbclosing(sqlite3.connect(self.db_name)) as connection:
+            connection.row_factory = sqlite3.Row
+            res = connection.execute(
+                """select rss_repair.*, rss_list.name from rss_repair
+                join rss_list on rss_list.id=rss_repair.rss_id
+                order by rss_list.name, rss_repair.rowid"""
+            ).fetchall()
+        return [dict(row) for row in res]
+
+    def remove_repair(self, rss_id: int, items: Iterable[str]):
+        """Убрать из очереди починки комикса починенные страницы или части"""
+        with dbclosing(sqlite3.connect(self.db_name, timeout=30)) as connection:
+            with connection as cursor:
+                cursor.executemany(
+                    "delete from rss_repair where rss_id=? and item=?",
+                    [(rss_id, item) for item in items]
+                )
+
+    def _schedule(self, cursor: sqlite3.Connection, rss_id: int):
+        """Назначение времени следующей проверки по истории обновлений"""
+        rows = cursor.execute(
+            """select upd from rss_history
+            where rss_id=?
+            order by upd desc
+            limit ?""",
+            (rss_id, HISTORY_SIZE)
+        ).fetchall()
+        updates = sorted(datetime.fromisoformat(row[0]) for row in rows)
+        now = datetime.fromisoformat(cursor.execute("select datetime('now')").fetchone()[0])
+        next_chk = now + check_interval(updates, now)
+        cursor.execute(
+            "update rss_list set next_chk=? where id=?",
+            (next_chk.isoformat(sep=" ", timespec="seconds"), rss_id)
+        )
+
     def set_last_num(self, rss_id: int, last_num: int|float):
         """Обновить номер первого непрочитанного"""
-        with dbclosing(sqlite3.connect(self.db_name)) as connection:
+        with dbclosing(sqlite3.connect(self.db_name, timeout=30)) as connection:
             with connection as cursor:
+                self._check_lease(cursor, rss_id)
                 cursor.execute(
                     """update rss_list
                     set last_num=?,
@@ -251,14 +624,56 @@ class RSSDB:
                     where id=?""",
                     (last_num, rss_id)
                 )
+                cursor.execute(
+                    "insert into rss_history (rss_id, upd) values (?, datetime('now'))",
+                    (rss_id,)
+                )
+                self._schedule(cursor, rss_id)
 
     def set_last_chk(self, rss_id: int):
         """Обновить время последней проверки"""
-        with dbclosing(sqlite3.connect(self.db_name)) as connection:
+        with dbclosing(sqlite3.connect(self.db_name, timeout=30)) as connection:
             with connection as cursor:
+                self._check_lease(cursor, rss_id)
                 cursor.execute(
                     """update rss_list
                     set last_chk=datetime('now')
                     where id=?""",
                     (rss_id,)
                 )
+                self._schedule(cursor, rss_id)
+
+class LeaseKeeper:
+    """Продление аренд узла в фоновом потоке, пока идёт скачивание
+
+    Использование:
+        with LeaseKeeper(db):
+            ...
+
+    Parameters
+    ----------
+    db: RSSDB
+        БД с арендами узла
+    ttl: timedelta
+        Срок аренды, продление идёт каждую треть срока
+    """
+    def __init__(self, db: RSSDB, ttl: timedelta = LEASE_TTL):
+        self.db = db
+        self.ttl = ttl
+        self._stop = threading.Event()
+        self._thread: threading.Thread|None = None
+
+    def _run(self):
+        while not self._stop.wait(self.ttl.total_seconds() / 3):
+            if lost := self.db.renew_leases(self.ttl):
+                print(f"Аренда потеряна: {lost}")
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
@@ -0,0 +1,123 @@
+"""
+Промежуточная папка скачивания на быстром локальном диске
+
+На сетевых дисках (SMB, NFS) каждое открытие и закрытие небольшого файла стоит дорого,
+а загрузчики пишут по файлу на страницу и её описание. С промежуточной папкой загрузчик
+пишет всё на локальный диск, а по окончании скачивания комикса переносит готовые файлы
+в папку комикса: папка, которой в папке комикса ещё нет (часть MangaLib, папка-диапазон),
+переносится целиком одним переименованием, остальные файлы — по одному.
+
+Перенос можно прервать в любой момент: файл удаляется из промежуточной папки только
+после того, как он полностью записан на место, а на другой диск файлы и папки пишутся
+под временным именем .part и переименовываются. Прерванный перенос повторяется
+при следующем запуске, а номер последней страницы записывается в БД только после переноса,
+поэтому он не обгоняет файлы в папке комикса.
+"""
+
+import hashlib
+import os
+import shutil
+from typing import Callable
+
+# Незаконченные файлы и папки, которые не переносятся
+_PART_SUFFIX = ".part"
+
+def stage_folder(root: str, target: str) -> str:
+    """Промежуточная папка комикса target внутри root
+
+    Имя постоянно для папки комикса, поэтому незаконченный перенос находится при следующем запуске
+    """
+    target = os.path.abspath(target)
+    key = hashlib.sha1(target.encode("utf-8", "surrogateescape")).hexdigest()[:16]
+    return os.path.join(root, f"{key}-{os.path.basename(target)}")
+
+def _same_device(src: str, dst: str) -> bool:
+    """Лежат ли папки на одном диске, тогда перенос — это переименование"""
+    return os.stat(src).st_dev == os.stat(dst).st_dev
+
+def _file_sizes(folder: str) -> list[tuple[str, int]]:
+    """Относительные пути и размеры файлов папки"""
+    return [
+        (os.path.relpath(os.path.join(path, name), folder), os.path.getsize(os.path.join(path, name)))
+        for path, _, names in os.walk(folder)
+        for name in names
+    ]
+
+def _move_file(src: str, dst: str, same_device: bool):
+    if same_device:
+        os.replace(src, dst)
+        return
+    tmp = f"{dst}{_PART_SUFFIX}"
+    shutil.copyfile(src, tmp)
+    os.replace(tmp, dst)
+    os.remove(src)
+
+def _move_tree(src: str, dst: str, same_device: bool):
+    """Перенос папки, которой ещё нет на месте, целиком"""
+    if same_device:
+        os.rename(src, dst)
+        return
+    tmp = f"{dst}{_PART_SUFFIX}"
+    # Остаток прерванного переноса
+    shutil.rmtree(tmp, ignore_errors=True)
+    shutil.copytree(src, tmp)
+    os.rename(tmp, dst)
+    shutil.rmtree(src)
+
+def _commit_folder(
+    src: str,
+    dst: str,
+    same_device: bool,
+    on_file: Callable[[str, int], None]|None
+) -> int:
+    moved = 0
+    with os.scandir(src) as entries:
+        for entry in entries:
+            if entry.name.endswith(_PART_SUFFIX):
+                continue
+            dst_path = os.path.join(dst, entry.name)
+            if entry.is_dir():
+                if os.path.isdir(dst_path):
+                    moved += _commit_folder(entry.path, dst_path, same_device, on_file)
+                    continue
+                files = _file_sizes(entry.path)
+                _move_tree(entry.path, dst_path, same_device)
+                if on_file is not None:
+                    for path, size in files:
+                        on_file(os.path.join(dst_path, path), size)
+                moved += len(files)
+            else:
+                size = entry.stat().st_size
+                _move_file(entry.path, dst_path, same_device)
+                if on_file is not None:
+                    on_file(dst_path, size)
+                moved += 1
+    return moved
+
+def commit(
+    folder: str,
+    target: str,
+    on_file: Callable[[str, int], None]|None = None
+) -> int:
+    """Перенос файлов промежуточной папки в папку комикса
+
+    Пустые папки после переноса удаляются, незаконченные файлы .part остаются.
+
+    Args:
+        folder: Промежуточная папка комикса
+        target: Папка комикса
+        on_file: Вызывается с путём и размером каждого перенесённого файла
+
+    Returns:
+        int: Число перенесённых файлов
+    """
+    if not os.path.isdir(folder):
+        return 0
+    os.makedirs(target, exist_ok=True)
+    moved = _commit_folder(folder, target, _same_device(folder, target), on_file)
+    for path, _, _ in os.walk(folder, topdown=False):
+        try:
+            os.rmdir(path)
+        except OSError:
+            pass
+    return moved
@@ -2,6 +2,7 @@
 Набор вспомогательных функций
 """
 
+import functools
 import os
 import re
 
@@ -15,9 +16,17 @@ def make_safe_path(path: str, create_path: bool=True) -> str:
     Returns:
         str: Строка безопасного пути
     """
-    safe_path = os.path.abspath(path)
-    drive, path_part = os.path.splitdrive(safe_path)
-    safe_path = os.path.join(
+    # Преобразование зависит только от абсолютного пути, поэтому кэшируется
+    safe_path = _make_safe_abspath(os.path.abspath(path))
+    if create_path:
+        os.makedirs(safe_path, exist_ok=True)
+    return safe_path
+
+@functools.lru_cache(maxsize=1024)
+def _make_safe_abspath(abspath: str) -> str:
+    """Безопасный путь из абсолютного, см. make_safe_path"""
+    drive, path_part = os.path.splitdrive(abspath)
+    return os.path.join(
         os.sep,
         f"{drive}{os.sep}",
         *map(
@@ -25,33 +34,41 @@ def make_safe_path(path: str, create_path: bool=True) -> str:
             os.path.normpath(path_part).split(os.sep)
         )
     )
-    if create_path:
-        os.makedirs(safe_path, exist_ok=True)
-    return safe_path
 
-# Таблицы преобразования для make_safe_filename
-_ILLEGAL_CHARS = set('/\\?%*:|"<>')
-_ILLEGAL_UNPRINTABLE = {chr(c) for c in [*range(31), 127]}
+# Таблица преобразования для make_safe_filename:
+# запрещённые символы заменяются полноширинными аналогами, непечатаемые удаляются.
+# Замена идёт регулярным выражением, а не str.translate: в именах с кириллицей и иероглифами
+# translate ищет в таблице каждый символ, а регулярное выражение — только найденные
+_SAFE_REPLACEMENTS = {
+    **{c: chr(ord(c)+65248) for c in '/\\?%*:|"<>'},
+    **{chr(c): '' for c in [*range(31), 127]},
+}
+_UNSAFE_CHARS = re.compile(f"[{re.escape(''.join(_SAFE_REPLACEMENTS))}]")
+_ONLY_DOTS = re.compile(r'\.+')
 _RESERVED_WORDS = {
     'CON', 'CONIN$', 'CONOUT$', 'PRN', 'AUX', 'CLOCK$', 'NUL',
     'COM0', 'COM1', 'COM2', 'COM3', 'COM4', 'COM5', 'COM6', 'COM7', 'COM8', 'COM9',
     'LPT0', 'LPT1', 'LPT2', 'LPT3', 'LPT4', 'LPT5', 'LPT6', 'LPT7', 'LPT8', 'LPT9',
     'LST', 'KEYBD$', 'SCREEN$', '$IDLE$', 'CONFIG$'
 }
+_RESERVED_MAX_LEN = max(map(len, _RESERVED_WORDS))
 
+@functools.lru_cache(maxsize=4096)
 def make_safe_filename(filename: str) -> str:
     """
     # Преобразование имени файла в безопасное
     # https://stackoverflow.com/questions/7406102/create-sane-safe-filename-from-any-unsafe-string
+    # Результаты кэшируются: одни и те же имена, например папки частей, повторяются постоянно
     """
     if not filename: return "file"
-    if os.path.splitext(filename)[0].upper() in _RESERVED_WORDS: return f"__{filename}"
-    if filename[0]==filename[-1]=='.' and set(filename)=={'.'}: return '\uff0e' * len(filename)
-    return "".join(
-        chr(ord(c)+65248) if c in _ILLEGAL_CHARS else c
-        for c in filename
-        if c not in _ILLEGAL_UNPRINTABLE
-    ).rstrip('. ') or "file"
+    # Зарезервированные имена не длиннее 7 символов: длинное имя без точки в начале проверять не нужно
+    if (len(filename) <= _RESERVED_MAX_LEN or '.' in filename[:_RESERVED_MAX_LEN+1]) \
+        and os.path.splitext(filename)[0].upper() in _RESERVED_WORDS: return f"__{filename}"
+    if _ONLY_DOTS.fullmatch(filename): return '\uff0e' * len(filename)
+    return _UNSAFE_CHARS.sub(_replace_unsafe, filename).rstrip('. ') or "file"
+
+def _replace_unsafe(match: re.Match[str]) -> str:
+    return _SAFE_REPLACEMENTS[match[0]]
 
 # Предварительно скомпилированные регулярные выражения
 _MULTISPACE_PATTERN = re.compile(r' {2,}')
@@ -66,9 +83,28 @@ def clear_text_multiplespaces(text: str) -> str:
     text = _MULTINEWLINE_PATTERN.sub('\n\n', text)
     return text.strip()
 
+# Файлы не больше этого размера считаются недокачанными
+CORRECT_FILE_SIZE = 1024
+
 def check_corrects_file(filepath: str|os.PathLike) -> bool:
     """Проверка файла на существование и корректность"""
     try:
-        return os.path.getsize(filepath) > 1024
+        return os.path.getsize(filepath) > CORRECT_FILE_SIZE
     except OSError:
         return False
+
+def format_table(header: list[str], rows: list[list[str]]) -> str:
+    """Текстовая таблица с выровненными по ширине столбцами
+
+    Args:
+        header: Заголовки столбцов
+        rows: Строки таблицы, по ячейке на столбец
+
+    Returns:
+        str: Таблица со строкой заголовков и разделителем под ней
+    """
+    widths = [max(len(row[i]) for row in [header, *rows]) for i in range(len(header))]
+    lines = [" | ".join(cell.ljust(width) for cell, width in zip(header, widths))]
+    lines.append("-+-".join("-" * width for width in widths))
+    lines.extend(" | ".join(cell.ljust(width) for cell, width in zip(row, widths)) for row in rows)
+    return "\n".join(lines)
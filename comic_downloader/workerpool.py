@@ -0,0 +1,247 @@
+"""
+Пул постоянных процессов-загрузчиков
+
+Процессы запускаются один раз на запуск или сеанс -daemon, импортируют модули загрузчиков
+при первом задании и дальше получают задания по своему каналу, возвращая словарь результата.
+Так сохраняется разделение загрузчиков по процессам, но без запуска интерпретатора
+на каждый комикс. Зависший или упавший загрузчик не мешает остальным: процесс
+с просроченным заданием завершается и заменяется новым.
+"""
+
+import asyncio
+from collections import deque
+import multiprocessing
+import multiprocessing.connection
+from multiprocessing.connection import Connection
+from multiprocessing.process import BaseProcess
+import signal
+import sys
+import threading
+import time
+from typing import Iterable, Iterator, NotRequired, TypedDict
+import registry
+
+class JobDict(TypedDict):
+    rss_id: int
+    exec_module_path: str
+    url: str
+    first: int|float
+    folder: str
+    desc: bool
+    imgtitle: bool
+    use_async: bool
+    # Промежуточная папка скачивания, см. staging
+    stage: NotRequired[str|None]
+
+class JobResultDict(TypedDict):
+    rss_id: int
+    # Номер следующей нескачанной страницы, None — при ошибке
+    last_num: int|float|None
+    error: str|None
+    # Длительность задания в секундах
+    elapsed: float
+
+def _result(job: JobDict, error: str|None = None, elapsed: float = 0.) -> JobResultDict:
+    return JobResultDict({
+        "rss_id": job["rss_id"],
+        "last_num": None,
+        "error": error,
+        "elapsed": elapsed,
+    })
+
+async def _download_async(downloader) -> object:
+    try:
+        return await downloader.async_downloadcomic()
+    finally:
+        # Общие клиенты закрываются в цикле событий задания
+        await registry.close()
+
+def run_job(job: JobDict) -> JobResultDict:
+    """Выполнение задания в текущем процессе"""
+    start = time.perf_counter()
+    result = _result(job)
+    try:
+        downloader = registry.resolve(job["exec_module_path"], job["url"])(
+            comic_name = job["url"],
+            first = job["first"],
+            folder = job["folder"],
+            is_write_description = job["desc"],
+            is_write_img_description = job["imgtitle"],
+            use_async = job["use_async"],
+            stage = job.get("stage")
+        )
+        if downloader.use_async:
+            value = asyncio.run(_download_async(downloader))
+        else:
+            value = downloader.downloadcomic()
+        result["last_num"] = registry.to_number(value)
+    except Exception as exc:
+        result["error"] = f"{type(exc).__name__}: {exc}"
+    result["elapsed"] = time.perf_counter() - start
+    return result
+
+def _save_hostlimits():
+    # Процессы пула не выполняют atexit, поэтому подобранные значения пишутся после задания
+    if "base_downloader" in sys.modules:
+        sys.modules["base_downloader"].HOSTS.save()
+
+def _worker(conn: Connection, netcache: str|None, hostlimits: str|None):
+    """Цикл процесса пула: задание из канала, результат в канал, None — завершение"""
+    # Прерыванием по Ctrl+C управляет основной процесс
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    registry.configure(netcache=netcache, hostlimits=hostlimits)
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:
+            break
+        if job is None:
+            break
+        result = run_job(job)
+        _save_hostlimits()
+        conn.send(result)
+    conn.close()
+
+class _Worker:
+    def __init__(self, process: BaseProcess, conn: Connection):
+        self.process = process
+        self.conn = conn
+
+class WorkerPool:
+    """Пул постоянных процессов-загрузчиков
+
+    Использование:
+        with WorkerPool(5) as pool:
+            for result in pool.map(jobs):
+                ...
+
+    Parameters
+    ----------
+    processes: int
+        Число процессов
+    timeout: float|None
+        Наибольшая длительность задания в секундах, после неё процесс заменяется
+    netcache: str|None
+        Файл общего сетевого кэша
+    hostlimits: str|None
+        Файл подобранных чисел одновременных запросов
+    """
+    def __init__(
+        self,
+        processes: int = 5,
+        timeout: float|None = None,
+        netcache: str|None = None,
+        hostlimits: str|None = None
+    ):
+        self.processes = max(processes, 1)
+        self.timeout = timeout
+        self.netcache = netcache
+        self.hostlimits = hostlimits
+        self._context = multiprocessing.get_context()
+        self._workers: list[_Worker] = []
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close(wait=exc_type is None)
+
+    def start(self):
+        """Запуск процессов, уже запущенные остаются"""
+        while len(self._workers) < self.processes:
+            self._workers.append(self._spawn())
+
+    def _spawn(self) -> _Worker:
+        conn, child_conn = self._context.Pipe()
+        process = self._context.Process(
+            target = _worker,
+            args = (child_conn, self.netcache, self.hostlimits),
+            daemon = True
+        )
+        process.start()
+        child_conn.close()
+        return _Worker(process, conn)
+
+    def _replace(self, worker: _Worker) -> _Worker:
+        """Замена зависшего или упавшего процесса новым"""
+        worker.process.kill()
+        worker.process.join()
+        worker.conn.close()
+        new_worker = self._spawn()
+        self._workers[self._workers.index(worker)] = new_worker
+        return new_worker
+
+    def _wait_timeout(self, started: Iterable[float]) -> float|None:
+        if self.timeout is None:
+            return None
+        return max(0., min(started) + self.timeout - time.monotonic())
+
+    def map(
+        self,
+        jobs: Iterable[JobDict],
+        stop: threading.Event|None = None
+    ) -> Iterator[JobResultDict]:
+        """Выполнение заданий, результаты выдаются по мере готовности
+
+        Args:
+            jobs: Задания
+            stop: Событие остановки, после него новые задания не раздаются,
+                а уже начатые дожидаются
+        """
+        self.start()
+        pending = deque(jobs)
+        idle = list(self._workers)
+        busy: dict[Connection, tuple[_Worker, JobDict, float]] = {}
+        while busy or (pending and not (stop is not None and stop.is_set())):
+            while pending and idle and not (stop is not None and stop.is_set()):
+                worker = idle.pop()
+                job = pending.popleft()
+                worker.conn.send(job)
+                busy[worker.conn] = (worker, job, time.monotonic())
+            ready = multiprocessing.connection.wait(
+                list(busy),
+                timeout = self._wait_timeout(started for _, _, started in busy.values())
+            )
+            for conn in ready:
+                worker, job, started = busy.pop(conn) # type: ignore[index]
+                try:
+                    result: JobResultDict = conn.recv() # type: ignore[union-attr]
+                except (EOFError, OSError):
+                    failed, worker = worker, self._replace(worker)
+                    result = _result(
+                        job,
+                        f"Процесс загрузчика завершился с кодом {failed.process.exitcode}",
+                        time.monotonic() - started
+                    )
+                idle.append(worker)
+                yield result
+            if self.timeout is not None:
+                now = time.monotonic()
+                for conn, (worker, job, started) in list(busy.items()):
+                    if now - started >= self.timeout:
+                        del busy[conn]
+                        idle.append(self._replace(worker))
+                        yield _result(job, f"Превышено время задания {self.timeout:g} с", now - started)
+
+    def close(self, wait: bool = True, timeout: float = 10):
+        """Завершение процессов
+
+        Args:
+            wait: Дать процессам закончить работу, иначе они завершаются сразу
+            timeout: Сколько ждать каждый процесс, прежде чем завершить его принудительно
+        """
+        for worker in self._workers:
+            if wait:
+                try:
+                    worker.conn.send(None)
+                except OSError:
+                    pass
+        for worker in self._workers:
+            if wait:
+                worker.process.join(timeout)
+            if worker.process.is_alive():
+                worker.process.terminate()
+                worker.process.join()
+            worker.conn.close()
+        self._workers = []
@@ -0,0 +1,63 @@
+"""
+Общая подготовка тестов
+
+Временная папка теста и локальные заменители источников из benchmarks/fake_sources.py,
+на которые перенаправляются загрузчики. Загрузчики импортируются через реестр,
+который добавляет в путь папку modules.
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+from typing import Any
+import unittest
+from unittest import mock
+from benchmarks.fake_sources import FakeSources, FakeSourcesConfig
+from comic_downloader import registry
+
+acomicsdownload = registry.get_module("acomics")
+SAdownload = registry.get_module("sequentialart")
+mangalib = registry.get_module("mangalib")
+import base_downloader
+
+class FolderTestCase(unittest.TestCase):
+    """Тест с временной папкой self.folder, удаляемой после теста"""
+
+    def setUp(self):
+        self.folder = self.enterContext(tempfile.TemporaryDirectory())
+
+    def write(self, path: str, content: bytes = b"\0" * 2000) -> str:
+        """Записывает файл, создавая папки; относительный путь считается от self.folder"""
+        path = os.path.join(self.folder, path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as file:
+            file.write(content)
+        return path
+
+    def use_sources(self, **config: Any) -> FakeSources:
+        """Запускает заменители источников до конца теста и направляет на них загрузчики
+
+        Командная строка процесса заменяется командной строкой оркестратора: в ней нет
+        ссылки на комикс, и загрузчик, который всё же станет её разбирать, завершит тест.
+
+        Args:
+            **config: Параметры FakeSourcesConfig
+        """
+        sources = self.enterContext(FakeSources(FakeSourcesConfig(**config)))
+        for patcher in (
+            mock.patch.object(acomicsdownload.Downloader, "_COMIC_DOMAIN", sources.site_url),
+            mock.patch.object(SAdownload.Downloader, "_COMIC_DOMAIN", sources.site_url),
+            mock.patch.object(mangalib.Downloader, "_API_DOMAIN", sources.site_url),
+            mock.patch.object(mangalib.Downloader, "_IMG_DOMAIN", (sources.cdn_url,)),
+            mock.patch.object(sys, "argv", ["comic_downloader", "-in-process"]),
+            mock.patch.dict(base_downloader._CLI_ARGS, clear=True)
+        ):
+            self.enterContext(patcher)
+        return sources
+
+def download(downloader: base_downloader.BaseDownloader) -> Any:
+    """Скачивает комикс в режиме загрузчика и возвращает номер новой страницы"""
+    if downloader.use_async:
+        return asyncio.run(downloader.async_downloadcomic())
+    return downloader.downloadcomic()
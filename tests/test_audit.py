@@ -0,0 +1,137 @@
+import asyncio
+from contextlib import closing as dbclosing
+import os
+import sqlite3
+import unittest
+from unittest import mock
+import zipfile
+from benchmarks import fake_sources
+from tests import support
+from tests.support import acomicsdownload, mangalib
+from comic_downloader import audit, rss
+
+def keep_path(cls, path: str, create_path: bool = True) -> str:
+    """Замена RSSRow.make_safe_path: пути во временной папке не преобразуются"""
+    if create_path:
+        os.makedirs(path, exist_ok=True)
+    return path
+
+class Test_test_audit(support.FolderTestCase):
+    def setUp(self):
+        super().setUp()
+        self.db = rss.RSSDB(os.path.join(self.folder, rss.DB_NAME))
+        self.db.create_db()
+        self.enterContext(mock.patch.object(rss.RSSRow, "make_safe_path", classmethod(keep_path)))
+
+    def add_comic(self, name: str, url: str, module: str, last_num: int|float) -> str:
+        folder = os.path.join(self.folder, name)
+        os.makedirs(folder)
+        with dbclosing(sqlite3.connect(self.db.db_name)) as connection, connection:
+            connection.execute(
+                """insert into rss_list (name, url, dir, exec_module_path, last_num)
+                values (?, ?, ?, ?, ?)""",
+                (name, url, folder, module, last_num)
+            )
+        return folder
+
+    def test_audit(self):
+        image = fake_sources.fake_image(5000)
+        pages = self.add_comic("pages", "~pages", acomicsdownload.__file__, 8)
+        # Страницы 1 и 2 не скачивались: комикс добавлен с третьей
+        for page in (3, 6, 7):
+            self.write(os.path.join(pages, f"{page} - Страница {page}.jpg"), image)
+        self.write(os.path.join(pages, "5 - Страница 5.jpg"), image[:3000])
+        self.write(os.path.join(pages, "5.txt"), b"")
+        chapters = self.add_comic("chapters", "~chapters", mangalib.__file__, 9)
+        self.write(os.path.join(chapters, "1 - Начало", "0001.jpg"), image)
+        self.write(os.path.join(chapters, "2 - Середина", "0001.jpg"), image)
+        self.write(os.path.join(chapters, "2 - Середина", "0002.jpg"), b"<html></html>")
+        os.makedirs(os.path.join(chapters, "2.5"))
+        with zipfile.ZipFile(os.path.join(chapters, "3 - Конец.cbz"), "w") as archive:
+            archive.writestr("0001.jpg", image)
+        with open(os.path.join(chapters, "3 - Конец.cbz"), "rb") as file:
+            archive_content = file.read()
+        self.write(os.path.join(chapters, "3 - Конец.cbz"), archive_content[:-30])
+        cache = os.path.join(self.folder, audit.CACHE_NAME)
+
+        results = audit.audit_all(self.db.get_db(), workers=2, cache=cache)
+        # В таблице по строке на комикс
+        self.assertEqual(
+            [line.split(" | ")[0].strip() for line in audit.format_table(results).splitlines()[2:]],
+            ["chapters", "pages"]
+        )
+        by_name = {result["name"]: result for result in results}
+        self.assertIsNone(by_name["pages"]["error"])
+        self.assertEqual(
+            [(item["item"], item["reason"]) for item in by_name["pages"]["items"]],
+            [("4", "missing"), ("5", "broken")]
+        )
+        self.assertEqual(by_name["pages"]["checked"], 4)
+        self.assertIsNone(by_name["chapters"]["error"])
+        self.assertEqual(
+            sorted((item["item"], item["reason"], os.path.basename(item["path"])) for item in by_name["chapters"]["items"]),
+            [("2", "broken", "0002.jpg"), ("2.5", "broken", ""), ("3", "broken", "3 - Конец.cbz")]
+        )
+
+        # Повторная проверка читает только изменившиеся файлы
+        self.write(os.path.join(pages, "5 - Страница 5.jpg"), image)
+        results = audit.audit_all(self.db.get_db(), workers=0, cache=cache)
+        by_name = {result["name"]: result for result in results}
+        self.assertEqual(by_name["pages"]["checked"], 1)
+        self.assertEqual(by_name["chapters"]["checked"], 0)
+        self.assertEqual([item["item"] for item in by_name["pages"]["items"]], ["4"])
+
+        audit.save_queue(self.db, results)
+        self.assertEqual(
+            sorted((row["name"], row["item"]) for row in self.db.get_repair()),
+            [("chapters", "2"), ("chapters", "2.5"), ("chapters", "3"), ("pages", "4")]
+        )
+
+    def test_missing_folder(self):
+        folder = self.add_comic("missing", "~missing", acomicsdownload.__file__, 3)
+        os.rmdir(folder)
+        results = audit.audit_all(self.db.get_db(), workers=0)
+        self.assertTrue(results[0]["error"].startswith("FileNotFoundError"))
+        # Проверка не создаёт папку заново
+        self.assertFalse(os.path.exists(folder))
+
+    def test_ranges(self):
+        self.assertEqual(
+            list(audit._ranges(["5", "1", "2", "3", "2"], chapters=False)),
+            [("1", "4", ["1", "2", "3"]), ("5", "6", ["5"])]
+        )
+        self.assertEqual(
+            list(audit._ranges(["2", "1.5", "1.5", "3.0"], chapters=True)),
+            [("1.5", "1.5.1", ["1.5"]), ("2", "2.1", ["2"]), ("3.0", "3.1", ["3.0"])]
+        )
+        # Границы частей совпадают с mangalib.ChapterNumber
+        self.assertEqual(mangalib.ChapterNumber("1.5") + [0, 0, 1], mangalib.ChapterNumber("1.5.1"))
+
+    def test_repair(self):
+        sources = self.use_sources(pages=6, image_size=5000)
+        for use_async in (False, True):
+            with self.subTest(use_async=use_async):
+                folder = self.add_comic(f"async={use_async}", "~comic", acomicsdownload.__file__, 6)
+                image = fake_sources.fake_image(5000)
+                for page in (1, 2, 5):
+                    self.write(os.path.join(folder, f"{page} - Страница {page}.jpg"), image)
+                self.write(os.path.join(folder, "4 - Страница 4.jpg"), image[:4000])
+                results = audit.audit_all(self.db.get_db(), workers=0)
+                audit.save_queue(self.db, results)
+                self.assertEqual(len(self.db.get_repair()), 2)
+
+                before = sources.requests["acomics_image"]
+                results = asyncio.run(audit.repair_all(self.db, use_async=use_async))
+                self.assertEqual([(result["repaired"], result["left"]) for result in results], [(2, 0)])
+                # Скачаны только недостающая и битая страницы
+                self.assertEqual(sources.requests["acomics_image"] - before, 2)
+                self.assertEqual(os.path.getsize(os.path.join(folder, "3 - Страница 3.jpg")), 5000)
+                self.assertEqual(os.path.getsize(os.path.join(folder, "4 - Страница 4.jpg")), 5000)
+                self.assertEqual(self.db.get_repair(), [])
+                # Номер первой непрочитанной страницы не меняется
+                self.assertEqual([rss_item.last_num for rss_item in self.db.get_db()], [6])
+                with dbclosing(sqlite3.connect(self.db.db_name)) as connection, connection:
+                    connection.execute("delete from rss_list")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,42 @@
+import tempfile
+import unittest
+from benchmarks import fake_sources, filenames, run
+from tests.support import base_downloader
+
+class Test_test_benchmark(unittest.TestCase):
+    def test_fake_image(self):
+        image = fake_sources.fake_image(5000, seed=3)
+        self.assertEqual(len(image), 5000)
+        self.assertTrue(image.startswith(b'\xff\xd8\xff'))
+        self.assertTrue(image.endswith(b'\xff\xd9'))
+
+    def test_filenames(self):
+        self.assertEqual(filenames.compare(filenames.sample_names(3000, seed=1)), [])
+        results = filenames.run(500, repeat=2)
+        self.assertLess(results["filename_cached"], results["filename_reference"])
+
+    def test_run_all(self):
+        config = fake_sources.FakeSourcesConfig(pages=12, chapters=2, pages_per_chapter=5, image_size=4096)
+        results = run.run_all(config)
+        self.assertEqual(len(results), len(run.SOURCES) * len(run.MODES))
+        for result in results:
+            with self.subTest(source=result["source"], mode=result["mode"]):
+                if result["source"] == "mangalib":
+                    self.assertEqual(result["pages"], 10)
+                    self.assertEqual(result["result"], "2.1")
+                else:
+                    self.assertEqual(result["pages"], 12)
+                    self.assertEqual(result["result"], "13")
+                self.assertGreater(result["requests"], 0)
+
+    def test_sessions_closed(self):
+        config = fake_sources.FakeSourcesConfig(pages=3, chapters=1, pages_per_chapter=2, image_size=4096)
+        with fake_sources.FakeSources(config) as sources:
+            for source in run.SOURCES:
+                with self.subTest(source=source), tempfile.TemporaryDirectory() as folder:
+                    run.run_case(source, "async", sources.site_url, sources.cdn_url, folder)
+                    # Общие клиенты закрывает само асинхронное скачивание
+                    self.assertIsNone(base_downloader.SESSIONS._session)
+
+if __name__ == '__main__':
+    unittest.main()
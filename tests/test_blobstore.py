@@ -0,0 +1,64 @@
+import os
+import unittest
+from tests import support
+from tests.support import SAdownload
+from comic_downloader import blobstore
+
+class Test_test_blobstore(support.FolderTestCase):
+    def test_adopt(self):
+        store = blobstore.BlobStore(os.path.join(self.folder, blobstore.STORE_DIR))
+        first = self.write("a/1.jpg", b"1" * 2000)
+        second = self.write("b/1.jpg", b"1" * 2000)
+        other = self.write("b/2.jpg", b"2" * 2000)
+        for path in (first, second, other):
+            self.assertTrue(store.adopt(path))
+        self.assertTrue(os.path.samefile(first, second))
+        self.assertFalse(os.path.samefile(first, other))
+        self.assertEqual(os.stat(first).st_nlink, 3)
+        self.assertTrue(store.adopt(first))
+
+        os.remove(other)
+        self.assertEqual(store.gc(), 1)
+        self.assertEqual(store.gc(), 0)
+
+    def test_migrate(self):
+        for comic in ("a", "b", "c"):
+            for page in range(1, 6):
+                self.write(f"{comic}/{page}.jpg", bytes([page]) * 3000)
+        self.write("a/1.txt", b"short")
+        result = blobstore.migrate(self.folder, workers=4)
+        self.assertEqual(result.files, 15)
+        self.assertEqual(result.failed, 0)
+        self.assertLessEqual(result.deduplicated, 10)
+        self.assertTrue(all(
+            os.path.samefile(os.path.join(self.folder, "a", f"{page}.jpg"), os.path.join(self.folder, comic, f"{page}.jpg"))
+            for page in range(1, 6) for comic in ("b", "c")
+        ))
+        self.assertEqual(os.stat(os.path.join(self.folder, "a", "1.txt")).st_nlink, 1)
+        # Повторный перенос связанные файлы пропускает
+        self.assertEqual(blobstore.migrate(self.folder).files, 0)
+        self.assertIsNotNone(blobstore.find_store(os.path.join(self.folder, "a")))
+
+    def test_download(self):
+        os.makedirs(os.path.join(self.folder, blobstore.STORE_DIR))
+        self.use_sources(pages=4, image_size=5000)
+        # Два зеркала одного комикса
+        for comic in ("first", "second"):
+            os.makedirs(os.path.join(self.folder, comic))
+            SAdownload.Downloader(
+                comic_name = "sa",
+                first = 1,
+                folder = os.path.join(self.folder, comic),
+                is_write_description = False,
+                is_write_img_description = False,
+                use_async = False
+            ).downloadcomic()
+        names = sorted(os.listdir(os.path.join(self.folder, "first")))
+        self.assertEqual(len(names), 4)
+        for name in names:
+            first = os.path.join(self.folder, "first", name)
+            self.assertTrue(os.path.samefile(first, os.path.join(self.folder, "second", name)))
+            self.assertEqual(os.stat(first).st_nlink, 3)
+
+if __name__ == '__main__':
+    unittest.main()
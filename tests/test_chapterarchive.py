@@ -0,0 +1,105 @@
+import asyncio
+import os
+import unittest
+import zipfile
+from tests import support
+from tests.support import mangalib
+from comic_downloader import chapterarchive, pagelayout
+
+class Test_test_chapterarchive(support.FolderTestCase):
+    def setUp(self):
+        super().setUp()
+        self.path = os.path.join(self.folder, "1 - Глава.cbz")
+
+    def test_reorder(self):
+        committed = []
+        archive = chapterarchive.ChapterArchive(
+            self.path, 4, window=2, on_commit=lambda path, size: committed.append(path)
+        )
+        archive.add(2, "0003.jpg", b"3")
+        archive.add(1, "0002.jpg", b"2")
+        self.assertFalse(os.path.exists(self.path))
+        archive.add(0, "0001.jpg", b"1")
+        archive.add(3, "0004.jpg", b"4")
+        self.assertTrue(archive.committed)
+        self.assertEqual(committed, [self.path])
+        self.assertFalse(os.path.exists(f"{self.path}.part"))
+        with zipfile.ZipFile(self.path) as archive_file:
+            self.assertEqual(archive_file.namelist(), ["0001.jpg", "0002.jpg", "0003.jpg", "0004.jpg"])
+            self.assertTrue(all(
+                info.compress_type == zipfile.ZIP_STORED for info in archive_file.infolist()
+            ))
+
+    def test_failed_page(self):
+        archive = chapterarchive.ChapterArchive(self.path, 3)
+        archive.add(0, "0001.jpg", b"1")
+        archive.add(1, "0002.jpg", None)
+        archive.add(2, "0003.jpg", b"3")
+        self.assertTrue(archive.done)
+        self.assertFalse(archive.committed)
+        self.assertEqual(os.listdir(self.folder), [])
+
+    def test_async_window(self):
+        archive = chapterarchive.ChapterArchive(self.path, 6, window=2)
+        started: list[int] = []
+
+        async def page(index: int):
+            await archive.async_wait_turn(index)
+            started.append(index)
+            # Первые страницы скачиваются дольше, следующие ждут очереди
+            await asyncio.sleep(0.01 * (6 - index))
+            self.assertLess(len(archive._buffer), 2)
+            await asyncio.to_thread(archive.add, index, f"{index:0>4}.jpg", b"x")
+
+        async def main():
+            await asyncio.gather(*(page(index) for index in reversed(range(6))))
+
+        asyncio.run(main())
+        self.assertEqual(sorted(started[:2]), [0, 1])
+        self.assertTrue(archive.committed)
+
+    def test_mangalib(self):
+        sources = self.use_sources(chapters=3, pages_per_chapter=5, image_size=5000)
+
+        def download(folder: str, use_async: bool) -> mangalib.ChapterNumber:
+            return support.download(mangalib.Downloader(
+                comic_name = "bench",
+                first = 1,
+                folder = folder,
+                is_write_description = False,
+                is_write_img_description = False,
+                use_async = use_async
+            ))
+
+        for use_async in (False, True):
+            with self.subTest(use_async=use_async):
+                folder = os.path.join(self.folder, f"async={use_async}")
+                os.makedirs(folder)
+                pagelayout.write_layout(folder, pagelayout.PageLayout(cbz=True))
+                before = sources.requests.copy()
+                self.assertEqual(str(download(folder, use_async)), "3.1")
+                self.assertEqual(
+                    sorted(os.listdir(folder)),
+                    [".layout"] + [f"{number} - Глава {number}.cbz" for number in range(1, 4)]
+                )
+                with zipfile.ZipFile(os.path.join(folder, "1 - Глава 1.cbz")) as archive_file:
+                    self.assertEqual(len(archive_file.namelist()), 5)
+                self.assertEqual(sources.requests["cdn_image"] - before["cdn_image"], 15)
+                # Готовые части определяются по архивам и не запрашиваются повторно
+                before = sources.requests.copy()
+                self.assertEqual(str(download(folder, use_async)), "3.1")
+                self.assertEqual(sources.requests["lib_chapter"], before["lib_chapter"])
+                self.assertEqual(sources.requests["cdn_image"], before["cdn_image"])
+
+    def test_migrate(self):
+        chapter = os.path.join(self.folder, "1 - Глава")
+        for page in range(1, 4):
+            self.write(os.path.join(chapter, f"{page:0>4}.jpg"))
+        self.assertEqual(pagelayout.migrate(self.folder, pagelayout.PageLayout(cbz=True)), 1)
+        self.assertEqual(sorted(os.listdir(self.folder)), [".layout", "1 - Глава.cbz"])
+        self.assertEqual(pagelayout.migrate(self.folder, pagelayout.PageLayout()), 1)
+        self.assertEqual(os.listdir(self.folder), ["1 - Глава"])
+        self.assertEqual(sorted(os.listdir(chapter)), ["0001.jpg", "0002.jpg", "0003.jpg"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import unittest
+from unittest import mock
+from tests import support
+from tests.support import acomicsdownload, SAdownload
+from comic_downloader import check, rss
+
+class Test_test_check(support.FolderTestCase):
+    def test_check_all(self):
+        self.use_sources(pages=12)
+        db = rss.RSSDB(os.path.join(self.folder, rss.DB_NAME))
+        db.create_db()
+        with sqlite3.connect(db.db_name) as connection:
+            connection.executemany(
+                """insert into rss_list (name, url, dir, exec_module_path, last_num)
+                values (?, ?, ?, ?, ?)""",
+                [
+                    ("new", "~new", os.path.join(self.folder, "new"), acomicsdownload.__file__, 5),
+                    ("old", "~old", os.path.join(self.folder, "old"), acomicsdownload.__file__, 13),
+                    ("broken", "~broken", self.folder, os.path.join(self.folder, "missing.py"), 1),
+                    ("sa", "sa", os.path.join(self.folder, "sa"), "sequentialart", 5),
+                ]
+            )
+        connection.close()
+
+        find_last = SAdownload.Downloader.find_last
+        threads = []
+
+        def recording_find_last(downloader, *args, **kwargs):
+            threads.append(threading.current_thread())
+            return find_last(downloader, *args, **kwargs)
+
+        with mock.patch.object(SAdownload.Downloader, "find_last", recording_find_last):
+            results = asyncio.run(check.check_all(db.get_db(), per_host=2))
+        by_name = {result["name"]: result for result in results}
+        self.assertEqual(by_name["new"]["available"], 13)
+        self.assertTrue(check.has_new(by_name["new"]))
+        self.assertFalse(check.has_new(by_name["old"]))
+        self.assertIsNotNone(by_name["broken"]["error"])
+        self.assertEqual(by_name["sa"]["available"], 13)
+        # Последовательный поиск Sequential Art не занимает цикл событий
+        self.assertNotIn(threading.main_thread(), threads)
+        # Проверка не создаёт папки комиксов
+        self.assertFalse(os.path.exists(os.path.join(self.folder, "new")))
+
+        db.set_available(results)
+        self.assertEqual([row["name"] for row in db.get_available()], ["new", "sa"])
+
+    def test_host_key(self):
+        rows = [
+            rss.RSSRow({"url": "~new", "exec_module_path": acomicsdownload.__file__}),
+            rss.RSSRow({"url": "https://acomics.ru/~old", "exec_module_path": ""}),
+            rss.RSSRow({"url": "sousou-no-frieren", "exec_module_path": "mangalib"}),
+            rss.RSSRow({"url": "https://example.com/comic", "exec_module_path": "custom.py"}),
+        ]
+        self.assertEqual(
+            [check.host_key(row) for row in rows],
+            ["acomics", "acomics", "mangalib", "example.com"]
+        )
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import contextlib
+import io
+import os
+import signal
+import sqlite3
+import tempfile
+import threading
+import unittest
+from unittest import mock
+from tests import support
+from comic_downloader import __main__ as main_module
+from comic_downloader import rss
+
+class Test_test_daemon(unittest.TestCase):
+    def test_daemon_stops_on_sigterm(self):
+        cwd = os.getcwd()
+        handlers = (signal.getsignal(signal.SIGINT), signal.getsignal(signal.SIGTERM))
+        with (
+            tempfile.TemporaryDirectory() as folder,
+            # Папки комиксов уже существуют, их не нужно преобразовывать
+            mock.patch.object(rss.RSSRow, "make_safe_path", classmethod(lambda cls, path: path))
+        ):
+            os.chdir(folder)
+            try:
+                # Загрузчик-заглушка, сразу сообщающий о новой странице,
+                # если он запущен в своей группе процессов и не получит Ctrl+C демона
+                script = os.path.join(folder, "fake_downloader.py")
+                group = os.getpgid(0) if hasattr(os, "getpgid") else None
+                with open(script, "w", encoding="utf-8") as file:
+                    file.write(
+                        "import json, os, sys\n"
+                        # Замеры этапов, если демон передал -profile
+                        "if '-profile' in sys.argv:\n"
+                        "    with open(sys.argv[sys.argv.index('-profile') + 1], 'w') as file:\n"
+                        "        json.dump({'module': 'fake', 'comic': 'fake', 'phases': {}}, file)\n"
+                        f"print(3 if os.name == 'nt' or os.getpgid(0) != {group} else 2)\n"
+                    )
+                db = rss.RSSDB(rss.DB_NAME)
+                db.create_db()
+                with sqlite3.connect(db.db_name) as connection:
+                    connection.execute(
+                        "insert into rss_list (name, url, dir, exec_module_path) values (?, ?, ?, ?)",
+                        ("fake", "fake", folder, script)
+                    )
+                connection.close()
+
+                args = main_module.arg_parser().parse_args(
+                    ["-daemon", "-interval", "0.2", "-notify", "none", "-profile"]
+                )
+                timer = threading.Timer(2, os.kill, (os.getpid(), signal.SIGTERM))
+                timer.start()
+                output = io.StringIO()
+                with (
+                    contextlib.redirect_stdout(output),
+                    # Профилирование включается на процесс, после теста оно выключается
+                    mock.patch.multiple(main_module.profiling.TIMER, enabled=False, module="", phases={})
+                ):
+                    main_module.run_daemon(args, folder)
+                timer.cancel()
+                # Загрузчик получил -profile, его замеры попали в таблицу цикла
+                self.assertIn("fake", [line.split(" | ")[0].strip() for line in output.getvalue().splitlines()])
+
+                row = db.get_db()[0]
+                self.assertEqual(row.last_num, 3)
+                self.assertGreater(row.next_chk, row.last_upd)
+            finally:
+                os.chdir(cwd)
+                signal.signal(signal.SIGINT, handlers[0])
+                signal.signal(signal.SIGTERM, handlers[1])
+
+if __name__ == '__main__':
+    unittest.main()
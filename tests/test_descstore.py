@@ -0,0 +1,75 @@
+import os
+import sqlite3
+import unittest
+from tests import support
+from tests.support import acomicsdownload
+from comic_downloader import descstore
+
+class Test_test_descstore(support.FolderTestCase):
+    def setUp(self):
+        super().setUp()
+        self.path = os.path.join(self.folder, descstore.STORE_FILE)
+
+    def rows(self, table: str) -> int:
+        with sqlite3.connect(self.path) as connection:
+            return connection.execute(f"select count(*) from {table}").fetchone()[0]
+
+    def test_batch(self):
+        store = descstore.DescriptionStore(self.path, batch=3)
+        store.add(1, "1 - А.txt", "Текст")
+        store.add(2, "2 - Б.txt", "Текст")
+        self.assertFalse(os.path.exists(self.path))
+        self.assertTrue(store.has(1, "1 - А.txt"))
+        store.add(3, "3 - В.txt", "Другой текст")
+        # Одинаковые описания хранятся один раз
+        self.assertEqual(self.rows("pages"), 3)
+        self.assertEqual(self.rows("texts"), 2)
+
+        store = descstore.DescriptionStore(self.path)
+        self.assertTrue(store.has(2))
+        self.assertFalse(store.has(2, "2 - Новый.txt"))
+        store.add(1, "1 - А.txt", "Текст")
+        self.assertEqual(store.flush(), 0)
+        store.add(3, "3 - В.txt", "Текст")
+        self.assertEqual(store.flush(), 1)
+        self.assertEqual(self.rows("texts"), 1)
+        self.assertEqual(store.get(3), "Текст")
+        self.assertIsNone(store.get(4))
+
+    def test_export_import(self):
+        store = descstore.DescriptionStore(self.path)
+        store.add(1, "1 - А.txt", "Первое")
+        store.add(2, "2 - Б.txt", "Второе")
+        self.assertEqual(descstore.export_texts(self.folder, store), 2)
+        self.assertEqual(descstore.export_texts(self.folder, store), 0)
+        with open(os.path.join(self.folder, "2 - Б.txt"), encoding="utf-8") as file:
+            self.assertEqual(file.read(), "Второе")
+
+        os.remove(self.path)
+        self.assertEqual(descstore.import_texts(self.folder), 2)
+        self.assertEqual(sorted(os.listdir(self.folder)), [descstore.STORE_FILE])
+        self.assertEqual(descstore.DescriptionStore(self.path).get(1), "Первое")
+
+    def test_download(self):
+        self.use_sources(pages=4, image_size=5000)
+        for use_async in (False, True):
+            with self.subTest(use_async=use_async):
+                folder = os.path.join(self.folder, f"async={use_async}")
+                os.makedirs(folder)
+                self.assertEqual(support.download(acomicsdownload.Downloader(
+                    comic_name = "~comic",
+                    first = 1,
+                    folder = folder,
+                    is_write_description = True,
+                    is_write_img_description = True,
+                    use_async = use_async
+                )), 5)
+                self.assertFalse([name for name in os.listdir(folder) if name.endswith(".txt")])
+                store = descstore.DescriptionStore.of_folder(folder)
+                self.assertEqual(
+                    [(page, name) for page, name, _ in store.items()],
+                    [(page, f"{page} - Страница {page}.txt") for page in range(1, 5)]
+                )
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+from tests import support
+from comic_downloader import dirindex
+
+class Test_test_dirindex(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        for page in range(1, 4):
+            with open(os.path.join(self.folder.name, f"{page}.jpg"), "wb") as file:
+                file.write(b"\0" * 2000)
+        with open(os.path.join(self.folder.name, "4.jpg"), "wb") as file:
+            file.write(b"\0" * 10)
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.folder.name, name)
+
+    def test_one_scan(self):
+        dirs = dirindex.DirIndexes()
+        with mock.patch("os.scandir", wraps=os.scandir) as scandir:
+            checks = [dirs.check_corrects_file(self.path(f"{page}.jpg")) for page in range(1, 100)]
+        self.assertEqual(scandir.call_count, 1)
+        self.assertEqual(checks[:5], [True, True, True, False, False])
+        self.assertFalse(any(checks[4:]))
+
+    def test_record(self):
+        dirs = dirindex.DirIndexes()
+        self.assertFalse(dirs.check_corrects_file(self.path("5.jpg")))
+        with open(self.path("5.jpg"), "wb") as file:
+            file.write(b"\0" * 3000)
+        # Запись со стороны индексу не видна, запись загрузчика учитывается
+        self.assertFalse(dirs.check_corrects_file(self.path("5.jpg")))
+        dirs.record(self.path("5.jpg"), 3000)
+        self.assertTrue(dirs.check_corrects_file(self.path("5.jpg")))
+        self.assertEqual(dirs.file_size(self.path("4.jpg")), 10)
+
+        with open(self.path("6.jpg"), "wb") as file:
+            file.write(b"\0" * 3000)
+        dirs.forget(self.folder.name)
+        self.assertTrue(dirs.check_corrects_file(self.path("6.jpg")))
+
+    def test_makedirs(self):
+        dirs = dirindex.DirIndexes()
+        chapter = self.path("1 - Глава")
+        with mock.patch("os.makedirs", wraps=os.makedirs) as makedirs:
+            for _ in range(5):
+                dirs.makedirs(chapter)
+        self.assertEqual(makedirs.call_count, 1)
+        self.assertTrue(os.path.isdir(chapter))
+        # Существующая папка находится по индексу родителя
+        dirs.forget(self.folder.name)
+        with mock.patch("os.makedirs") as makedirs:
+            dirs.makedirs(chapter)
+        makedirs.assert_not_called()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+import asyncio
+import atexit
+import os
+import tempfile
+import unittest
+from unittest import mock
+from comic_downloader import hostlimits
+
+class Test_test_hostlimits(unittest.TestCase):
+    def test_increase(self):
+        limiter = hostlimits.AIMDLimiter(limit=2, maximum=4)
+        for _ in range(20):
+            with limiter.slot():
+                pass
+        self.assertEqual(limiter.limit, 4)
+
+    def test_congestion(self):
+        limiter = hostlimits.AIMDLimiter(limit=8)
+        with limiter.slot() as slot:
+            slot.congestion()
+        self.assertEqual(limiter.limit, 4)
+        with self.assertRaises(TimeoutError):
+            with limiter.slot():
+                raise TimeoutError()
+        self.assertLessEqual(limiter.limit, 4)
+        self.assertGreaterEqual(limiter.limit, limiter.minimum)
+
+    def test_request_classes(self):
+        self.assertEqual(hostlimits.request_class("https://acomics.ru/~comic/12"), "page")
+        self.assertEqual(hostlimits.request_class("https://acomics.ru/upload/!c/a/12.jpg?x=1"), "file")
+        # Быстрые страницы и медленные картинки одного хоста не считаются перегрузкой
+        limiter = hostlimits.AIMDLimiter(limit=2, maximum=8)
+        with mock.patch.object(limiter, "_decrease") as decrease:
+            for _ in range(50):
+                limiter.on_success(.05, "page")
+                limiter.on_success(.4, "file")
+        decrease.assert_not_called()
+        self.assertEqual(limiter.limit, 8)
+
+    def test_base_drift(self):
+        limiter = hostlimits.AIMDLimiter(limit=8)
+        # Одна быстрая выборка, затем постоянно в 4 раза медленнее
+        limiter.on_success(.01)
+        with mock.patch.object(limiter, "_decrease") as decrease:
+            for _ in range(1000):
+                limiter.on_success(.04)
+        self.assertGreater(decrease.call_count, 0)
+        # Наименьшая задержка подтянулась, и прежняя задержка больше не перегрузка
+        with mock.patch.object(limiter, "_decrease") as decrease:
+            limiter.on_success(.04)
+        decrease.assert_not_called()
+
+    def test_add_congestion_errors(self):
+        limiters = hostlimits.HostLimiters()
+        limiter = limiters.get("acomics.ru")
+        limiters.add_congestion_errors(KeyError, TimeoutError)
+        self.assertEqual(limiter.congestion_errors, (TimeoutError, ConnectionError, KeyError))
+        self.assertIs(limiters.get("example.com").congestion_errors, limiters.congestion_errors)
+
+    def test_async_in_flight(self):
+        limiter = hostlimits.AIMDLimiter(limit=3, maximum=3)
+        peak = 0
+
+        async def request():
+            nonlocal peak
+            async with limiter.async_slot():
+                peak = max(peak, limiter.in_flight)
+                await asyncio.sleep(0.01)
+
+        async def main():
+            await asyncio.gather(*(request() for _ in range(20)))
+
+        asyncio.run(main())
+        self.assertEqual(peak, 3)
+
+    def test_store(self):
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "hostlimits.db")
+            limiters = hostlimits.HostLimiters()
+            limiters.use_store(path)
+            atexit.unregister(limiters.save)
+            with limiters.get("acomics.ru").slot() as slot:
+                slot.congestion()
+            limiters.save()
+
+            limiters = hostlimits.HostLimiters()
+            limiters.use_store(path)
+            atexit.unregister(limiters.save)
+            self.assertEqual(limiters.get("acomics.ru").limit, 4)
+            self.assertEqual(limiters.get("example.com").limit, 8)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+import io
+import os
+import unittest
+from unittest import mock
+import zipfile
+from benchmarks import fake_sources
+from tests import support
+from tests.support import acomicsdownload
+# Папку загрузчиков добавляет в путь общий модуль тестов
+import dirindex
+from comic_downloader import imagecheck
+
+class Test_test_imagecheck(support.FolderTestCase):
+    def test_verdicts(self):
+        jpeg = fake_sources.fake_image(5000)
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, "w") as archive_file:
+            archive_file.writestr("0001.jpg", jpeg)
+        cases = {
+            "jpeg": (jpeg, True),
+            "маленький jpeg": (fake_sources.fake_image(300), True),
+            "обрезанный jpeg": (jpeg[:3000], False),
+            "png": (b"\x89PNG\r\n\x1a\n" + b"\0" * 100 + b"\0\0\0\0IEND\xaeB`\x82", True),
+            "обрезанный png": (b"\x89PNG\r\n\x1a\n" + b"\0" * 100, False),
+            "gif": (b"GIF89a" + b"\1" * 100 + b";", True),
+            "html": (b"<!DOCTYPE html><html>" + b" " * 2000 + b"</html>", False),
+            "zip": (archive.getvalue(), True),
+            "обрезанный zip": (archive.getvalue()[:-30], False),
+        }
+        for name, (content, expected) in cases.items():
+            with self.subTest(name=name):
+                self.assertEqual(imagecheck.is_correct(imagecheck.check_bytes(content), len(content)), expected)
+                validator = imagecheck.ImageValidator()
+                for start in range(0, len(content), 7):
+                    validator.feed(content[start:start + 7])
+                self.assertEqual(validator.verdict(), imagecheck.check_bytes(content))
+                path = self.write(f"{len(content)}.bin", content)
+                self.assertEqual(imagecheck.check_file(path), imagecheck.check_bytes(content))
+        # Нераспознанный формат проверяется по размеру
+        self.assertIsNone(imagecheck.check_bytes(b"\0" * 2000))
+        self.assertTrue(imagecheck.is_correct(None, 2000))
+        self.assertFalse(imagecheck.is_correct(None, 1000))
+        # Размер, который сообщил сервер
+        self.assertFalse(imagecheck.check_bytes(jpeg, expected_size=6000))
+        self.assertFalse(imagecheck.check_file(os.path.join(self.folder, "нет.jpg")))
+
+    def test_cache(self):
+        self.write("1.jpg", fake_sources.fake_image(5000)[:3000])
+        self.write("2.jpg", fake_sources.fake_image(300))
+        indexes = dirindex.DirIndexes()
+        with mock.patch.object(dirindex.imagecheck, "check_file", wraps=imagecheck.check_file) as check_file:
+            for _ in range(3):
+                self.assertFalse(indexes.check_corrects_file(os.path.join(self.folder, "1.jpg")))
+                self.assertTrue(indexes.check_corrects_file(os.path.join(self.folder, "2.jpg")))
+            self.assertEqual(check_file.call_count, 2)
+            # Результат проверки при записи не требует чтения файла
+            indexes.record(os.path.join(self.folder, "1.jpg"), 3000, True)
+            self.assertTrue(indexes.check_corrects_file(os.path.join(self.folder, "1.jpg")))
+            self.assertEqual(check_file.call_count, 2)
+
+    def test_download(self):
+        sources = self.use_sources(pages=4, image_size=5000)
+        for use_async in (False, True):
+            with self.subTest(use_async=use_async):
+                folder = os.path.join(self.folder, f"async={use_async}")
+                os.makedirs(folder)
+                image = fake_sources.fake_image(5000)
+                # Обрезанная картинка перекачивается, маленькая целая — нет
+                self.write(os.path.join(folder, "1 - Страница 1.jpg"), image[:4000])
+                self.write(os.path.join(folder, "2 - Страница 2.jpg"), fake_sources.fake_image(500))
+                before = sources.requests["acomics_image"]
+                self.assertEqual(support.download(acomicsdownload.Downloader(
+                    comic_name = "~comic",
+                    first = 1,
+                    folder = folder,
+                    is_write_description = False,
+                    is_write_img_description = False,
+                    use_async = use_async
+                )), 5)
+                self.assertEqual(sources.requests["acomics_image"] - before, 3)
+                self.assertEqual(os.path.getsize(os.path.join(folder, "1 - Страница 1.jpg")), 5000)
+                self.assertEqual(os.path.getsize(os.path.join(folder, "2 - Страница 2.jpg")), 500)
+
+if __name__ == '__main__':
+    unittest.main()
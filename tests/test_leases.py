@@ -0,0 +1,130 @@
+from datetime import timedelta
+import os
+import sqlite3
+import tempfile
+import threading
+import unittest
+from unittest import mock
+from tests import support
+from comic_downloader import __main__ as main_module
+from comic_downloader import rss
+
+class Test_test_leases(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.db_name = os.path.join(self.folder.name, rss.DB_NAME)
+        db = rss.RSSDB(self.db_name)
+        db.create_db()
+        with sqlite3.connect(self.db_name) as connection:
+            connection.executemany(
+                "insert into rss_list (name, url, dir, exec_module_path) values (?, ?, ?, ?)",
+                [(f"c{i}", "u", self.folder.name, "m") for i in range(12)]
+            )
+        connection.close()
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def test_no_overlap(self):
+        first = rss.RSSDB(self.db_name)
+        second = rss.RSSDB(self.db_name)
+        leased_first = {row.id for row in first.lease_due("first", 5)}
+        leased_second = {row.id for row in second.lease_due("second", 20)}
+        self.assertEqual(len(leased_first), 5)
+        self.assertEqual(len(leased_second), 7)
+        self.assertFalse(leased_first & leased_second)
+        # Арендованные комиксы не выдаются и обычному запуску
+        self.assertEqual(len(first.get_due()), 0)
+        first.release_leases()
+        self.assertEqual({row.id for row in second.get_due()}, leased_first)
+
+    def test_concurrent_nodes(self):
+        taken: list[int] = []
+        lock = threading.Lock()
+
+        def node(owner: str):
+            db = rss.RSSDB(self.db_name)
+            while rss_list := db.lease_due(owner, 1):
+                for row in rss_list:
+                    with lock:
+                        taken.append(row.id)
+                    db.set_last_chk(row.id)
+
+        threads = [threading.Thread(target=node, args=(f"node{i}",)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(sorted(taken), list(range(1, 13)))
+
+    def test_expired_lease(self):
+        stale = rss.RSSDB(self.db_name)
+        fresh = rss.RSSDB(self.db_name)
+        # Узел упал: его аренда истекла, комикс подхватывает другой узел
+        stale.lease_due("stale", 1, ttl=timedelta(0))
+        self.assertEqual([row.id for row in fresh.lease_due("fresh", 1)], [1])
+        self.assertEqual(fresh.leases[1].token, 2)
+
+        fresh.set_last_num(1, 10)
+        with self.assertRaises(rss.LeaseLostError):
+            stale.set_last_num(1, 3)
+        self.assertEqual(stale.get_db()[0].last_num, 10)
+
+    def test_renew(self):
+        db = rss.RSSDB(self.db_name)
+        db.lease_due("node", 2)
+        self.assertEqual(db.renew_leases(), [])
+        with sqlite3.connect(self.db_name) as connection:
+            connection.execute("update rss_leases set expires=datetime('now', '-1 seconds') where rss_id=2")
+        connection.close()
+        self.assertEqual(db.renew_leases(), [2])
+        self.assertEqual(list(db.leases), [1])
+        db.set_last_chk(1)
+        self.assertEqual(db.leases, {})
+
+    def test_lost_on_renew(self):
+        stale = rss.RSSDB(self.db_name)
+        fresh = rss.RSSDB(self.db_name)
+        stale.lease_due("stale", 1, ttl=timedelta(0))
+        self.assertEqual([row.id for row in fresh.lease_due("fresh", 1)], [1])
+        fresh.set_last_num(1, 50)
+        # Потерянная при продлении аренда не даёт записать устаревший результат
+        self.assertEqual(stale.renew_leases(), [1])
+        with self.assertRaises(rss.LeaseLostError):
+            stale.set_last_num(1, 7)
+        # Как и комикс, который узел не арендовал
+        with self.assertRaises(rss.LeaseLostError):
+            stale.set_last_chk(2)
+        self.assertEqual(stale.get_db()[0].last_num, 50)
+        # Обычный запуск без аренд записывает результаты как раньше
+        rss.RSSDB(self.db_name).set_last_num(2, 5)
+        self.assertEqual(stale.get_db()[1].last_num, 5)
+
+    def test_worker_run(self):
+        cwd = os.getcwd()
+        os.chdir(self.folder.name)
+        try:
+            # Загрузчик-заглушка, сразу сообщающий о новой странице
+            script = os.path.join(self.folder.name, "fake_downloader.py")
+            with open(script, "w", encoding="utf-8") as file:
+                file.write("print(3)\n")
+            with sqlite3.connect(self.db_name) as connection:
+                connection.execute("update rss_list set exec_module_path=?", (script,))
+            connection.close()
+
+            args = main_module.arg_parser().parse_args(
+                ["-worker", "node", "-lease-batch", "5", "-notify", "none"]
+            )
+            # Папки комиксов уже существуют, их не нужно преобразовывать
+            with mock.patch.object(rss.RSSRow, "make_safe_path", classmethod(lambda cls, path: path)):
+                main_module.run(args, self.folder.name)
+            db = rss.RSSDB(self.db_name)
+            self.assertTrue(all(row.last_num == 3 for row in db.get_db()))
+            with sqlite3.connect(self.db_name) as connection:
+                self.assertEqual(connection.execute("select count(*) from rss_leases").fetchone()[0], 0)
+            connection.close()
+        finally:
+            os.chdir(cwd)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+import asyncio
+import os
+import socket
+import tempfile
+import threading
+import unittest
+from unittest import mock
+from tests import support
+from netcache import NetCache, NetStats
+from netresolver import CachingResolver
+
+class Test_test_netresolver(unittest.TestCase):
+    def test_resolve(self):
+        addrs = [{"hostname": "example.com", "host": "127.0.0.1", "port": 80,
+                  "family": socket.AF_INET, "proto": 0, "flags": 0}]
+        threads: list[threading.Thread] = []
+        with tempfile.TemporaryDirectory() as folder:
+            cache = NetCache(os.path.join(folder, "netcache.db"))
+            stats = NetStats()
+
+            def record(method):
+                def wrapper(*args):
+                    threads.append(threading.current_thread())
+                    return method(*args)
+                return wrapper
+
+            async def run():
+                resolver = CachingResolver(cache, stats, 60)
+                with (
+                    mock.patch.object(resolver._resolver, "resolve", mock.AsyncMock(return_value=addrs)),
+                    mock.patch.object(cache, "get_dns", record(cache.get_dns)),
+                    mock.patch.object(cache, "set_dns", record(cache.set_dns))
+                ):
+                    first = await resolver.resolve("example.com", 80)
+                    # Повторное разрешение отвечает из памяти, не обращаясь к файлу
+                    second = await resolver.resolve("example.com", 80)
+                await resolver.close()
+                return first, second
+
+            self.assertEqual(asyncio.run(run()), (addrs, addrs))
+            self.assertEqual((stats.dns_hits, stats.dns_misses), (1, 1))
+            # Файл кэша читался и писался вне цикла событий
+            self.assertEqual(len(threads), 2)
+            self.assertNotIn(threading.main_thread(), threads)
+            # Другой процесс запуска найдёт адреса в файле
+            other = NetCache(cache.path)
+            self.assertEqual(other.get_dns("example.com", 80, socket.AF_INET), addrs)
+            other.close()
+            cache.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,31 @@
+import os
+import tempfile
+import unittest
+from comic_downloader import notify
+
+class Test_test_notify(unittest.TestCase):
+    def test_summary(self):
+        notifier = notify.NullNotifier(limit=2)
+        for i in range(4):
+            notifier.add(f"Комикс {i}", f"добавлена {i} страница")
+        title, message = notifier.summary()
+        self.assertEqual(title, "RSS: обновлено комиксов 4")
+        self.assertEqual(message.splitlines()[-1], "…и ещё 2")
+
+    def test_file(self):
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "updates.log")
+            notifier = notify.create("file", path)
+            notifier.add("Комикс", "добавлена 10 страница")
+            notifier.flush()
+            notifier.join()
+            with open(path, encoding="utf-8") as file:
+                self.assertIn("Комикс: добавлена 10 страница", file.read())
+
+    def test_empty(self):
+        notifier = notify.create("stdout")
+        notifier.flush()
+        self.assertIsNone(notifier._thread)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import os
+import unittest
+from tests import support
+from tests.support import SAdownload
+from comic_downloader import pagelayout
+
+class Test_test_pagelayout(support.FolderTestCase):
+    def test_parse(self):
+        self.assertEqual(pagelayout.PageLayout.parse("flat"), pagelayout.PageLayout())
+        self.assertEqual(pagelayout.PageLayout.parse("range"), pagelayout.PageLayout(1000))
+        self.assertEqual(str(pagelayout.PageLayout.parse("range:500")), "range:500")
+        self.assertEqual(pagelayout.PageLayout(100).bucket_name(1234), "01200-01299")
+        self.assertEqual(pagelayout.page_number("12 - Глава.jpg"), 12)
+        self.assertEqual(pagelayout.page_number("SA_0012_small.jpg"), 12)
+        self.assertIsNone(pagelayout.page_number("cover.jpg"))
+        with self.assertRaises(ValueError):
+            pagelayout.PageLayout.parse("range:0")
+
+    def test_migrate(self):
+        names = [f"{page} - Страница.jpg" for page in range(1, 25)] + ["12.txt", "cover.jpg"]
+        for name in names:
+            self.write(name)
+
+        self.assertEqual(pagelayout.migrate(self.folder, pagelayout.PageLayout(10)), 25)
+        self.assertEqual(pagelayout.read_layout(self.folder), pagelayout.PageLayout(10))
+        self.assertEqual(
+            sorted(os.listdir(self.folder)),
+            [".layout", "00000-00009", "00010-00019", "00020-00029", "cover.jpg"]
+        )
+        self.assertIn("12.txt", os.listdir(os.path.join(self.folder, "00010-00019")))
+        # Повторный перенос ничего не меняет, обратный возвращает плоскую папку
+        self.assertEqual(pagelayout.migrate(self.folder, pagelayout.PageLayout(10)), 0)
+        self.assertEqual(pagelayout.migrate(self.folder, pagelayout.PageLayout()), 25)
+        self.assertEqual(sorted(os.listdir(self.folder)), sorted(names))
+
+    def test_no_redownload(self):
+        sources = self.use_sources(pages=6, image_size=5000)
+
+        def download() -> int:
+            return SAdownload.Downloader(
+                comic_name = "sa",
+                first = 1,
+                folder = self.folder,
+                is_write_description = False,
+                is_write_img_description = False,
+                use_async = False
+            ).downloadcomic()
+
+        self.assertEqual(download(), 7)
+        # Поиск последней страницы тоже запрашивает картинки
+        first_run = sources.requests["sa_image"]
+        search = first_run - 6
+        pagelayout.migrate(self.folder, pagelayout.PageLayout(4))
+        # Страница, оставшаяся в папке комикса, тоже не скачивается заново
+        os.replace(
+            os.path.join(self.folder, "00004-00007", "SA_0005_small.jpg"),
+            os.path.join(self.folder, "SA_0005_small.jpg")
+        )
+        os.remove(os.path.join(self.folder, "00004-00007", "SA_0006_small.jpg"))
+        self.assertEqual(download(), 7)
+        self.assertEqual(sources.requests["sa_image"], first_run + search + 1)
+        self.assertIn("SA_0006_small.jpg", os.listdir(os.path.join(self.folder, "00004-00007")))
+
+if __name__ == '__main__':
+    unittest.main()
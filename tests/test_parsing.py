@@ -0,0 +1,35 @@
+import asyncio
+import unittest
+from tests.support import acomicsdownload, base_downloader
+
+_PAGE = (
+    '<html><body><div class="common-content">'
+    '<img class="issue" src="/upload/~a/000001.jpg" title="Подсказка">'
+    '<span class="title">Страница 1.</span>'
+    '<section class="issue-description-text">'
+    '<p>Описание<br>со <a href="https://example.com">ссылкой</a></p>'
+    '</section>'
+    '</div></body></html>'
+).encode()
+
+class Test_test_parsing(unittest.TestCase):
+    def test_parse_content_page(self):
+        record = acomicsdownload.parse_content_page(_PAGE)
+        self.assertEqual(record["src"], "/upload/~a/000001.jpg")
+        self.assertEqual(record["img_title"], "Подсказка")
+        self.assertEqual(record["title"], "Страница 1")
+        self.assertEqual(record["description"], "Описание\nсо ссылкой (https://example.com)")
+
+    def test_parser_pool(self):
+        expected = acomicsdownload.parse_content_page(_PAGE)
+        for kind in base_downloader.ParserPool.KINDS:
+            with self.subTest(kind=kind):
+                pool = base_downloader.ParserPool(kind, 2)
+                try:
+                    record = asyncio.run(pool.run(acomicsdownload.parse_content_page, _PAGE))
+                finally:
+                    pool.shutdown()
+                self.assertEqual(record, expected)
+
+if __name__ == '__main__':
+    unittest.main()
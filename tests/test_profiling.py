@@ -0,0 +1,38 @@
+import unittest
+from tests import support
+from comic_downloader import profiling
+
+class Test_test_profiling(unittest.TestCase):
+    def test_disabled_phase(self):
+        timer = profiling.PhaseTimer()
+        with timer.phase("parse"):
+            pass
+        self.assertEqual(timer.phases, {})
+
+    def test_phase(self):
+        timer = profiling.PhaseTimer("acomicsdownload", "~romac")
+        timer.enabled = True
+        for _ in range(3):
+            with timer.phase("parse"):
+                pass
+        self.assertEqual(timer.phases["parse"][0], 3)
+        self.assertGreaterEqual(timer.phases["parse"][1], 0)
+
+    def test_format_table(self):
+        records = [
+            profiling.ProfileRecordDict(
+                module="acomicsdownload", comic="~a", phases={"parse": [2, 1.5]}
+            ),
+            profiling.ProfileRecordDict(
+                module="acomicsdownload", comic="~b", phases={"transfer": [1, 0.5]}
+            ),
+        ]
+        table = profiling.format_table(records)
+        lines = table.splitlines()
+        # Заголовок, разделитель, два комикса и итог по модулю
+        self.assertEqual(len(lines), 5)
+        self.assertIn("Итого", lines[-1])
+        self.assertIn("2.000", lines[-1])
+
+if __name__ == '__main__':
+    unittest.main()
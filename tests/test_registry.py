@@ -0,0 +1,142 @@
+import atexit
+import os
+import sqlite3
+import unittest
+from unittest import mock
+from tests import support
+from tests.support import acomicsdownload, base_downloader, mangalib
+from comic_downloader import __main__ as main_module
+from comic_downloader import notify, registry, rss
+
+class Test_test_registry(support.FolderTestCase):
+    def test_find_source(self):
+        self.assertEqual(registry.find_source("acomics").module, "acomicsdownload")
+        self.assertEqual(registry.find_source("modules/SAdownload.py").id, "sequentialart")
+        self.assertEqual(registry.find_source("", "https://mangalib.me/slug").id, "mangalib")
+        self.assertEqual(registry.find_source(None, "hentailib.me/slug").id, "hentailib")
+        self.assertIsNone(registry.find_source("other.py", "~comic"))
+
+    def test_resolve(self):
+        self.assertIs(registry.resolve(acomicsdownload.__file__), acomicsdownload.Downloader)
+        self.assertIs(registry.resolve("acomics"), acomicsdownload.Downloader)
+        with self.assertRaises(LookupError):
+            registry.resolve("missing.py", "~comic")
+
+    def test_to_number(self):
+        self.assertEqual(registry.to_number(11), 11)
+        self.assertIsInstance(registry.to_number("58"), int)
+        self.assertEqual(registry.to_number("58.1.1"), 58.1)
+
+    def test_script_path(self):
+        self.assertEqual(
+            registry.script_path("acomics"), os.path.join(registry.MODULES_DIR, "acomicsdownload.py")
+        )
+        self.assertEqual(registry.script_path("", "https://mangalib.me/slug"), mangalib.__file__)
+        self.assertEqual(registry.script_path(acomicsdownload.__file__), acomicsdownload.__file__)
+        self.assertEqual(registry.script_path("missing.py", "~comic"), "missing.py")
+
+    def test_download_subprocess(self):
+        db = rss.RSSDB(os.path.join(self.folder, rss.DB_NAME))
+        db.create_db()
+        with sqlite3.connect(db.db_name) as connection:
+            connection.execute(
+                "insert into rss_list (name, url, dir, exec_module_path) values (?, ?, ?, ?)",
+                ("comic", "~comic", self.folder, "acomics")
+            )
+        connection.close()
+        process = mock.Mock()
+        process.communicate.return_value = (b"7", b"")
+        with (
+            mock.patch.object(rss.RSSRow, "make_safe_path", classmethod(lambda cls, path, create_path=True: path)),
+            mock.patch.object(main_module.sp, "Popen", return_value=process) as popen
+        ):
+            main_module.download(
+                main_module.arg_parser().parse_args([]), db, db.get_db(), notify.NullNotifier(),
+                main_module.NetCache(os.path.join(self.folder, "netcache.db")),
+                os.path.join(self.folder, "hostlimits.db")
+            )
+        # Идентификатор источника запускается файлом его модуля
+        command = popen.call_args.args[0]
+        self.assertEqual(os.path.realpath(command[1]), os.path.realpath(acomicsdownload.__file__))
+        self.assertEqual([row.last_num for row in db.get_db()], [7])
+
+    def test_download_in_process(self):
+        self.use_sources(pages=6, image_size=5000)
+        # Папки комиксов уже существуют, их не нужно преобразовывать
+        self.enterContext(mock.patch.object(
+            rss.RSSRow, "make_safe_path", classmethod(lambda cls, path, create_path=True: path)
+        ))
+        self.addCleanup(os.chdir, os.getcwd())
+        os.chdir(self.folder)
+        sa_folder = os.path.join(self.folder, "sa")
+        os.makedirs(sa_folder)
+        db = rss.RSSDB(os.path.join(self.folder, rss.DB_NAME))
+        db.create_db()
+        with sqlite3.connect(db.db_name) as connection:
+            connection.executemany(
+                """insert into rss_list (name, url, dir, exec_module_path, last_num)
+                values (?, ?, ?, ?, ?)""",
+                [
+                    ("comic", "~comic", self.folder, "acomics", 1),
+                    ("broken", "~broken", self.folder, "missing.py", 1),
+                    # Загрузчики страниц Sequential Art не разбирают командную строку оркестратора
+                    ("sa", "sa", sa_folder, "sequentialart", 1),
+                ]
+            )
+        connection.close()
+
+        args = main_module.arg_parser().parse_args(["-in-process"])
+        notifier = notify.NullNotifier()
+        netcache = main_module.NetCache(os.path.join(self.folder, "netcache.db"))
+        main_module.download_in_process(
+            args, db, db.get_db(), notifier, netcache, os.path.join(self.folder, "hostlimits.db")
+        )
+        # Файлы запуска удаляются вместе с временной папкой
+        atexit.unregister(base_downloader.HOSTS.save)
+        base_downloader.HOSTS.store = None
+        base_downloader.SESSIONS.netcache = None
+
+        rows = {row.name: row for row in db.get_db()}
+        self.assertEqual(rows["comic"].last_num, 7)
+        self.assertEqual(rows["broken"].last_num, 1)
+        self.assertEqual(rows["sa"].last_num, 7)
+        self.assertEqual(len(notifier.updates), 2)
+        self.assertEqual(len(os.listdir(sa_folder)), 6)
+        self.assertEqual(len([name for name in os.listdir(self.folder) if name.endswith(".jpg")]), 6)
+
+    def test_session_loop(self):
+        self.use_sources(pages=6, image_size=5000)
+        db = rss.RSSDB(os.path.join(self.folder, rss.DB_NAME))
+        db.create_db()
+        with sqlite3.connect(db.db_name) as connection:
+            connection.execute(
+                "insert into rss_list (name, url, dir, exec_module_path) values (?, ?, ?, ?)",
+                ("comic", "~comic", self.folder, "acomics")
+            )
+        connection.close()
+        args = main_module.arg_parser().parse_args(["-in-process"])
+        netcache = main_module.NetCache(os.path.join(self.folder, "netcache.db"))
+        sessions = []
+        with (
+            mock.patch.object(rss.RSSRow, "make_safe_path", classmethod(lambda cls, path, create_path=True: path)),
+            registry.session_loop() as runner
+        ):
+            for _ in range(2):
+                main_module.download_in_process(
+                    args, db, db.get_db(), notify.NullNotifier(), netcache,
+                    os.path.join(self.folder, "hostlimits.db"), runner=runner
+                )
+                sessions.append(base_downloader.SESSIONS._session)
+            # Клиенты и их соединения переживают цикл скачивания
+            self.assertIsNotNone(sessions[0])
+            self.assertIs(sessions[0], sessions[1])
+            self.assertFalse(sessions[0].closed)
+        self.assertTrue(sessions[0].closed)
+        self.assertIsNone(base_downloader.SESSIONS._session)
+        atexit.unregister(base_downloader.HOSTS.save)
+        base_downloader.HOSTS.store = None
+        base_downloader.SESSIONS.netcache = None
+        self.assertEqual([row.last_num for row in db.get_db()], [7])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+import os
+import unittest
+from tests import support
+from tests.support import acomicsdownload
+
+class Test_test_retitle(support.FolderTestCase):
+    def test_rename(self):
+        sources = self.use_sources(pages=4, image_size=5000)
+        for use_async in (False, True):
+            with self.subTest(use_async=use_async):
+                folder = os.path.join(self.folder, f"async={use_async}")
+                os.makedirs(folder)
+
+                def download() -> int:
+                    return support.download(acomicsdownload.Downloader(
+                        comic_name = "~comic",
+                        first = 1,
+                        folder = folder,
+                        is_write_description = True,
+                        is_write_img_description = False,
+                        use_async = use_async
+                    ))
+
+                self.assertEqual(download(), 5)
+                # Автор сменил заголовки: файлы остались под прежними именами
+                os.replace(os.path.join(folder, "1 - Страница 1.jpg"), os.path.join(folder, "1 - Старое.jpg"))
+                # Описание в файле .txt от прежних версий
+                with open(os.path.join(folder, "1 - Старое.txt"), "w", encoding="utf-8") as file:
+                    file.write("Описание")
+                os.replace(os.path.join(folder, "2 - Страница 2.jpg"), os.path.join(folder, "2.jpg"))
+                # Другая картинка под прежним заголовком скачивается заново
+                os.remove(os.path.join(folder, "3 - Страница 3.jpg"))
+                self.write(os.path.join(folder, "3 - Старое.jpg"))
+
+                before = sources.requests["acomics_image"]
+                before_head = sources.requests["acomics_head"]
+                self.assertEqual(download(), 5)
+                self.assertEqual(sources.requests["acomics_image"] - before, 1)
+                self.assertEqual(sources.requests["acomics_head"] - before_head, 3)
+                names = os.listdir(folder)
+                self.assertIn("1 - Страница 1.jpg", names)
+                self.assertIn("1 - Страница 1.txt", names)
+                self.assertIn("2 - Страница 2.jpg", names)
+                self.assertIn("3 - Страница 3.jpg", names)
+                self.assertNotIn("1 - Старое.jpg", names)
+                self.assertNotIn("2.jpg", names)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+from datetime import datetime, timedelta
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest import mock
+from tests import support
+from comic_downloader import rss
+
+class Test_test_schedule(unittest.TestCase):
+    def test_check_interval(self):
+        now = datetime(2024, 1, 10)
+        daily = [now - timedelta(days=i) for i in reversed(range(5))]
+        self.assertEqual(rss.check_interval(daily, now), timedelta(hours=12))
+        idle = [datetime(2022, 1, 1), datetime(2022, 1, 2)]
+        self.assertEqual(rss.check_interval(idle, now), rss.MAX_CHECK_INTERVAL)
+        self.assertEqual(rss.check_interval([], now), rss.MIN_CHECK_INTERVAL)
+
+    def test_get_due(self):
+        with tempfile.TemporaryDirectory() as folder:
+            db = rss.RSSDB(os.path.join(folder, rss.DB_NAME))
+            db.create_db()
+            with sqlite3.connect(db.db_name) as connection:
+                connection.executemany(
+                    "insert into rss_list (name, url, dir, exec_module_path, ended) values (?, ?, ?, ?, ?)",
+                    [
+                        ("a", "u", folder, "m", 0),
+                        ("b", "u", folder, "m", 0),
+                        ("c", "u", folder, "m", 1),
+                        # Записанные текстом, как их понимает RSSRow
+                        ("d", "u", folder, "m", "False"),
+                        ("e", "u", folder, "m", "True"),
+                    ]
+                )
+            connection.close()
+            # Текстовые значения приводятся к числам при обслуживании БД
+            db.service_db()
+            self.assertEqual([row.name for row in db.get_due()], ["a", "b", "d"])
+            self.assertEqual([row.ended for row in db.get_db()], [False, False, True, False, True])
+            self.assertIsNotNone(db.seconds_to_next_check())
+            db.set_last_chk(1)
+            db.set_last_num(2, 5)
+            db.set_last_chk(4)
+            self.assertEqual(len(db.get_due()), 0)
+            self.assertEqual(len(db.get_db()), 5)
+            self.assertGreater(db.get_db()[1].next_chk, db.get_db()[1].last_upd)
+
+    def test_migrate_once(self):
+        with tempfile.TemporaryDirectory() as folder:
+            db = rss.RSSDB(os.path.join(folder, rss.DB_NAME))
+            db.create_db()
+            # Чтение после создания БД не открывает соединений для обновления схемы
+            with mock.patch.object(rss.sqlite3, "connect", wraps=sqlite3.connect) as connect:
+                db.get_due()
+                db.get_available()
+                rss.RSSDB(db.db_name).get_repair()
+            self.assertEqual(connect.call_count, 3)
+
+if __name__ == '__main__':
+    unittest.main()
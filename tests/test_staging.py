@@ -0,0 +1,103 @@
+import os
+import shutil
+import unittest
+from unittest import mock
+from tests import support
+from tests.support import acomicsdownload, base_downloader
+from comic_downloader import staging
+
+class Test_test_staging(support.FolderTestCase):
+    def setUp(self):
+        super().setUp()
+        self.stage = os.path.join(self.folder, "stage")
+        self.target = os.path.join(self.folder, "target")
+
+    def test_commit(self):
+        for same_device in (True, False):
+            with self.subTest(same_device=same_device), mock.patch.object(
+                staging, "_same_device", return_value=same_device
+            ):
+                stage = os.path.join(self.stage, str(same_device))
+                target = os.path.join(self.target, str(same_device))
+                self.write(os.path.join(target, "1 - Глава", "0001.jpg"))
+                self.write(os.path.join(stage, "1 - Глава", "0002.jpg"))
+                self.write(os.path.join(stage, "2 - Глава", "0001.jpg"))
+                self.write(os.path.join(stage, "2 - Глава", "0002.jpg"))
+                self.write(os.path.join(stage, "3 - Глава.cbz.part"))
+                committed = []
+                self.assertEqual(
+                    staging.commit(stage, target, on_file=lambda path, size: committed.append(path)), 3
+                )
+                self.assertEqual(sorted(os.listdir(os.path.join(target, "1 - Глава"))), ["0001.jpg", "0002.jpg"])
+                self.assertEqual(sorted(os.listdir(os.path.join(target, "2 - Глава"))), ["0001.jpg", "0002.jpg"])
+                self.assertEqual(len(committed), 3)
+                self.assertTrue(all(os.path.isfile(path) for path in committed))
+                # Незаконченный архив остаётся в промежуточной папке
+                self.assertEqual(os.listdir(stage), ["3 - Глава.cbz.part"])
+
+    def test_interrupted(self):
+        for page in range(1, 4):
+            self.write(os.path.join(self.stage, f"{page}.jpg"))
+        copyfile = shutil.copyfile
+        calls = []
+
+        def failing_copyfile(src, dst):
+            calls.append(src)
+            if len(calls) == 2:
+                raise OSError("Диск недоступен")
+            return copyfile(src, dst)
+
+        with (
+            mock.patch.object(staging, "_same_device", return_value=False),
+            mock.patch.object(staging.shutil, "copyfile", failing_copyfile)
+        ):
+            with self.assertRaises(OSError):
+                staging.commit(self.stage, self.target)
+            # Перенесённый файл удалён из промежуточной папки, остальные ждут повтора
+            self.assertEqual(len(os.listdir(self.stage)) + len(
+                [name for name in os.listdir(self.target) if name.endswith(".jpg")]
+            ), 3)
+            self.assertEqual(staging.commit(self.stage, self.target), 2)
+        self.assertEqual(sorted(os.listdir(self.target)), ["1.jpg", "2.jpg", "3.jpg"])
+        self.assertFalse(os.path.exists(self.stage))
+
+    def test_download(self):
+        sources = self.use_sources(pages=4, image_size=5000)
+        for use_async in (False, True):
+            with self.subTest(use_async=use_async):
+                target = os.path.join(self.target, f"async={use_async}")
+                os.makedirs(target)
+
+                def download() -> int:
+                    return support.download(acomicsdownload.Downloader(
+                        comic_name = "~comic",
+                        first = 1,
+                        folder = target,
+                        is_write_description = True,
+                        is_write_img_description = False,
+                        use_async = use_async,
+                        stage = self.stage
+                    ))
+
+                # Номер новой страницы не возвращается, пока файлы не перенесены
+                with mock.patch.object(base_downloader.staging, "commit", side_effect=OSError("Диск недоступен")):
+                    with self.assertRaises(OSError):
+                        download()
+                # Описания уже записаны в хранилище папки комикса
+                self.assertEqual(os.listdir(target), [".descriptions.db"])
+                stage = staging.stage_folder(self.stage, target)
+                self.assertEqual(len(os.listdir(stage)), 4)
+
+                # Повторный запуск переносит подготовленные файлы, не скачивая их заново
+                before = sources.requests["acomics_image"]
+                self.assertEqual(download(), 5)
+                self.assertEqual(sources.requests["acomics_image"], before)
+                self.assertEqual(len(os.listdir(target)), 5)
+                self.assertFalse(os.path.exists(stage))
+
+                # Уже перенесённые файлы тоже не скачиваются
+                self.assertEqual(download(), 5)
+                self.assertEqual(sources.requests["acomics_image"], before)
+
+if __name__ == '__main__':
+    unittest.main()
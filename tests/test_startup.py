@@ -0,0 +1,48 @@
+import os
+import subprocess
+import sys
+import unittest
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_MODULES = os.path.join(_ROOT, "comic_downloader", "modules")
+
+# Библиотеки, которые загрузчики импортируют только при первом использовании
+_LAZY = ("aiohttp", "aiofile", "requests", "bs4", "httpx", "tomlkit")
+# Бюджет времени импорта модуля загрузчика вместе с зависимостями, мкс;
+# до отложенных импортов загрузчики импортировались около 300 мс
+_BUDGET = 200_000
+
+def import_times(module: str) -> dict[str, int]:
+    """Совокупное время импорта каждого модуля по python -X importtime, мкс"""
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [_MODULES, env.get("PYTHONPATH")]))
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        env = env,
+        capture_output = True,
+        text = True,
+        check = True
+    )
+    times: dict[str, int] = {}
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if cumulative.strip().isdigit():
+            times[name.strip()] = int(cumulative)
+    return times
+
+class Test_test_startup(unittest.TestCase):
+    def test_lazy_imports(self):
+        for module in ("base_downloader", "acomicsdownload", "SAdownload", "mangalib", "hentailib"):
+            with self.subTest(module=module):
+                times = import_times(module)
+                self.assertIn(module, times)
+                self.assertFalse(
+                    [name for name in times if name.split(".")[0] in _LAZY],
+                    "тяжёлые библиотеки импортируются при загрузке модуля"
+                )
+                self.assertLess(times[module], _BUDGET)
+
+if __name__ == '__main__':
+    unittest.main()
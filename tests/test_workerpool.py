@@ -0,0 +1,77 @@
+import os
+import tempfile
+import unittest
+from tests import support
+from comic_downloader import workerpool
+
+# Загрузчик-заглушка: обычный, зависающий, падающий процесс и ошибка загрузчика
+_DOWNLOADER = '''
+import os
+import time
+
+class Downloader:
+    def __init__(self, comic_name, first, use_async, **kwargs):
+        self.comic_name = comic_name
+        self.first = first
+        self.use_async = use_async
+
+    def downloadcomic(self):
+        if self.comic_name == "hang":
+            time.sleep(60)
+        if self.comic_name == "crash":
+            os._exit(3)
+        if self.comic_name == "error":
+            raise ValueError("bad page")
+        return self.first + 2
+'''
+
+def job(rss_id: int, url: str, script: str) -> workerpool.JobDict:
+    return workerpool.JobDict({
+        "rss_id": rss_id,
+        "exec_module_path": script,
+        "url": url,
+        "first": 1,
+        "folder": os.path.dirname(script),
+        "desc": False,
+        "imgtitle": False,
+        "use_async": False,
+    })
+
+class Test_test_workerpool(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.script = os.path.join(self.folder.name, "fake_pool_downloader.py")
+        with open(self.script, "w", encoding="utf-8") as file:
+            file.write(_DOWNLOADER)
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def test_reuses_processes(self):
+        with workerpool.WorkerPool(2) as pool:
+            pids = {worker.process.pid for worker in pool._workers}
+            results = list(pool.map(job(rss_id, "ok", self.script) for rss_id in range(6)))
+            self.assertEqual({worker.process.pid for worker in pool._workers}, pids)
+        self.assertEqual(sorted(result["rss_id"] for result in results), list(range(6)))
+        self.assertTrue(all(result["last_num"] == 3 for result in results))
+
+    def test_isolation(self):
+        with workerpool.WorkerPool(2, timeout=1) as pool:
+            results = {
+                result["rss_id"]: result
+                for result in pool.map([
+                    job(1, "hang", self.script),
+                    job(2, "crash", self.script),
+                    job(3, "error", self.script),
+                    job(4, "ok", self.script),
+                ])
+            }
+            self.assertEqual(len(pool._workers), 2)
+            self.assertTrue(all(worker.process.is_alive() for worker in pool._workers))
+        self.assertIn("Превышено время", results[1]["error"])
+        self.assertIn("завершился с кодом 3", results[2]["error"])
+        self.assertEqual(results[3]["error"], "ValueError: bad page")
+        self.assertEqual(results[4]["last_num"], 3)
+
+if __name__ == '__main__':
+    unittest.main()